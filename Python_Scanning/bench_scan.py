@@ -0,0 +1,281 @@
+import argparse
+import asyncio
+import contextlib
+import gzip
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import struct
+import sys
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import scan_bt
+import wire
+from classify import Classifier
+from identity import advertisement_fingerprint
+from pseudonym import Pseudonymizer
+from sightings import SightingWindow
+from simulated import SimulatedPopulation
+from uploader import BLOCK, Uploader
+
+# ---- Scanner micro-benchmarks ----
+# Each stage of a scan cycle is timed on a simulated crowd of 100, 1k and
+# 10k devices, then run once more under tracemalloc:
+#   classify        cold Classifier, one advertisement per device (all misses)
+#   ingest          the BLE callback path per advertisement: fingerprint,
+#                   warm classifier, SightingWindow.add
+#   summarise       flush the window, link rotations, build labels
+#   hash_cold       HMAC pseudonyms with an empty cache (first cycle / new epoch)
+#   payloads        build_payloads with a warm cache (steady state)
+#   encode_json     wire.encode_request, JSON
+#   encode_binary   wire.encode_request, binary + UPLOAD_COMPRESSION
+#   upload          Uploader -> stub HTTP server (own process) over loopback
+#
+#     python bench_scan.py --save baseline.json
+#     python bench_scan.py --compare baseline.json   # exit 1 on regression
+DEVICE_COUNTS = (100, 1000, 10000)
+ADVS_PER_DEVICE = 10  # advertisements per device per cycle
+MIN_TIME = 1.0  # seconds of repetitions per stage
+MIN_REPS = 3
+TOLERANCE = 0.25  # relative slowdown tolerated by --compare
+COMPANIES = (0x004C, 0x0006, 0x0075, 0x00E0, 0xFFFF)
+
+
+def _advertisement(device):
+    """Bleak-like AdvertisementData for a simulated device."""
+    fingerprint = device.fingerprint & 0xFFFFFFFF
+    return SimpleNamespace(
+        local_name=device.name,
+        manufacturer_data={COMPANIES[fingerprint % len(COMPANIES)]: fingerprint.to_bytes(4, "little")},
+        service_uuids=[],
+        tx_power=None,
+    )
+
+
+class Workload:
+    """One scan cycle's worth of input for ``devices`` simulated devices."""
+
+    def __init__(self, devices, seed=1):
+        # Little's law, as in SimulatedPopulation: rate = size / mean dwell.
+        mean_dwell = scan_bt.SIM_DWELL_MEDIAN * math.exp(0.5)
+        self.now = time.time()
+        population = SimulatedPopulation(arrival_rate=devices / mean_dwell,
+                                         dwell_median=scan_bt.SIM_DWELL_MEDIAN, seed=seed, now=self.now)
+        self.devices = len(population)
+        # Each device advertises at its own phase within the advertising
+        # interval; sorted, so ingest() replays the window in time order.
+        rng = random.Random(seed)
+        spacing = scan_bt.SCAN_INTERVAL / ADVS_PER_DEVICE
+        self.advertisements = sorted(((rng.random() * spacing, d.ble_mac, round(d.rssi), d.name,
+                                       _advertisement(d)) for d in population.devices),
+                                     key=lambda a: a[0])
+        self.window = SightingWindow(lambda: self.now)
+        self.ingest()
+        self.sightings = scan_bt.summarise_ble_window(self.window)
+        self.payloads = scan_bt.build_payloads(self.sightings)
+        self.batches = list(scan_bt.chunked(self.payloads, scan_bt.UPLOAD_BATCH_SIZE))
+
+    def ingest(self, classifier=scan_bt.classifier):
+        add, classify = self.window.add, classifier.classify
+        spacing = scan_bt.SCAN_INTERVAL / ADVS_PER_DEVICE
+        start = self.now - scan_bt.SCAN_INTERVAL
+        for i in range(ADVS_PER_DEVICE):
+            at = start + i * spacing
+            for phase, mac, rssi, name, adv in self.advertisements:
+                add(mac, rssi, name, at + phase, advertisement_fingerprint(adv), classify(adv))
+
+
+# ---- Stub ingestion server ----
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        if self.headers.get("Content-Type") == wire.CONTENT_TYPE:
+            count = struct.unpack_from("<H", body, 6)[0]
+        else:
+            count = len(json.loads(body))
+        reply = json.dumps({"inserted": count, "results": [{"ok": True}] * count}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve_stub(conn):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    conn.send(server.server_address[1])
+    server.serve_forever()
+
+
+@contextlib.contextmanager
+def stub_server():
+    """A throwaway batch endpoint in its own process, so its CPU isn't counted."""
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe()
+    process = ctx.Process(target=_serve_stub, args=(child,), daemon=True)
+    process.start()
+    try:
+        yield f"http://127.0.0.1:{parent.recv()}/api/device-log-batch"
+    finally:
+        process.terminate()
+        process.join()
+
+
+# ---- Measurement ----
+def measure(run, units, prepare=None, min_time=MIN_TIME, min_reps=MIN_REPS):
+    """Time ``run(prepare())`` until ``min_time`` has passed, then once under tracemalloc.
+
+    Returns per-unit throughput, CPU (all threads of this process) and
+    peak allocation; ``prepare`` is not timed.
+    """
+    wall = cpu = 0.0
+    reps = 0
+    while reps < min_reps or wall < min_time:
+        arg = prepare() if prepare else None
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        run(arg)
+        wall += time.perf_counter() - wall_start
+        cpu += time.process_time() - cpu_start
+        reps += 1
+    arg = prepare() if prepare else None
+    tracemalloc.start()
+    run(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"units": units, "reps": reps,
+            "per_s": round(units * reps / wall, 1),
+            "cpu_us": round(cpu / (units * reps) * 1e6, 3),
+            "alloc_bytes": round(peak / units, 1)}
+
+
+def bench_devices(devices, url=None, min_time=MIN_TIME):
+    w = Workload(devices)
+    n = len(w.sightings)
+    results = {}
+
+    def add(stage, *args, **kwargs):
+        results[stage] = measure(*args, min_time=min_time, **kwargs)
+
+    add("classify", lambda classifier: [classifier.classify(adv) for *_, adv in w.advertisements],
+        w.devices, prepare=Classifier)
+    add("ingest", lambda _: w.ingest(), w.devices * ADVS_PER_DEVICE,
+        prepare=lambda: w.window.flush())
+    add("summarise", lambda _: scan_bt.summarise_ble_window(w.window), n, prepare=w.ingest)
+    items = [(s[0], s[4]) for s in w.sightings]
+    add("hash_cold", lambda p: p.pseudonymize_many(items), n,
+        prepare=lambda: Pseudonymizer(scan_bt.SESSION_KEY, scan_bt.PSEUDONYM_ROTATION,
+                                      scan_bt.PSEUDONYM_OVERLAP, scan_bt.PSEUDONYM_CACHE_SIZE))
+    add("payloads", lambda _: scan_bt.build_payloads(w.sightings), n)
+    add("encode_json", lambda _: [wire.encode_request(b) for b in w.batches], n)
+    add("encode_binary", lambda _: [wire.encode_request(b, "binary", scan_bt.UPLOAD_COMPRESSION)
+                                    for b in w.batches], n)
+    if url:
+        results["upload"] = bench_upload(w.batches, n, url, min_time)
+    return {"devices": w.devices, "sightings": n, "stages": results}
+
+
+def bench_upload(batches, n, url, min_time):
+    loop = asyncio.new_event_loop()
+    uploader = Uploader(url, queue_size=len(batches) + 1, concurrency=scan_bt.UPLOAD_CONCURRENCY,
+                        drop_policy=BLOCK, wire_format=scan_bt.UPLOAD_WIRE_FORMAT,
+                        compression=scan_bt.UPLOAD_COMPRESSION)
+
+    async def cycle():
+        for batch in batches:
+            await uploader.submit(batch)
+        await uploader.drain()
+
+    loop.run_until_complete(uploader.start())
+    try:
+        result = measure(lambda _: loop.run_until_complete(cycle()), n, min_time=min_time)
+    finally:
+        loop.run_until_complete(uploader.stop())
+        loop.close()
+    if uploader.stats["failed"]:
+        raise RuntimeError(f"Stub server uploads failed: {uploader.stats}")
+    return result
+
+
+# ---- Baselines ----
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Regressions against a saved baseline: slower throughput or more CPU per unit."""
+    regressions = []
+    for devices, run in results["runs"].items():
+        base_run = baseline["runs"].get(devices)
+        if base_run is None:
+            continue
+        for stage, r in run["stages"].items():
+            b = base_run["stages"].get(stage)
+            if b is None:
+                continue
+            if r["per_s"] < b["per_s"] * (1 - tolerance):
+                regressions.append(f"{devices} devices {stage}: {r['per_s']:.0f}/s vs {b['per_s']:.0f}/s")
+            if r["cpu_us"] > b["cpu_us"] * (1 + tolerance):
+                regressions.append(f"{devices} devices {stage}: {r['cpu_us']:.2f} us vs {b['cpu_us']:.2f} us CPU")
+    return regressions
+
+
+def print_table(results, baseline=None):
+    out = sys.__stdout__
+    print(f"{'devices':>7} {'stage':<14} {'units/s':>12} {'CPU us/unit':>12} {'alloc B/unit':>13}"
+          + (f" {'vs baseline':>12}" if baseline else ""), file=out)
+    for devices, run in results["runs"].items():
+        base_run = (baseline or {}).get("runs", {}).get(devices, {}).get("stages", {})
+        for stage, r in run["stages"].items():
+            line = f"{devices:>7} {stage:<14} {r['per_s']:12.0f} {r['cpu_us']:12.2f} {r['alloc_bytes']:13.0f}"
+            if stage in base_run:
+                line += f" {r['per_s'] / base_run[stage]['per_s'] - 1:+12.1%}"
+            print(line, file=out)
+
+
+def run(device_counts=DEVICE_COUNTS, upload=True, min_time=MIN_TIME):
+    results = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+               "machine": platform.machine(), "wire_format": scan_bt.UPLOAD_WIRE_FORMAT,
+               "compression": scan_bt.UPLOAD_COMPRESSION, "runs": {}}
+    with contextlib.ExitStack() as stack:
+        url = stack.enter_context(stub_server()) if upload else None
+        # The scanner's own progress lines would swamp the table.
+        devnull = stack.enter_context(open(os.devnull, "w"))
+        stack.enter_context(contextlib.redirect_stdout(devnull))
+        for devices in device_counts:
+            results["runs"][str(devices)] = bench_devices(devices, url, min_time)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scanner's per-cycle stages on a simulated crowd.")
+    parser.add_argument("--devices", type=int, nargs="+", default=DEVICE_COUNTS)
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="seconds per stage")
+    parser.add_argument("--no-upload", action="store_true", help="skip the stub-server upload stage")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="fail on regressions against this baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+    results = run(args.devices, not args.no_upload, args.min_time)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[bench] Baseline written to {args.save}")
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"[!] Regression: {regression}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,118 @@
+import gzip
+import struct
+import zlib
+
+# ---- Capture file format (inside a gzip stream) ----
+# header:   magic "UBCP", u16 version
+# cycle:    f64 wall-clock timestamp, u32 sighting count, then per sighting
+#           6-byte address, i8 RSSI, u8 flags, u16 label ref, u16 major ref,
+#           f32 observation time relative to the cycle timestamp (version 2+)
+# A string ref of NEW_STRING is followed by u16 length + UTF-8 bytes; the
+# string then gets the next table index (until the table is full).
+MAGIC = b"UBCP"
+VERSION = 2
+HEADER = struct.Struct("<4sH")
+CYCLE = struct.Struct("<dI")
+SIGHTING_V1 = struct.Struct("<6sbBHH")
+SIGHTING = struct.Struct("<6sbBHHf")
+STRLEN = struct.Struct("<H")
+NEW_STRING = 0xFFFF
+MAX_STRINGS = NEW_STRING
+
+FLAG_UPPERCASE = 0x01  # address was upper-case hex (Classic) - it changes the hash
+
+
+class CaptureWriter:
+    """Records raw scan cycles (the scan_cycle tuples) to a compressed file."""
+
+    def __init__(self, path):
+        self._file = gzip.open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION))
+        self._strings = {}
+        self.cycles = 0
+
+    def _ref(self, s, out):
+        ref = self._strings.get(s)
+        if ref is not None:
+            return ref
+        if len(self._strings) < MAX_STRINGS - 1:
+            self._strings[s] = len(self._strings)
+        raw = s.encode()
+        out.append(STRLEN.pack(len(raw)) + raw)
+        return NEW_STRING
+
+    def write_cycle(self, ts, devices):
+        parts = [CYCLE.pack(ts, len(devices))]
+        for mac, rssi, label, major, seen_at in devices:
+            # New strings go right after the sighting that introduces them.
+            extra = []
+            label_ref = self._ref(label, extra)
+            major_ref = self._ref(major, extra)
+            flags = FLAG_UPPERCASE if mac != mac.lower() else 0
+            rssi = max(-128, min(127, int(rssi)))
+            parts.append(SIGHTING.pack(bytes.fromhex(mac), rssi, flags,
+                                       label_ref, major_ref, seen_at - ts))
+            parts.extend(extra)
+        self._file.write(b"".join(parts))
+        # Sync-flush so a crash loses at most the cycle being written.
+        self._file.flush(zlib.Z_SYNC_FLUSH)
+        self.cycles += 1
+
+    def close(self):
+        self._file.close()
+
+
+def read_capture(path):
+    """Yield (timestamp, [(mac, rssi, label, major, seen_at), ...]) per cycle.
+
+    A capture cut short by a crash ends at the last complete cycle.
+    Version 1 files have no per-sighting times; seen_at is the cycle time.
+    """
+    with gzip.open(path, "rb") as f:
+        try:
+            data = f.read()
+        except (EOFError, zlib.error):
+            data = _read_truncated(path)
+    magic, version = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version not in (1, VERSION):
+        raise ValueError(f"{path} is not a capture file (or is a newer version)")
+    record = SIGHTING if version >= 2 else SIGHTING_V1
+    strings = []
+    offset = HEADER.size
+    while offset + CYCLE.size <= len(data):
+        ts, count = CYCLE.unpack_from(data, offset)
+        offset += CYCLE.size
+        devices = []
+        try:
+            for _ in range(count):
+                raw_mac, rssi, flags, label_ref, major_ref, *delta = record.unpack_from(data, offset)
+                offset += record.size
+                label, offset = _string(data, offset, label_ref, strings)
+                major, offset = _string(data, offset, major_ref, strings)
+                mac = raw_mac.hex()
+                if flags & FLAG_UPPERCASE:
+                    mac = mac.upper()
+                devices.append((mac, rssi, label, major, ts + (delta[0] if delta else 0.0)))
+        except struct.error:
+            return
+        yield ts, devices
+
+
+def _string(data, offset, ref, strings):
+    if ref != NEW_STRING:
+        return strings[ref], offset
+    (length,) = STRLEN.unpack_from(data, offset)
+    offset += STRLEN.size
+    if offset + length > len(data):
+        raise struct.error("truncated string")
+    s = bytes(data[offset:offset + length]).decode()
+    if len(strings) < MAX_STRINGS - 1:
+        strings.append(s)
+    return s, offset + length
+
+
+def _read_truncated(path):
+    # gzip refuses streams without a trailer; decompress what is there.
+    with open(path, "rb") as f:
+        raw = f.read()
+    return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(raw)
@@ -0,0 +1,184 @@
+import re
+from collections import OrderedDict
+from functools import lru_cache
+
+# Major class names match scan_bt.MAJOR_CLASSES so BLE and Classic devices
+# land in the same class-distribution buckets.
+PHONE = "Phone"
+COMPUTER = "Computer"
+AUDIO = "Audio/Video"
+PERIPHERAL = "Peripheral"
+WEARABLE = "Wearable"
+HEALTH = "Health"
+MISC = "Misc"
+
+# ---- Manufacturer data: company ID -> {first payload byte: class} ----
+# Only vendors whose payload type byte says what the device is; a bare
+# company ID (e.g. Samsung makes phones, TVs and fridges) isn't enough.
+APPLE = 0x004C
+MICROSOFT = 0x0006
+MANUFACTURER_TYPES = {
+    APPLE: {
+        0x02: MISC,       # iBeacon
+        0x05: COMPUTER,   # AirDrop
+        0x07: AUDIO,      # Proximity pairing (AirPods, Beats)
+        0x09: AUDIO,      # AirPlay target
+        0x0A: AUDIO,      # AirPlay source
+        0x0F: PHONE,      # Nearby action
+        0x12: MISC,       # Find My (AirTag, offline devices)
+        # Not 0x0C (Handoff) or 0x10 (Nearby info): iPhones, iPads, Macs
+        # and Watches all send them, so the name decides.
+    },
+    MICROSOFT: {
+        0x01: COMPUTER,   # Connected Devices Platform beacon (Windows)
+    },
+}
+# Companies whose every advertisement is one kind of device.
+COMPANY_CLASSES = {
+    0x0087: WEARABLE,   # Garmin
+    0x0157: WEARABLE,   # Huami (Mi Band, Amazfit)
+    0x006B: HEALTH,     # Polar
+    0x009E: AUDIO,      # Bose
+    0x0057: AUDIO,      # Harman (JBL)
+    0x012D: AUDIO,      # Sony
+    0x02E5: MISC,       # Espressif
+}
+
+# ---- GAP Appearance: category (value >> 6) -> class ----
+APPEARANCE_CATEGORIES = {
+    0x001: PHONE,
+    0x002: COMPUTER,
+    0x003: WEARABLE,    # Watch
+    0x004: MISC,        # Clock
+    0x005: AUDIO,       # Display
+    0x006: PERIPHERAL,  # Remote control
+    0x007: MISC,        # Eye-glasses
+    0x008: MISC,        # Tag
+    0x009: MISC,        # Keyring
+    0x00A: AUDIO,       # Media player
+    0x00B: PERIPHERAL,  # Barcode scanner
+    0x00C: HEALTH,      # Thermometer
+    0x00D: HEALTH,      # Heart rate sensor
+    0x00E: HEALTH,      # Blood pressure
+    0x00F: PERIPHERAL,  # Human interface device
+    0x010: HEALTH,      # Glucose meter
+    0x011: WEARABLE,    # Running/walking sensor
+    0x012: WEARABLE,    # Cycling
+    0x021: AUDIO,       # Audio sink
+    0x022: AUDIO,       # Audio source
+    0x025: AUDIO,       # Wearable audio device
+    0x031: HEALTH,      # Pulse oximeter
+}
+
+# ---- 16-bit service UUIDs -> class ----
+SERVICE_CLASSES = {
+    0x180D: HEALTH,     # Heart Rate
+    0x1810: HEALTH,     # Blood Pressure
+    0x1808: HEALTH,     # Glucose
+    0x1822: HEALTH,     # Pulse Oximeter
+    0x1812: PERIPHERAL, # Human Interface Device
+    0x110B: AUDIO,      # Audio Sink
+    0x184E: AUDIO,      # Audio Stream Control
+    0x1850: AUDIO,      # Published Audio Capabilities
+    0xFD6F: PHONE,      # Exposure Notification
+    0xFE9F: PHONE,      # Google Fast Pair / Nearby
+    0xFE2C: AUDIO,      # Google Fast Pair (accessories)
+    0xFEED: MISC,       # Tile
+    0xFD5A: MISC,       # Samsung SmartTag
+    0xFEAA: MISC,       # Eddystone beacon
+}
+_BASE_UUID_SUFFIX = "-0000-1000-8000-00805f9b34fb"
+
+# ---- Device names: one alternation, one named group per class ----
+NAME_PATTERNS = [
+    (PHONE, r"iphone|galaxy (?:s|a|z|note)\d+\b|galaxy z (?:fold|flip)|pixel \d|xperia|oneplus|moto|redmi|poco|oppo|"
+            r"vivo|realme|nokia|android|phone|mobile"),
+    (COMPUTER, r"macbook|imac|mac ?mini|thinkpad|xps|zenbook|surface|laptop|desktop-|ipad|tab s"),
+    (AUDIO, r"airpods|buds|beats|jbl|bose|wh-|wf-|headphone|earbud|speaker|soundbar|sonos|\btv\b"),
+    (WEARABLE, r"watch|band|fitbit|garmin|amazfit|whoop|oura"),
+    (PERIPHERAL, r"keyboard|mouse|mx |controller|trackpad|pencil|remote"),
+    (HEALTH, r"polar|omron|\bhr\b|scale|thermo|glucose"),
+    (MISC, r"tile|smarttag|airtag|esp32|beacon"),
+]
+_GROUPS = {f"c{i}": major for i, (major, _) in enumerate(NAME_PATTERNS)}
+NAME_RE = re.compile("|".join(f"(?P<c{i}>{pattern})" for i, (_, pattern) in enumerate(NAME_PATTERNS)),
+                     re.IGNORECASE)
+
+_MISSING = object()
+
+
+def appearance_of(device):
+    """GAP Appearance from a BLEDevice, where the backend exposes it (BlueZ)."""
+    details = getattr(device, "details", None)
+    if isinstance(details, dict):
+        return details.get("props", {}).get("Appearance")
+    return None
+
+
+def service_class(uuid):
+    """Class for a Bluetooth SIG 16-bit service UUID in 128-bit form."""
+    if uuid.endswith(_BASE_UUID_SUFFIX) and uuid.startswith("0000"):
+        return SERVICE_CLASSES.get(int(uuid[4:8], 16))
+    return None
+
+
+def manufacturer_class(company, data):
+    types = MANUFACTURER_TYPES.get(company)
+    if types is not None:
+        # data is the payload after the company ID; index, don't slice.
+        return types.get(data[0]) if data else None
+    return COMPANY_CLASSES.get(company)
+
+
+@lru_cache(maxsize=4096)
+def name_class(name):
+    if not name:
+        return None
+    m = NAME_RE.search(name)
+    return _GROUPS[m.lastgroup] if m else None
+
+
+class Classifier:
+    """Major class for a BLE advertisement.
+
+    Evidence is taken in order of reliability: GAP Appearance, then
+    service UUIDs, then manufacturer data, then the device name. The
+    result (``None`` when nothing matches) is memoized per advertisement
+    payload in a bounded LRU, since a device repeats the same payload many
+    times a second.
+    """
+
+    def __init__(self, cache_size=16384):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def classify(self, adv, appearance=None):
+        # The payload itself, not its hash(): colliding hashes would share a class.
+        key = (adv.local_name, tuple(adv.manufacturer_data.items()),
+               tuple(adv.service_uuids), appearance)
+        major = self._cache.get(key, _MISSING)
+        if major is not _MISSING:
+            self._cache.move_to_end(key)
+            self.stats["hits"] += 1
+            return major
+        self.stats["misses"] += 1
+        major = self._cache[key] = self._classify(adv, appearance)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return major
+
+    def _classify(self, adv, appearance):
+        if appearance:
+            major = APPEARANCE_CATEGORIES.get(appearance >> 6)
+            if major:
+                return major
+        for uuid in adv.service_uuids:
+            major = service_class(uuid)
+            if major:
+                return major
+        for company, data in adv.manufacturer_data.items():
+            major = manufacturer_class(company, data)
+            if major:
+                return major
+        return name_class(adv.local_name)
@@ -0,0 +1,42 @@
+import time
+
+
+class ObservationClock:
+    """Wall-clock timestamps derived from the monotonic clock.
+
+    Observations are stamped with ``now()``, which is
+    ``time.monotonic()`` plus an offset to wall time. The offset is
+    re-measured every ``resync`` seconds. Small drift (e.g. NTP slewing
+    the system clock) is corrected over the following interval by
+    running the offset at a rate of at most ``max_slew`` seconds per
+    second, so consecutive stamps never jump. A larger error (a clock
+    step, or resume from suspend) is applied at once.
+    """
+
+    def __init__(self, resync=60.0, max_slew=0.0005, step_threshold=1.0):
+        self.resync = resync
+        self.max_slew = max_slew
+        self.step_threshold = step_threshold
+        self._offset = time.time() - time.monotonic()  # offset at _synced_at
+        self._rate = 0.0  # offset change per second since _synced_at
+        self._synced_at = time.monotonic()
+        self.stats = {"steps": 0, "last_error": 0.0}
+
+    def now(self):
+        mono = time.monotonic()
+        if mono - self._synced_at >= self.resync:
+            self._sync(mono)
+        return mono + self._offset + self._rate * (mono - self._synced_at)
+
+    def _sync(self, mono):
+        self._offset += self._rate * (mono - self._synced_at)
+        error = (time.time() - time.monotonic()) - self._offset
+        self.stats["last_error"] = error
+        if abs(error) >= self.step_threshold:
+            self._offset += error
+            self._rate = 0.0
+            self.stats["steps"] += 1
+            print(f"[clock] Wall clock stepped by {error:+.3f}s")
+        else:
+            self._rate = max(-self.max_slew, min(self.max_slew, error / self.resync))
+        self._synced_at = mono
@@ -0,0 +1,111 @@
+import math
+
+INQUIRY_UNIT = 1.28  # seconds per PyBluez inquiry duration unit
+
+
+class DutyCycleScheduler:
+    """Splits scan time between BLE and Classic by discovery yield.
+
+    Yield is new devices per second of scanning, tracked per radio as an
+    exponentially weighted moving average (``alpha``). A device counts as
+    new if that radio hasn't reported it in the last ``memory`` seconds.
+
+    Each cycle ``plan()`` picks:
+
+    - the cycle period, sized so one cycle should turn up about
+      ``target_new`` new devices: short while a crowd is arriving, long
+      when the room is stable. It moves by at most ``max_step`` per cycle
+      and stays within [min_period, max_period].
+    - the BLE window, a fixed ``ble_fraction`` of the period (the BLE
+      scanner runs continuously; this only sets the flush interval).
+    - the Classic inquiry length in 1.28 s units, between
+      ``classic_min`` and what fits in the BLE window, in proportion to
+      Classic's share of the total yield. While Classic finds nothing
+      (yield below ``idle_yield``), it runs the shortest inquiry, which
+      still re-finds the devices already present, and a full-length probe
+      every ``probe_every`` cycles. It is never skipped: a Classic-only
+      device is only reported when an inquiry finds it.
+
+    ``max_period`` must stay below the dashboard's presence windows, or
+    devices still in the room drop off between cycles.
+
+    Time is counted in cycle periods rather than read from a clock, so a
+    fast-forwarded simulation behaves like a real-time one.
+    """
+
+    def __init__(self, period=15.0, min_period=5.0, max_period=15.0, ble_fraction=2 / 3,
+                 classic_min=2, classic_max=8, target_new=5.0, alpha=0.3, memory=600.0,
+                 max_step=1.5, probe_every=8, idle_yield=0.005):
+        self.period = period
+        self.min_period = min_period
+        self.max_period = max_period
+        self.ble_fraction = ble_fraction
+        self.classic_min = classic_min
+        self.classic_max = classic_max
+        self.target_new = target_new
+        self.alpha = alpha
+        self.memory = memory
+        self.max_step = max_step
+        self.probe_every = probe_every
+        self.idle_yield = idle_yield
+        self.yields = {}  # radio -> EWMA new devices per second (None until warmed up)
+        self._seen = {}   # radio -> {address: time last reported}
+        self._now = 0.0
+        self._cycle = 0
+        self.classic_units = classic_max
+
+    def observe(self, radio, devices, seconds):
+        """Record one scan's results: (mac, ...) tuples from ``seconds`` the radio listened."""
+        seen = self._seen.setdefault(radio, {})
+        new = 0
+        for device in devices:
+            if device[0] not in seen:
+                new += 1
+            seen[device[0]] = self._now
+        if len(seen) > len(devices):
+            cutoff = self._now - self.memory
+            for mac in [mac for mac, t in seen.items() if t < cutoff]:
+                del seen[mac]
+        if radio not in self.yields:
+            # The first scan reports everyone already present, not arrivals.
+            self.yields[radio] = None
+            return
+        if seconds <= 0:
+            return
+        rate = new / seconds
+        previous = self.yields[radio]
+        self.yields[radio] = rate if previous is None else previous + self.alpha * (rate - previous)
+
+    def plan(self):
+        """Windows (seconds of scanning per source) and period for the next cycle."""
+        self._cycle += 1
+        ble_yield = self.yields.get("ble") or 0.0
+        classic_yield = self.yields.get("classic")
+        total = ble_yield + (classic_yield or 0.0)
+        reason = "warming up"
+        if self.yields.get("ble") is not None:
+            wanted = self.target_new / total if total > 0 else self.max_period
+            wanted = min(self.max_step * self.period, max(self.period / self.max_step, wanted))
+            period = min(self.max_period, max(self.min_period, wanted))
+            reason = ("churn rising" if period < self.period
+                      else "room stable" if period > self.period else "steady")
+            self.period = period
+
+        ble_window = self.period * self.ble_fraction
+        fits = max(self.classic_min, min(self.classic_max, math.floor(ble_window / INQUIRY_UNIT)))
+        if classic_yield is None:
+            units = fits
+        elif classic_yield < self.idle_yield and total > 0:
+            probe = self._cycle % self.probe_every == 0
+            units = fits if probe else self.classic_min
+            reason += ", classic probe" if probe else ", classic idle"
+        else:
+            share = classic_yield / total if total > 0 else 0.5
+            units = self.classic_min + round((fits - self.classic_min) * share)
+        self.classic_units = units
+        self._now += self.period
+
+        classic_str = f"{classic_yield:.3f}" if classic_yield is not None else "-"
+        print(f"[duty] period={self.period:.1f}s ble={ble_window:.1f}s classic={units}x{INQUIRY_UNIT}s "
+              f"yield ble={ble_yield:.3f}/s classic={classic_str}/s ({reason})")
+        return {"period": self.period, "ble": ble_window, "classic": units * INQUIRY_UNIT}
@@ -0,0 +1,123 @@
+import argparse
+import bisect
+import json
+import math
+from collections import defaultdict
+
+# Stages in pipeline order (see tracelog.py). "sessionized" is the first
+# sessionizer.py fold (its --trace log) that reached the batch's last row.
+# "served:<endpoint>" stages follow: the first poll of that endpoint that
+# started after the data it reads was written, so they include the
+# dashboards' polling intervals.
+STAGES = ("scanned", "enqueued", "sent", "received", "committed", "acked", "sessionized")
+# Endpoints that read presence_intervals only show a batch once it is
+# sessionized; the rest read device_sessions or device_current, written at commit.
+SERVED_AFTER = {"visible-devices": "sessionized"}
+PERCENTILES = (50, 95, 99)
+
+
+def read_traces(paths):
+    """Merge scanner and server trace logs.
+
+    Returns ({trace_id: {"observed": [seen_at, ...], stage: t, ...}},
+    {endpoint: sorted query times}).
+    """
+    batches = defaultdict(dict)
+    served = defaultdict(list)
+    folds = []  # (through_id, t) from the sessionizer
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a line cut off by a crash
+                stage = record.get("stage")
+                if stage == "served":
+                    served[record["endpoint"]].append(record["t"])
+                    continue
+                if stage == "sessionized":
+                    folds.append((record["through_id"], record["t"]))
+                    continue
+                if stage == "acked" and record.get("outcome") != "sent":
+                    continue
+                batch = batches[record["trace"]]
+                if stage == "enqueued":
+                    batch["observed"] = [t for t in record["observed"] if t is not None]
+                    if record.get("scanned"):
+                        batch["scanned"] = record["scanned"]
+                batch.setdefault(stage, record["t"])  # the first attempt counts
+                if stage == "committed" and record.get("first_id") is not None:
+                    batch.setdefault("last_id", record["first_id"] + record["inserted"] - 1)
+    for times in served.values():
+        times.sort()
+    # Folds move forward through the ids, so the first one at or past a
+    # batch's last row is when all of it was folded.
+    folds.sort(key=lambda fold: fold[1])
+    through = [f[0] for f in folds]
+    for batch in batches.values():
+        if "last_id" in batch:
+            i = bisect.bisect_left(through, batch["last_id"])
+            if i < len(folds):
+                batch["sessionized"] = folds[i][1]
+    return batches, served
+
+
+def stage_lags(batches, served):
+    """Seconds from each sighting's observation to each stage it reached."""
+    lags = defaultdict(list)
+    for batch in batches.values():
+        observed = batch.get("observed")
+        if not observed:
+            continue
+        times = {stage: batch[stage] for stage in STAGES if stage in batch}
+        for endpoint, queried in served.items():
+            written = batch.get(SERVED_AFTER.get(endpoint, "committed"))
+            if written is None:
+                continue
+            i = bisect.bisect_left(queried, written)
+            if i < len(queried):
+                times[f"served:{endpoint}"] = queried[i]
+        for stage, t in times.items():
+            lags[stage].extend(t - seen_at for seen_at in observed)
+    return lags
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a sorted list."""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def report(paths, slo=None):
+    batches, served = read_traces(paths)
+    lags = stage_lags(batches, served)
+    order = [s for s in STAGES if s in lags] + sorted(s for s in lags if s.startswith("served:"))
+    header = f"{'stage':<26} {'sightings':>9}" + "".join(f" {f'p{p}':>8}" for p in PERCENTILES)
+    if slo is not None:
+        header += f" {f'<= {slo:g}s':>9}"
+    print(header)
+    for stage in order:
+        values = sorted(lags[stage])
+        line = f"{stage:<26} {len(values):9d}" + "".join(f" {percentile(values, p):7.2f}s"
+                                                      for p in PERCENTILES)
+        if slo is not None:
+            line += f" {bisect.bisect_right(values, slo) / len(values):9.1%}"
+        print(line)
+    lost = sum(1 for b in batches.values() if "enqueued" in b and "committed" not in b)
+    if lost:
+        print(f"{lost} of {len(batches)} batches never reached committed "
+              f"(dropped, spooled, still in flight, or no server trace given)")
+    if "received" in lags and lags["received"] and min(lags["received"]) < 0:
+        print("[!] Negative lags at the server: scanner and server clocks disagree")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Freshness lag from advertisement to dashboard, per stage, from trace logs "
+                    "(scanner: scan_bt.py --trace PATH; server: TRACE_LOG=PATH; "
+                    "sessionizer.py --trace PATH).")
+    parser.add_argument("logs", nargs="+", help="scanner and server trace files")
+    parser.add_argument("--slo", type=float, metavar="SECONDS",
+                        help="also report the share of sightings at or under this lag")
+    args = parser.parse_args()
+    report(args.logs, args.slo)
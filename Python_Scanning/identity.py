@@ -0,0 +1,162 @@
+from collections import OrderedDict
+
+GENERIC_NAMES = {"BLE_Device", "BT_Device"}
+
+
+def normalize_address(addr):
+    """Canonical address form: lower-case hex without separators."""
+    return addr.replace(":", "").replace("-", "").lower()
+
+
+def is_rotating_address(mac):
+    """True for BLE resolvable private addresses (top bits 01), which rotate."""
+    return len(mac) == 12 and (int(mac[:2], 16) & 0xC0) == 0x40
+
+
+def advertisement_fingerprint(adv):
+    """Hash of the advertisement fields that survive an address rotation."""
+    return hash((adv.local_name, tuple(sorted(adv.manufacturer_data)),
+                 tuple(sorted(adv.service_uuids)), adv.tx_power))
+
+
+def split_label(label):
+    """Undo the f"{name} ({major})" label format."""
+    name, _, major = label.rpartition(" (")
+    return name, major[:-1]
+
+
+def merge_sightings(devices):
+    """Collapse sightings of the same address within one cycle.
+
+    Dual-mode devices show up once from the BLE scan and once from the
+    Classic inquiry, and linked rotating addresses share a canonical
+    address. The merged sighting keeps the first sighting's RSSI (BLE
+    results come first in a cycle, and the Classic inquiry only reports a
+    fixed -60), the most specific name and class, and the latest
+    observation time.
+    """
+    merged = {}
+    for device in devices:
+        mac = device[0]
+        seen = merged.get(mac)
+        merged[mac] = device if seen is None else _merge(seen, device)
+    return list(merged.values())
+
+
+def _merge(a, b):
+    mac, rssi_a, label_a, major_a, seen_a = a
+    _, rssi_b, label_b, major_b, seen_b = b
+    name_a, _ = split_label(label_a)
+    name_b, _ = split_label(label_b)
+    name = name_b if name_a in GENERIC_NAMES else name_a
+    major = major_b if major_a == "Unknown" else major_a
+    return (mac, rssi_a, f"{name} ({major})", major, max(seen_a, seen_b))
+
+
+class _Cluster:
+    __slots__ = ("canonical", "current", "fingerprint", "last_seen", "rssi")
+
+    def __init__(self, canonical, fingerprint, last_seen, rssi):
+        self.canonical = canonical
+        self.current = canonical
+        self.fingerprint = fingerprint
+        self.last_seen = last_seen
+        self.rssi = rssi
+
+
+class RotationLinker:
+    """Links rotating BLE addresses of one device into a single identity.
+
+    Each identity (cluster) is indexed by its advertisement fingerprint
+    (name, manufacturer IDs, service UUIDs, TX power). When a new
+    rotating address appears, it inherits the identity of a cluster
+    with the same fingerprint whose address went quiet between
+    ``min_gap`` and ``handover`` seconds before the new one first showed
+    up, at a similar RSSI (median of recent samples). A cluster whose
+    address is heard in the same window is still around, so it is never
+    a candidate: two phones of one model side by side stay two devices.
+    Ambiguous cases (more than one candidate) are left unlinked
+    rather than merging two people. Memory is bounded: clusters idle for
+    ``ttl`` seconds are dropped, and at most ``max_clusters`` are kept.
+    """
+
+    # min_gap: BLE's shortest advertising interval. A device cannot be
+    # heard on its new address sooner than that after its last packet on
+    # the old one.
+    def __init__(self, handover=45.0, rssi_tolerance=12, ttl=3600.0, max_clusters=20000,
+                 min_gap=0.02):
+        self.handover = handover
+        self.min_gap = min_gap
+        self.rssi_tolerance = rssi_tolerance
+        self.ttl = ttl
+        self.max_clusters = max_clusters
+        self._by_address = OrderedDict()  # address -> cluster, least recently seen first
+        self._by_fingerprint = {}         # fingerprint -> set of clusters
+        self.stats = {"linked": 0, "ambiguous": 0}
+
+    def __len__(self):
+        return len(self._by_address)
+
+    def canonical(self, snapshot):
+        """Addresses in a flushed window (sightings.WindowSnapshot) that
+        belong to an earlier address's identity, mapped to that address."""
+        out = {}
+        latest = 0.0
+        present = {snapshot.mac(slot) for slot in snapshot.slots}
+        for slot in sorted(snapshot.slots, key=snapshot.first_seen):
+            mac = snapshot.mac(slot)
+            last_seen = snapshot.last_seen(slot)
+            rssi = snapshot.rssi_recent(slot)
+            cluster = self._by_address.get(mac)
+            if cluster is None:
+                cluster = (self._claim(mac, snapshot.fingerprint(slot), snapshot.first_seen(slot), rssi,
+                                       present)
+                           or self._new_cluster(mac, snapshot.fingerprint(slot), last_seen, rssi))
+                self._by_address[mac] = cluster
+            self._by_address.move_to_end(mac)
+            cluster.current = mac
+            cluster.last_seen = max(cluster.last_seen, last_seen)
+            cluster.rssi = rssi
+            if cluster.canonical != mac:
+                out[mac] = cluster.canonical
+            latest = max(latest, last_seen)
+        if snapshot.slots:
+            self._expire(latest)
+        return out
+
+    def _claim(self, mac, fingerprint, first_seen, rssi, present):
+        if fingerprint is None or not is_rotating_address(mac):
+            return None
+        candidates = [
+            c for c in self._by_fingerprint.get(fingerprint, ())
+            if c.current not in present
+            and self.min_gap < first_seen - c.last_seen <= self.handover
+            and abs(c.rssi - rssi) <= self.rssi_tolerance
+        ]
+        if len(candidates) != 1:
+            if candidates:
+                self.stats["ambiguous"] += 1
+            return None
+        self.stats["linked"] += 1
+        return candidates[0]
+
+    def _new_cluster(self, mac, fingerprint, last_seen, rssi):
+        cluster = _Cluster(mac, fingerprint, last_seen, rssi)
+        if fingerprint is not None:
+            self._by_fingerprint.setdefault(fingerprint, set()).add(cluster)
+        return cluster
+
+    def _expire(self, now):
+        while self._by_address:
+            address, cluster = next(iter(self._by_address.items()))
+            if now - cluster.last_seen < self.ttl and len(self._by_address) <= self.max_clusters:
+                break
+            del self._by_address[address]
+            # A cluster's current address is its most recently seen, so it
+            # is evicted last; only then does the identity go away.
+            if cluster.current == address:
+                group = self._by_fingerprint.get(cluster.fingerprint)
+                if group is not None:
+                    group.discard(cluster)
+                    if not group:
+                        del self._by_fingerprint[cluster.fingerprint]
@@ -0,0 +1,266 @@
+import cProfile
+import os
+import signal
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ---- Buckets ----
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1, 5, 10, 50, 100, 200, 500, 1000, 5000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._child()
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        # Scrapes run on the server thread; copy before iterating.
+        series = list(self._children.items()) if self.labelnames else [((), self)]
+        for values, child in series:
+            child._samples(lines, self.name, self.labelnames, values)
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.value = 0
+
+    def _child(self):
+        return Counter(self.name, self.help)
+
+    def inc(self, n=1):
+        self.value += n
+
+    def _samples(self, lines, name, labelnames, values):
+        lines.append(f"{name}{_format_labels(labelnames, values)} {self.value}")
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; observe() is one bisect and two additions."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DURATION_BUCKETS, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last = above the top bucket
+        self.sum = 0.0
+
+    def _child(self):
+        return Histogram(self.name, self.help, self.buckets)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def time(self):
+        """``with histogram.time():`` observes the block's duration."""
+        return _Timer(self)
+
+    def _samples(self, lines, name, labelnames, values):
+        total = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            le = f'le="{bound}"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {total}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {self.sum}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {total}")
+
+
+class Gauge(_Metric):
+    """Read from ``fn`` at scrape time (queue depths, spool size)."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, fn):
+        super().__init__(name, help)
+        self.fn = fn
+
+    def _samples(self, lines, name, labelnames, values):
+        lines.append(f"{name} {self.fn()}")
+
+
+class StatsMetrics:
+    """Exposes a component's existing ``stats`` dict, one series per key.
+
+    Keys are counters named ``<prefix>_<key>_total``, except those listed
+    in ``gauges``. The dict is read at scrape time, so the component
+    keeps counting exactly as before.
+    """
+
+    def __init__(self, prefix, stats, help, gauges=()):
+        self.prefix = prefix
+        self.stats = stats
+        self.help = help
+        self.gauges = set(gauges)
+
+    def render(self):
+        lines = []
+        for key, value in list(self.stats.items()):
+            if key in self.gauges:
+                name, kind = f"{self.prefix}_{key}", "gauge"
+            else:
+                name, kind = f"{self.prefix}_{key}_total", "counter"
+            lines += [f"# HELP {name} {self.help} ({key})", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, name, metric):
+        # Re-registering a name replaces it (a restarted component).
+        self._metrics[name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(name, Counter(name, help, labelnames))
+
+    def histogram(self, name, help, buckets=DURATION_BUCKETS, labelnames=()):
+        return self.register(name, Histogram(name, help, buckets, labelnames))
+
+    def gauge(self, name, help, fn):
+        return self.register(name, Gauge(name, help, fn))
+
+    def stats(self, prefix, stats, help, gauges=()):
+        return self.register(prefix, StatsMetrics(prefix, stats, help, gauges))
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+gauge = REGISTRY.gauge
+stats = REGISTRY.stats
+
+
+# ---- Prometheus text endpoint ----
+def serve(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve ``GET /metrics`` from a daemon thread; returns the server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"[metrics] Serving http://{host}:{port}/metrics")
+    return server
+
+
+# ---- On-demand profiling ----
+class Profiler:
+    """Profile a running scanner on signal, without restarting it.
+
+    SIGUSR1 starts cProfile; the next SIGUSR1 stops it and writes
+    ``profile-<time>.pstats`` (main thread only: the event loop and
+    whatever it calls). SIGUSR2 writes a tracemalloc snapshot
+    ``heap-<time>.tracemalloc`` and prints the top allocation sites; the
+    first SIGUSR2 only starts tracing, since allocations made before it
+    are not tracked.
+    """
+
+    def __init__(self, directory="profiles", top=10):
+        self.directory = directory
+        self.top = top
+        self._profile = None
+
+    def install(self, loop=None):
+        if not hasattr(signal, "SIGUSR1"):  # not on Windows
+            return
+        for signum, handler in ((signal.SIGUSR1, self.toggle_profile),
+                                (signal.SIGUSR2, self.snapshot_memory)):
+            if loop is not None:
+                loop.add_signal_handler(signum, handler)
+            else:
+                signal.signal(signum, lambda *_, handler=handler: handler())
+        print(f"[metrics] kill -USR1 {os.getpid()} toggles cProfile, -USR2 snapshots memory")
+
+    def _path(self, kind, suffix):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}.{suffix}")
+
+    def toggle_profile(self):
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+            print("[metrics] cProfile started")
+            return
+        self._profile.disable()
+        path = self._path("profile", "pstats")
+        self._profile.dump_stats(path)
+        self._profile = None
+        print(f"[metrics] cProfile written to {path}")
+
+    def snapshot_memory(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            print("[metrics] tracemalloc started; signal again for a snapshot")
+            return
+        snapshot = tracemalloc.take_snapshot()
+        path = self._path("heap", "tracemalloc")
+        snapshot.dump(path)
+        current, peak = tracemalloc.get_traced_memory()
+        print(f"[metrics] tracemalloc snapshot written to {path} "
+              f"(current {current / 1024:.0f} KiB, peak {peak / 1024:.0f} KiB)")
+        for stat in snapshot.statistics("lineno")[:self.top]:
+            print(f"[metrics]   {stat}")
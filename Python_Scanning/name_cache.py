@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class NameCache:
+    """address -> (name, device class) with per-entry TTL and LRU eviction.
+
+    Failed lookups are cached as a None name with the shorter
+    ``negative_ttl`` so silent devices aren't re-queried every cycle.
+    The cache can be persisted to ``path`` as JSON so a restart doesn't
+    re-query a room full of known devices.
+    """
+
+    def __init__(self, path=None, ttl=6 * 3600, negative_ttl=300, max_entries=4096):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # address -> [name, dev_class, expires_at]
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0}
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, addr, now=None):
+        """Return (name, dev_class) if cached and unexpired, else None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(addr)
+            if entry is None or entry[2] <= now:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(addr)
+            self.stats["hits"] += 1
+            return entry[0], entry[1]
+
+    def put(self, addr, name, dev_class, now=None):
+        now = time.time() if now is None else now
+        ttl = self.ttl if name else self.negative_ttl
+        with self._lock:
+            self._entries[addr] = [name, dev_class, now + ttl]
+            self._entries.move_to_end(addr)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evicted"] += 1
+            self._dirty = True
+
+    def load(self):
+        with open(self.path) as f:
+            data = json.load(f)
+        now = time.time()
+        with self._lock:
+            for addr, entry in data.items():
+                if entry[2] > now:
+                    self._entries[addr] = entry
+
+    def save(self):
+        """Write the cache to ``path`` (atomically) if it changed."""
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            data = dict(self._entries)
+            self._dirty = False
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+
+class NameResolver:
+    """Serves names from a NameCache and looks up misses in the background.
+
+    ``lookup(addr)`` is the slow remote name request; it runs on a small
+    thread pool so the inquiry itself never waits for it. Until a lookup
+    completes the caller just gets no name.
+    """
+
+    def __init__(self, cache, lookup, workers=1):
+        self.cache = cache
+        self._lookup = lookup
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="name-lookup")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def resolve(self, addr, dev_class):
+        cached = self.cache.get(addr)
+        if cached is not None:
+            return cached[0]
+        with self._lock:
+            if addr in self._pending:
+                return None
+            self._pending.add(addr)
+        self._executor.submit(self._run, addr, dev_class)
+        return None
+
+    def pending(self):
+        return len(self._pending)
+
+    def _run(self, addr, dev_class):
+        try:
+            name = self._lookup(addr)
+        except Exception as e:
+            print(f"[Name lookup error] {addr}: {e}")
+            name = None
+        self.cache.put(addr, name, dev_class)
+        with self._lock:
+            self._pending.discard(addr)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.cache.save()
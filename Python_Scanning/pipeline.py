@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+import metrics
+import scan_bt
+import spool
+from bench_scan import stub_server
+from identity import advertisement_fingerprint, merge_sightings, normalize_address, split_label
+from classify import appearance_of
+from ring import FLAG_CLASSIC, SightingRing
+from simulated import SimulatedPopulation
+from tracelog import TraceLog
+from uploader import Uploader
+
+# ---- Multi-process scanner: one radio process, N processor processes ----
+# The radio process does nothing but receive advertisements (and run the
+# Classic inquiry) and write fixed-size records into shared-memory rings,
+# so encoding or upload work can never delay the Bleak callbacks. Each
+# processor process drains one ring, builds the per-cycle windows,
+# pseudonymizes and uploads, exactly like the single-process scan_bt loop.
+#
+# Records are sharded by advertisement fingerprint (by address when there
+# is none), so a device's rotated addresses reach the same processor and
+# can still be linked. With more than one processor, a dual-mode device's
+# BLE and Classic sightings may land on different processors and be
+# reported twice; the default is one processor. The adaptive duty cycle
+# only runs in single-process mode; here cycles are CYCLE_PERIOD long.
+#
+#     python pipeline.py --processors 2
+#     python pipeline.py --source sim --bench 30     # measure ring throughput
+#     python pipeline.py --source sim --bench 30 --bench-upload   # ... and upload to a stub server
+#
+# With --metrics-port P, processor i serves its metrics on port P + i;
+# with TRACE_LOG set, it writes its freshness trace to TRACE_LOG.i.
+
+RING_CAPACITY = 65536  # records per ring (64 bytes each)
+POLL_INTERVAL = 0.005  # seconds a processor sleeps when its ring is empty
+SIM_ADV_INTERVAL = 0.1  # seconds between advertisements per simulated device (~10k adv/s at the default rate)
+STATS_INTERVAL = 10  # seconds between radio/bench progress lines
+UPLOAD_COUNTS = ("batches", "sightings", "dropped", "failed")  # uploader stats a --bench-upload reports
+
+
+# ---- Radio process ----
+def _make_sink(rings):
+    count = len(rings)
+
+    def put(mac, rssi, name, seen_at, fingerprint=None, major=None, flags=0):
+        shard = (fingerprint if fingerprint is not None else hash(mac)) % count
+        rings[shard].put(mac, rssi, major, seen_at, fingerprint, name, flags)
+
+    return put
+
+
+async def _radio_sim(put, sim_rate, stop_at):
+    population = SimulatedPopulation(arrival_rate=sim_rate, dwell_median=scan_bt.SIM_DWELL_MEDIAN,
+                                     adv_interval=SIM_ADV_INTERVAL, seed=scan_bt.SIM_SEED)
+    print(f"[radio] Simulating {len(population)} devices, ~{len(population) / SIM_ADV_INTERVAL:.0f} adv/s")
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time()
+    next_inquiry = next_tick
+    while loop.time() < stop_at:
+        population.advance_to(time.time())
+        seen_at = scan_bt.observation_clock.now()
+        population.advertise(None, SIM_ADV_INTERVAL, put, end=seen_at)
+        if loop.time() >= next_inquiry:
+            devices = scan_bt.classic_results(population.inquiry(), seen_at)
+            for mac, rssi, label, major, device_seen_at in devices:
+                put(mac, rssi, split_label(label)[0], device_seen_at, None, major, FLAG_CLASSIC)
+            next_inquiry += scan_bt.CYCLE_PERIOD
+        next_tick += SIM_ADV_INTERVAL
+        await asyncio.sleep(max(0, next_tick - loop.time()))
+
+
+async def _radio_bluetooth(put):
+    def on_advertisement(device, advertisement_data):
+        put(normalize_address(device.address), advertisement_data.rssi,
+            advertisement_data.local_name or device.name, scan_bt.observation_clock.now(),
+            advertisement_fingerprint(advertisement_data),
+            scan_bt.classifier.classify(advertisement_data, appearance_of(device)))
+
+    scanner = scan_bt.BleakScanner(detection_callback=on_advertisement)
+    classic = scan_bt.ClassicSource()
+    await scanner.start()
+    await classic.start()
+    try:
+        while True:
+            started = time.monotonic()
+            for mac, rssi, label, major, seen_at in await classic.scan():
+                put(mac, rssi, split_label(label)[0], seen_at, None, major, FLAG_CLASSIC)
+            await asyncio.sleep(max(0, scan_bt.CYCLE_PERIOD - (time.monotonic() - started)))
+    finally:
+        await classic.stop()
+        await scanner.stop()
+
+
+def radio_main(ring_handles, source, sim_rate, duration=None):
+    rings = [SightingRing(name, lock=lock) for name, lock in ring_handles]
+    put = _make_sink(rings)
+    try:
+        if source == "sim":
+            asyncio.run(_radio_sim(put, sim_rate, time.monotonic() + (duration or float("inf"))))
+        else:
+            if scan_bt.bluetooth is None or scan_bt.BleakScanner is None:
+                raise SystemExit("[!] bleak and PyBluez are required for the radio source (try --source sim)")
+            asyncio.run(_radio_bluetooth(put))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for ring in rings:
+            ring.close()
+
+
+# ---- Processor processes ----
+async def _process(ring, index, dry_run, metrics_port=None, url=None, counts=None):
+    uploader = backlog = trace = None
+    if not dry_run:
+        if scan_bt.TRACE_LOG and url is None:
+            trace = TraceLog(f"{scan_bt.TRACE_LOG}.{index}", scan_bt.observation_clock.now)
+        # A bench (url set) spools to a scratch directory, never into the
+        # real spool that would later be replayed to the server.
+        spool_dir = (tempfile.mkdtemp(prefix=f"pipeline-bench-{index}-") if url
+                     else os.path.join(scan_bt.SPOOL_DIR, f"processor-{index}"))
+        backlog = spool.Spool(spool_dir, max_bytes=scan_bt.SPOOL_MAX_BYTES)
+        uploader = Uploader(url or scan_bt.BATCH_URL, queue_size=scan_bt.UPLOAD_QUEUE_SIZE,
+                            concurrency=scan_bt.UPLOAD_CONCURRENCY,
+                            max_retries=scan_bt.UPLOAD_MAX_RETRIES,
+                            drop_policy=scan_bt.UPLOAD_DROP_POLICY, on_failure=backlog.put,
+                            wire_format=scan_bt.UPLOAD_WIRE_FORMAT,
+                            compression=scan_bt.UPLOAD_COMPRESSION, trace=trace)
+        await uploader.start()
+        metrics.stats("scanner_upload", uploader.stats, "Uploads")
+        metrics.gauge("scanner_upload_queue_depth", "Batches waiting for an upload worker", uploader.depth)
+    metrics.gauge("scanner_ring_lag", "Records waiting in this processor's ring", lambda: len(ring))
+    if metrics_port:
+        metrics.serve(metrics_port + index, scan_bt.METRICS_HOST)
+    metrics.Profiler(os.path.join(scan_bt.PROFILE_DIR, f"processor-{index}")).install(asyncio.get_running_loop())
+    loop = asyncio.get_running_loop()
+    window = scan_bt.ble_window
+    classic = []
+    next_cycle = loop.time() + scan_bt.CYCLE_PERIOD
+    try:
+        while True:
+            records = ring.get_many()
+            for mac, rssi, major, seen_at, fingerprint, name, flags in records:
+                if flags & FLAG_CLASSIC:
+                    classic.append((mac, rssi, scan_bt.device_label(name or "BT_Device", major), major, seen_at))
+                else:
+                    window.add(mac, rssi, name, seen_at, fingerprint, major)
+            if loop.time() >= next_cycle:
+                started = time.perf_counter()
+                devices = merge_sightings(scan_bt.summarise_ble_window(window) + classic)
+                classic = []
+                if dry_run:
+                    json.dumps(scan_bt.build_payloads(devices))
+                else:
+                    await scan_bt.queue_devices(uploader, devices)
+                scan_bt.PHASE_SECONDS.labels("process").observe(time.perf_counter() - started)
+                scan_bt.CYCLE_DEVICES.observe(len(devices))
+                print(f"[proc {index}] {len(devices)} devices in {time.perf_counter() - started:.3f}s, "
+                      f"ring lag {len(ring)}" + (f" stats={uploader.stats}" if uploader else ""))
+                next_cycle += scan_bt.CYCLE_PERIOD
+            if counts is not None and uploader is not None:
+                for i, key in enumerate(UPLOAD_COUNTS):
+                    counts[len(UPLOAD_COUNTS) * index + i] = uploader.stats[key]
+            # Yield on every pass, not only when the ring is empty: queueing
+            # never suspends, so under steady traffic the upload workers on
+            # this loop would otherwise never run, and the queue would fill
+            # and drop batches.
+            await asyncio.sleep(0 if records else POLL_INTERVAL)
+    finally:
+        if uploader is not None:
+            await uploader.stop(drain=False)
+            backlog.close()
+        if trace is not None:
+            trace.close()
+
+
+def processor_main(ring_name, lock, index, dry_run=False, metrics_port=None, url=None, counts=None):
+    ring = SightingRing(ring_name, lock=lock)
+    try:
+        asyncio.run(_process(ring, index, dry_run, metrics_port, url, counts))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+
+# ---- Supervisor ----
+def run(processors=1, source=scan_bt.SCAN_SOURCE, sim_rate=scan_bt.SIM_ARRIVAL_RATE, bench=None,
+        metrics_port=scan_bt.METRICS_PORT, bench_upload=False):
+    ctx = multiprocessing.get_context("spawn")
+    rings = [SightingRing(capacity=RING_CAPACITY, lock=ctx.Lock()) for _ in range(processors)]
+    with contextlib.ExitStack() as stack:
+        url = stack.enter_context(stub_server()) if bench is not None and bench_upload else None
+        counts = ctx.Array("q", len(UPLOAD_COUNTS) * processors, lock=False) if url else None
+        _supervise(ctx, rings, source, sim_rate, bench, metrics_port, url, counts)
+
+
+def _supervise(ctx, rings, source, sim_rate, bench, metrics_port, url, counts):
+    processors = len(rings)
+    dry_run = bench is not None and url is None
+    workers = [ctx.Process(target=processor_main,
+                           args=(ring.name, ring.lock, i, dry_run, metrics_port, url, counts),
+                           name=f"processor-{i}", daemon=True)
+               for i, ring in enumerate(rings)]
+    radio = ctx.Process(target=radio_main, args=([(r.name, r.lock) for r in rings], source, sim_rate, bench),
+                        name="radio", daemon=True)
+    started = time.monotonic()
+    try:
+        for worker in workers:
+            worker.start()
+        radio.start()
+        last = (started, 0, 0)
+        while radio.is_alive() and all(w.is_alive() for w in workers):
+            radio.join(STATS_INTERVAL)
+            now = time.monotonic()
+            written, read, dropped = _totals(rings)
+            print(f"[pipeline] in {(written - last[1]) / (now - last[0]):.0f}/s "
+                  f"out {(read - last[2]) / (now - last[0]):.0f}/s lag {written - read} dropped {dropped}")
+            last = (now, written, read)
+    except KeyboardInterrupt:
+        print("\n[!] Exiting...")
+    finally:
+        written, read, dropped = _totals(rings)
+        elapsed = time.monotonic() - started
+        for process in workers + [radio]:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        for ring in rings:
+            ring.close()
+    if bench is not None:
+        print(f"[bench] {processors} processor(s), {elapsed:.1f}s: {written} records written "
+              f"({written / elapsed:.0f}/s), {read} processed ({read / elapsed:.0f}/s), "
+              f"{dropped} dropped ({dropped / max(1, written + dropped):.2%})")
+    if counts is not None:
+        totals = {key: sum(counts[i::len(UPLOAD_COUNTS)]) for i, key in enumerate(UPLOAD_COUNTS)}
+        print(f"[bench] uploaded {totals['sightings']} sightings in {totals['batches']} batches, "
+              f"{totals['dropped']} dropped from the upload queue, {totals['failed']} failed")
+
+
+def _totals(rings):
+    written = read = dropped = 0
+    for ring in rings:
+        head, tail, lost = ring.counters()
+        written += head
+        read += tail
+        dropped += lost
+    return written, read, dropped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the scanner as a radio process plus processor processes.")
+    parser.add_argument("--processors", type=int, default=1)
+    parser.add_argument("--source", choices=["radio", "sim"], default=scan_bt.SCAN_SOURCE)
+    parser.add_argument("--sim-rate", type=float, default=scan_bt.SIM_ARRIVAL_RATE,
+                        help="simulated arrivals per second (~10k adv/s at 0.5)")
+    parser.add_argument("--bench", type=float, metavar="SECONDS",
+                        help="run for SECONDS and report ring throughput (no uploads unless --bench-upload)")
+    parser.add_argument("--bench-upload", action="store_true",
+                        help="with --bench, upload through the real Uploader to a local stub server")
+    parser.add_argument("--metrics-port", type=int, default=scan_bt.METRICS_PORT,
+                        help="processor i serves Prometheus metrics on this port + i")
+    args = parser.parse_args()
+    run(args.processors, args.source, args.sim_rate, args.bench, args.metrics_port, args.bench_upload)
@@ -0,0 +1,74 @@
+import time
+
+# ---- Event types attached to uploaded payloads ----
+APPEAR = "appear"
+UPDATE = "update"        # RSSI moved by at least the threshold, or name/class changed
+HEARTBEAT = "heartbeat"  # nothing changed, but the device is still here
+DEPART = "depart"
+
+
+class _Presence:
+    __slots__ = ("payload", "last_seen", "sent_rssi", "sent_at")
+
+    def __init__(self, payload, now):
+        self.payload = payload
+        self.last_seen = now
+        self.sent_rssi = payload["rssi"]
+        self.sent_at = now
+
+
+class PresenceTracker:
+    """Edge-side delta filter for the per-cycle payload list.
+
+    Keeps one state entry per pseudonym and lets through only payloads
+    that carry news: the first sighting (appear), an RSSI change of at
+    least ``rssi_threshold`` dB from the last value sent or a new
+    name/class (update), and a periodic ``heartbeat``. A device is
+    reported as departed once it has been missing for ``timeout``
+    seconds, so one missed scan window doesn't cause a depart/appear pair.
+    """
+
+    def __init__(self, timeout=60, rssi_threshold=6, heartbeat=60):
+        self.timeout = timeout
+        self.rssi_threshold = rssi_threshold
+        self.heartbeat = heartbeat
+        self._devices = {}
+        self.stats = {"seen": 0, "sent": 0}
+
+    def __len__(self):
+        return len(self._devices)
+
+    def filter(self, payloads, now=None):
+        """Return the payloads worth uploading, each tagged with an "event"."""
+        now = time.time() if now is None else now
+        out = []
+        for payload in payloads:
+            key = payload["pseudonym"]
+            state = self._devices.get(key)
+            if state is None:
+                self._devices[key] = _Presence(payload, now)
+                out.append(dict(payload, event=APPEAR))
+                continue
+            previous = state.payload
+            state.payload = payload
+            state.last_seen = now
+            if (abs(payload["rssi"] - state.sent_rssi) >= self.rssi_threshold
+                    or payload["name"] != previous["name"]
+                    or payload["major_class"] != previous["major_class"]):
+                event = UPDATE
+            elif now - state.sent_at >= self.heartbeat:
+                event = HEARTBEAT
+            else:
+                continue
+            state.sent_rssi = payload["rssi"]
+            state.sent_at = now
+            out.append(dict(payload, event=event))
+        out.extend(self._expire(now))
+        self.stats["seen"] += len(payloads)
+        self.stats["sent"] += len(out)
+        return out
+
+    def _expire(self, now):
+        gone = [key for key, state in self._devices.items()
+                if now - state.last_seen >= self.timeout]
+        return [dict(self._devices.pop(key).payload, event=DEPART) for key in gone]
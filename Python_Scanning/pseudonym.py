@@ -0,0 +1,107 @@
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+
+PSEUDONYM_HEX_CHARS = 12  # 48 bits, the width the dashboard has always stored
+
+
+def _hmac_states(key):
+    """SHA-256 states with the HMAC inner and outer padded keys absorbed (RFC 2104)."""
+    block = hashlib.sha256().block_size
+    if len(key) > block:
+        key = hashlib.sha256(key).digest()
+    key = key.ljust(block, b"\0")
+    inner = hashlib.sha256(bytes(b ^ 0x36 for b in key))
+    outer = hashlib.sha256(bytes(b ^ 0x5C for b in key))
+    return inner, outer
+
+
+class Pseudonymizer:
+    """Keyed, rotating pseudonyms for device addresses.
+
+    pseudonym = HMAC-SHA256(epoch key, address), truncated to 12 hex
+    characters. Each epoch key is derived from the master key and the
+    epoch number (``floor(t / rotation)``), so pseudonyms change at every
+    epoch boundary and can't be linked across epochs without the key.
+    ``rotation=0`` keeps one key forever.
+
+    For each epoch the HMAC inner and outer SHA-256 states (key XOR
+    ipad/opad) are absorbed once; hashing an address then only clones
+    them, which skips the hmac module's per-call key setup. Results are
+    kept in a bounded LRU. Contexts stay valid ``overlap`` seconds past
+    their epoch (and are built ``overlap`` seconds early), so sightings
+    stamped just before a rollover but hashed just after it still get
+    their own epoch's pseudonym.
+    """
+
+    def __init__(self, master_key, rotation=24 * 3600, overlap=600, cache_size=65536):
+        self.master_key = master_key.encode() if isinstance(master_key, str) else master_key
+        self.rotation = rotation
+        self.overlap = overlap
+        self.cache_size = cache_size
+        self._contexts = {}
+        self._cache = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "rotations": 0}
+
+    def epoch(self, t):
+        return int(t // self.rotation) if self.rotation else 0
+
+    def _context(self, epoch):
+        ctx = self._contexts.get(epoch)
+        if ctx is None:
+            if self.rotation:
+                key = hmac.new(self.master_key, b"epoch:%d" % epoch, hashlib.sha256).digest()
+            else:
+                key = self.master_key
+            ctx = self._contexts[epoch] = _hmac_states(key)
+        return ctx
+
+    def rotate(self, now=None):
+        """Drop contexts past their overlap and pre-build the next epoch's."""
+        if not self.rotation:
+            return
+        now = time.time() if now is None else now
+        current = self.epoch(now)
+        keep = {current}
+        if now - current * self.rotation < self.overlap:
+            keep.add(current - 1)
+        if (current + 1) * self.rotation - now < self.overlap:
+            keep.add(current + 1)
+        retired = [epoch for epoch in self._contexts if epoch not in keep]
+        for epoch in retired:
+            del self._contexts[epoch]
+            self.stats["rotations"] += 1
+        if retired:
+            self._cache = OrderedDict((k, v) for k, v in self._cache.items() if k[0] in keep)
+        for epoch in keep:
+            self._context(epoch)
+
+    def pseudonymize(self, address, at=None):
+        return self.pseudonymize_many([(address, time.time() if at is None else at)])[0]
+
+    def pseudonymize_many(self, items):
+        """Pseudonyms for a whole scan cycle of (address, observed_at) pairs."""
+        cache = self._cache
+        rotation = self.rotation
+        out = []
+        misses = 0
+        for address, at in items:
+            key = (int(at // rotation) if rotation else 0, address)
+            pseudonym = cache.get(key)
+            if pseudonym is None:
+                misses += 1
+                inner, outer = self._context(key[0])
+                h = inner.copy()
+                h.update(address.encode())
+                o = outer.copy()
+                o.update(h.digest())
+                pseudonym = cache[key] = o.hexdigest()[:PSEUDONYM_HEX_CHARS]
+                if len(cache) > self.cache_size:
+                    cache.popitem(last=False)
+            else:
+                cache.move_to_end(key)
+            out.append(pseudonym)
+        self.stats["misses"] += misses
+        self.stats["hits"] += len(items) - misses
+        return out
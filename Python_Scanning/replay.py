@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import time
+
+import scan_bt
+import wire
+from capture import read_capture
+from uploader import BLOCK, Uploader
+
+
+def schedule(cycles, speed, timing, max_gap):
+    """Yield (offset_seconds, cycle_ts, devices) with the replay timing applied."""
+    start = prev = None
+    offset = 0.0
+    for ts, devices in cycles:
+        if start is None:
+            start = prev = ts
+        gap = ts - prev
+        if timing == "compressed":
+            gap = min(gap, max_gap)
+        offset += gap
+        prev = ts
+        yield (offset / speed if speed else 0.0), ts, devices
+
+
+async def replay(path, url, speed, timing, max_gap, batch_size, concurrency,
+                 wire_format="json", compression=None):
+    uploader = Uploader(url, queue_size=concurrency * 4, concurrency=concurrency,
+                        drop_policy=BLOCK, wire_format=wire_format, compression=compression)
+    await uploader.start()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    cycles = sightings = 0
+    for offset, cycle_ts, devices in schedule(read_capture(path), speed, timing, max_gap):
+        delay = started + offset - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Re-stamp observations as if they happened now, keeping each
+        # sighting's offset within its cycle.
+        shift = time.time() - cycle_ts
+        devices = [(mac, rssi, label, major, seen_at + shift)
+                   for mac, rssi, label, major, seen_at in devices]
+        for batch in scan_bt.chunked(scan_bt.build_payloads(devices), batch_size):
+            await uploader.submit(batch)
+        cycles += 1
+        sightings += len(devices)
+    await uploader.stop(drain=True)
+    elapsed = loop.time() - started
+    print(f"[replay] {cycles} cycles, {sightings} sightings in {elapsed:.2f}s "
+          f"({sightings / elapsed if elapsed else 0:.0f} sightings/s) stats={uploader.stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a scan_bt.py capture into the ingestion API.")
+    parser.add_argument("capture")
+    parser.add_argument("--url", default=scan_bt.BATCH_URL)
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="time scale, e.g. 1 or 10; 0 replays as fast as possible")
+    parser.add_argument("--timing", choices=["original", "compressed"], default="original",
+                        help="compressed caps idle gaps between cycles at --max-gap")
+    parser.add_argument("--max-gap", type=float, default=scan_bt.CYCLE_PERIOD)
+    parser.add_argument("--batch-size", type=int, default=scan_bt.UPLOAD_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=scan_bt.UPLOAD_CONCURRENCY)
+    parser.add_argument("--wire-format", choices=["json", "binary"], default=scan_bt.UPLOAD_WIRE_FORMAT)
+    parser.add_argument("--compression", choices=wire.COMPRESSIONS, default=scan_bt.UPLOAD_COMPRESSION)
+    args = parser.parse_args()
+    asyncio.run(replay(args.capture, args.url, args.speed, args.timing, args.max_gap,
+                       args.batch_size, args.concurrency, args.wire_format, args.compression))
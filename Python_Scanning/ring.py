@@ -0,0 +1,142 @@
+import multiprocessing
+import struct
+from multiprocessing import shared_memory
+
+# ---- Layout ----
+# 64-byte header: head (records written), tail (records read), dropped,
+# capacity. Then ``capacity`` fixed 64-byte records. head and tail only
+# ever grow; slot = index % capacity.
+HEADER = struct.Struct("<QQQQ")
+HEADER_SIZE = 64
+_HEAD, _TAIL, _DROPPED = 0, 8, 16
+_COUNTER = struct.Struct("<Q")
+
+# Sighting record: address, rssi, class code, flags, observation time,
+# advertisement fingerprint, name length, name (UTF-8, truncated).
+RECORD = struct.Struct("<6sbBBdqB31s7x")
+NAME_BYTES = 31
+
+FLAG_CLASSIC = 0x01  # from the Classic inquiry, not a BLE advertisement
+
+# Class codes; 0 = not classified.
+CLASS_NAMES = (None, "Misc", "Computer", "Phone", "LAN/Network", "Audio/Video",
+               "Peripheral", "Imaging", "Wearable", "Toy", "Health", "Unknown")
+CLASS_CODES = {name: code for code, name in enumerate(CLASS_NAMES)}
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching also registers the segment with the
+        # resource tracker; processes started by pipeline.run share the
+        # creator's tracker, so that is harmless.
+        return shared_memory.SharedMemory(name=name)
+
+
+class SightingRing:
+    """Single-producer, single-consumer ring of sighting records in shared memory.
+
+    One process creates the ring (``name=None``) and owns its lifetime;
+    the producer (radio process) and consumer (a processor process)
+    attach by ``name`` and call ``put()`` and ``get_many()``. The producer writes a record, then publishes it by
+    advancing ``head``; the consumer reads up to ``head``, then frees
+    the slots by advancing ``tail``. Neither side ever waits for the
+    other's work: when the ring is full, ``put()`` drops the record and
+    counts it, so a slow consumer can never stall the radio callbacks.
+
+    Plain stores to shared memory carry no ordering guarantee, and ARM
+    (the Raspberry Pi) may make ``head`` visible before the record it
+    publishes. So head, tail and dropped are only read and written under
+    ``lock``, a process-shared semaphore whose acquire and release are
+    full memory barriers. It is held for one counter access, never while
+    records are copied. Attaching processes must be given the creator's
+    ``lock`` (pass it to the process along with ``name``).
+    """
+
+    def __init__(self, name=None, capacity=65536, lock=None):
+        if name is None:
+            self._shm = shared_memory.SharedMemory(
+                create=True, size=HEADER_SIZE + capacity * RECORD.size)
+            HEADER.pack_into(self._shm.buf, 0, 0, 0, 0, capacity)
+            self._owner = True
+            # A spawn-context lock can be handed to spawned processes.
+            lock = lock or multiprocessing.get_context("spawn").Lock()
+        else:
+            if lock is None:
+                raise ValueError("Attaching to a ring needs its creator's lock")
+            self._shm = _attach(name)
+            capacity = HEADER.unpack_from(self._shm.buf, 0)[3]
+            self._owner = False
+        self.name = self._shm.name
+        self.lock = lock
+        self.capacity = capacity
+        self._buf = self._shm.buf
+        with lock:
+            head, tail, dropped, _ = HEADER.unpack_from(self._buf, 0)
+        self._head = head  # producer's own copy
+        self._tail = tail  # consumer's own copy
+        self._tail_seen = tail  # producer's last read of tail
+        self._dropped = dropped
+
+    def __len__(self):
+        head, tail = self.counters()[:2]
+        return head - tail
+
+    def counters(self):
+        """(records written, records read, records dropped) since creation."""
+        with self.lock:
+            return HEADER.unpack_from(self._buf, 0)[:3]
+
+    # ---- Producer side ----
+    def put(self, mac, rssi, major, seen_at, fingerprint=0, name=None, flags=0):
+        """Append one sighting; False (and counted as dropped) if the ring is full."""
+        head = self._head
+        if head - self._tail_seen >= self.capacity:
+            # Looks full from the last tail read; check the current one.
+            with self.lock:
+                self._tail_seen = _COUNTER.unpack_from(self._buf, _TAIL)[0]
+                if head - self._tail_seen >= self.capacity:
+                    self._dropped += 1
+                    _COUNTER.pack_into(self._buf, _DROPPED, self._dropped)
+                    return False
+        encoded = name.encode("utf-8")[:NAME_BYTES] if name else b""
+        RECORD.pack_into(self._buf, HEADER_SIZE + (head % self.capacity) * RECORD.size,
+                         bytes.fromhex(mac), max(-128, min(127, rssi)), CLASS_CODES.get(major, 0),
+                         flags, seen_at, fingerprint or 0, len(encoded), encoded)
+        self._head = head + 1
+        with self.lock:
+            _COUNTER.pack_into(self._buf, _HEAD, self._head)
+        return True
+
+    # ---- Consumer side ----
+    def get_many(self, limit=4096):
+        """Take up to ``limit`` records as (mac, rssi, major, seen_at, fingerprint, name, flags)."""
+        tail = self._tail
+        with self.lock:
+            head = _COUNTER.unpack_from(self._buf, _HEAD)[0]
+        available = min(limit, head - tail)
+        if available <= 0:
+            return []
+        out = []
+        start = tail % self.capacity
+        # Up to two contiguous runs: to the end of the buffer, then from the start.
+        for first, count in ((start, min(available, self.capacity - start)),
+                             (0, available - min(available, self.capacity - start))):
+            if not count:
+                continue
+            offset = HEADER_SIZE + first * RECORD.size
+            with self._buf[offset:offset + count * RECORD.size] as view:
+                for mac, rssi, major, flags, seen_at, fingerprint, length, name in RECORD.iter_unpack(view):
+                    out.append((mac.hex(), rssi, CLASS_NAMES[major], seen_at, fingerprint or None,
+                                name[:length].decode("utf-8", "ignore") or None, flags))
+        self._tail = tail + available
+        with self.lock:
+            _COUNTER.pack_into(self._buf, _TAIL, self._tail)
+        return out
+
+    def close(self):
+        self._buf.release()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
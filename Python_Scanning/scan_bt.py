@@ -1,15 +1,85 @@
+import argparse
 import asyncio
-import hashlib
 import requests
 import time
-import bluetooth
-from bleak import BleakScanner
+
+try:
+    import bluetooth
+except ImportError:  # PyBluez is only needed for the radio source
+    bluetooth = None
+try:
+    from bleak import BleakScanner
+except ImportError:
+    BleakScanner = None
+
+import metrics
+import spool
+from capture import CaptureWriter
+from classify import Classifier, appearance_of, name_class
+from clock import ObservationClock
+from duty_cycle import INQUIRY_UNIT, DutyCycleScheduler
+from identity import RotationLinker, advertisement_fingerprint, merge_sightings, normalize_address
+from name_cache import NameCache, NameResolver
+from presence import PresenceTracker
+from pseudonym import Pseudonymizer
+from sightings import SightingWindow
+from sources import ScanSource
+from tracelog import TraceLog
+from simulated import SimulatedPopulation, SimulatedSource
+from uploader import FAILED, Uploader
 
 # ---- Config ----
 SERVER_URL = "http://192.168.1.107:3000/api/device-log"
-SESSION_KEY = "temporary_secret_2025"
+BATCH_URL = "http://192.168.1.107:3000/api/device-log-batch"
+UPLOAD_BATCH_SIZE = 200  # sightings per batch request (server caps at 1000)
+UPLOAD_QUEUE_SIZE = 64  # batches held in memory while the server catches up
+UPLOAD_CONCURRENCY = 4  # requests in flight / pooled keep-alive connections
+UPLOAD_MAX_RETRIES = 5
+UPLOAD_DROP_POLICY = "drop_oldest"  # or "drop_newest", "block"
+UPLOAD_WIRE_FORMAT = "binary"  # or "json"; the scanner falls back to JSON if the server answers 415
+UPLOAD_COMPRESSION = "gzip"  # or "zstd" (needs the zstandard package), None
+# Delta uploads: send only appearances, departures, RSSI changes and heartbeats.
+# Dashboard windows (live-count uses 20 s) must be longer than DELTA_HEARTBEAT
+# before this can be turned on.
+DELTA_UPLOADS = False
+DELTA_TIMEOUT = 60  # seconds unseen before a device is reported as departed
+DELTA_RSSI_THRESHOLD = 6  # dB change from the last value sent
+DELTA_HEARTBEAT = 60  # seconds between re-sends of an unchanged device
+SPOOL_DIR = "spool"  # batches that fail to upload are kept here until the server is back
+SPOOL_MAX_BYTES = 256 * 1024 * 1024  # oldest segments are evicted past this
+SPOOL_REPLAY_INTERVAL = 30  # seconds between replay attempts
+SPOOL_REPLAY_BATCH_SIZE = 1000
+SPOOL_REPLAY_RATE = 5  # max replay batches per second
+SESSION_KEY = "temporary_secret_2025"  # master key for the keyed pseudonyms
+PSEUDONYM_ROTATION = 24 * 3600  # seconds per pseudonym epoch (0 = never rotate)
+PSEUDONYM_OVERLAP = 600  # seconds an epoch's key stays usable around its boundary
+PSEUDONYM_CACHE_SIZE = 16384  # addresses; a few cycles' worth of a large crowd
 SCAN_INTERVAL = 10
+BLE_CONTINUOUS = True  # keep one BleakScanner running and flush a window per cycle
 SCANNER_LOCATION = "Room_B"
+CLASSIC_INQUIRY_DURATION = 8  # PyBluez units of 1.28 s
+NAME_CACHE_PATH = "name_cache.json"  # Classic address -> (name, class), survives restarts
+NAME_CACHE_TTL = 6 * 3600  # seconds before a cached name is looked up again
+NAME_LOOKUP_TIMEOUT = 5  # seconds per remote name request
+CYCLE_PERIOD = 15  # seconds between cycle starts (BLE + Classic run side by side)
+ADAPTIVE_DUTY_CYCLE = True  # size the cycle and Classic inquiry by discovery yield
+CYCLE_PERIOD_MIN = 5
+# Must stay below the shortest dashboard window (live-count uses 20 s) with
+# room for the upload, or devices still present drop off between cycles.
+CYCLE_PERIOD_MAX = 15
+ROTATION_LINKING = True  # follow a BLE device across private address rotations
+ROTATION_HANDOVER = 45  # max seconds between the old address going quiet and the new one appearing
+ROTATION_RSSI_TOLERANCE = 12  # dB
+SCAN_SOURCE = "radio"  # or "sim" for the simulated crowd (no Bluetooth needed)
+SIM_ARRIVAL_RATE = 0.5  # simulated arrivals per second (~1000 devices present)
+SIM_DWELL_MEDIAN = 1200  # median simulated stay, seconds
+SIM_SPEED = 1  # 0 = don't wait out scan windows
+SIM_SEED = None
+CAPTURE_PATH = None  # record raw scan cycles here for replay.py
+METRICS_PORT = None  # e.g. 9108 serves Prometheus text at http://127.0.0.1:9108/metrics
+METRICS_HOST = "127.0.0.1"
+TRACE_LOG = None  # e.g. "trace.jsonl": per-batch freshness trace for freshness_report.py
+PROFILE_DIR = "profiles"  # where SIGUSR1 (cProfile) and SIGUSR2 (tracemalloc) write
 
 # ---- Major Class Mappi
 MAJOR_CLASSES = {
@@ -26,90 +96,391 @@ MAJOR_CLASSES = {
 }
 
 
-def hash_mac(mac, session_key):
-    return hashlib.sha256((mac + session_key).encode()).hexdigest()[:12]
+pseudonymizer = Pseudonymizer(SESSION_KEY, PSEUDONYM_ROTATION, PSEUDONYM_OVERLAP, PSEUDONYM_CACHE_SIZE)
+
 
 def parse_major_class(device_class):
     major = (device_class >> 8) & 0x1F
     return MAJOR_CLASSES.get(major, "Unknown")
 
-def scan_classic_bt():
-    try:
-        print("Scanning Classic Bluetooth devices...")
-        devices = bluetooth.discover_devices(duration=8, lookup_names=True, lookup_class=True)
-        results = []
-        for addr, name, dev_class in devices:
-            mac = addr.replace(":", "")
-            rssi = -60  # Classic BT doesn't return RSSI
-            major = parse_major_class(dev_class)
-            label = f"{name or 'BT_Device'} ({major})"
-            results.append((mac, rssi, label))
-        return results
-    except Exception as e:
-        print(f"[Classic BT Error] {e}")
-        return []
+observation_clock = ObservationClock()
+ble_window = SightingWindow(observation_clock.now)
+rotation_linker = RotationLinker(ROTATION_HANDOVER, ROTATION_RSSI_TOLERANCE)
+classifier = Classifier()
+
+# ---- Metrics ----
+PHASE_SECONDS = metrics.histogram("scanner_phase_seconds", "Wall time per cycle phase",
+                                  labelnames=("phase",))
+SIGHTINGS = metrics.counter("scanner_sightings_total", "Devices reported per source",
+                            labelnames=("source",))
+CYCLE_DEVICES = metrics.histogram("scanner_cycle_devices", "Devices per cycle after merging",
+                                  metrics.SIZE_BUCKETS)
+metrics.stats("scanner_pseudonym", pseudonymizer.stats, "Pseudonym cache")
+metrics.stats("scanner_rotation", rotation_linker.stats, "Rotating BLE addresses")
+metrics.stats("scanner_classifier", classifier.stats, "Advertisement classifier cache")
+metrics.stats("scanner_clock", observation_clock.stats, "Observation clock", gauges=("last_error",))
+
+
+def on_advertisement(device, advertisement_data):
+    ble_window.add(normalize_address(device.address), advertisement_data.rssi,
+                   advertisement_data.local_name or device.name, None,
+                   advertisement_fingerprint(advertisement_data),
+                   classifier.classify(advertisement_data, appearance_of(device)))
+
+
+_labels = {}  # major -> name -> "name (major)", so labels aren't rebuilt every cycle
+
+
+def device_label(name, major):
+    by_name = _labels.get(major)
+    if by_name is None:
+        by_name = _labels[major] = {}
+    label = by_name.get(name)
+    if label is None:
+        if len(by_name) >= 65536:
+            by_name.clear()
+        label = by_name[name] = f"{name} ({major})"
+    return label
 
 
-async def scan_ble():
-    devices = await BleakScanner.discover(timeout=SCAN_INTERVAL)
+def summarise_ble_window(window):
+    # Summarise every advertisement seen since the previous flush (mean RSSI per device).
+    snapshot = window.flush()
+    print(f"[ble] {snapshot.advertisements} advertisements from {len(snapshot)} devices")
+    # Rotated addresses of one device report under its first address.
+    canonical = rotation_linker.canonical(snapshot) if ROTATION_LINKING else {}
     results = []
-    for d in devices:
-        mac = d.address.replace(":", "").lower()
-        name = d.name or "BLE_Device"
-        rssi = d.rssi
-        major = "Unknown"  # For BLE devices, we don't have class
-        label = f"{name} ({major})"
-        results.append((mac, rssi, label, major))
+    for slot in snapshot.slots:
+        mac = snapshot.mac(slot)
+        name = snapshot.name(slot)
+        major = snapshot.major(slot) or (name and name_class(name)) or "Unknown"
+        label = device_label(name or "BLE_Device", major)
+        results.append((canonical.get(mac, mac), snapshot.rssi_mean(slot), label, major,
+                        snapshot.last_seen(slot)))
     return results
 
+
+async def scan_ble(window=SCAN_INTERVAL):
+    if BLE_CONTINUOUS:
+        # The scanner never stops; just wait out the window.
+        await asyncio.sleep(window)
+        return summarise_ble_window(ble_window)
+    devices = await BleakScanner.discover(timeout=window, return_adv=True)
+    seen_at = observation_clock.now()
+    results = []
+    for d, adv in devices.values():
+        mac = normalize_address(d.address)
+        name = adv.local_name or d.name or "BLE_Device"
+        rssi = adv.rssi
+        major = classifier.classify(adv, appearance_of(d)) or "Unknown"
+        label = device_label(name, major)
+        results.append((mac, rssi, label, major, seen_at))
+    return results
+
+
 # Classic Bluetooth already extracts major class
-def scan_classic_bt():
+def classic_results(devices, seen_at):
+    results = []
+    for addr, name, dev_class in devices:
+        mac = normalize_address(addr)
+        rssi = -60  # Classic BT doesn't return RSSI
+        major = parse_major_class(dev_class)
+        label = device_label(name or "BT_Device", major)
+        results.append((mac, rssi, label, major, seen_at))
+    return results
+
+
+def scan_classic_bt(resolver=None, duration=CLASSIC_INQUIRY_DURATION):
     try:
         print("Scanning Classic Bluetooth devices...")
-        devices = bluetooth.discover_devices(duration=8, lookup_names=True, lookup_class=True)
-        results = []
-        for addr, name, dev_class in devices:
-            mac = addr.replace(":", "")
-            rssi = -60  # Classic BT doesn't return RSSI
-            major = parse_major_class(dev_class)
-            label = f"{name or 'BT_Device'} ({major})"
-            results.append((mac, rssi, label, major))
-        return results
+        if resolver is None:
+            devices = bluetooth.discover_devices(duration=duration, lookup_names=True, lookup_class=True)
+            return classic_results(devices, observation_clock.now())
+        # Inquiry without remote name requests (the slow part); names come
+        # from the cache, and misses are looked up in the background.
+        found = bluetooth.discover_devices(duration=duration, lookup_names=False, lookup_class=True)
+        devices = [(addr, resolver.resolve(addr, dev_class), dev_class) for addr, dev_class in found]
+        seen_at = observation_clock.now()
+        resolver.cache.save()
+        return classic_results(devices, seen_at)
     except Exception as e:
         print(f"[Classic BT Error] {e}")
         return []
 
 
+# ---- Scan sources ----
+class BleSource(ScanSource):
+    name = "ble"
+    window = SCAN_INTERVAL
+    period = CYCLE_PERIOD
+
+    def __init__(self):
+        self._scanner = None
+        self._flushed = None
+
+    async def start(self):
+        if BLE_CONTINUOUS:
+            self._scanner = BleakScanner(detection_callback=on_advertisement)
+            await self._scanner.start()
+        self._flushed = time.monotonic()
+
+    async def stop(self):
+        if self._scanner:
+            await self._scanner.stop()
+
+    async def scan(self):
+        results = await scan_ble(self.window)
+        # The continuous scanner listened since the previous flush.
+        now = time.monotonic()
+        self.scanned = now - self._flushed if BLE_CONTINUOUS else self.window
+        self._flushed = now
+        return results
+
+
+class ClassicSource(ScanSource):
+    name = "classic"
+    window = CLASSIC_INQUIRY_DURATION * INQUIRY_UNIT
+    period = CYCLE_PERIOD
+
+    def __init__(self):
+        self._resolver = None
+
+    async def start(self):
+        cache = NameCache(NAME_CACHE_PATH, ttl=NAME_CACHE_TTL)
+        print(f"[classic] Loaded {len(cache)} cached device names")
+        self._resolver = NameResolver(
+            cache, lambda addr: bluetooth.lookup_name(addr, timeout=NAME_LOOKUP_TIMEOUT))
+
+    async def stop(self):
+        self._resolver.close()
+
+    async def scan(self):
+        duration = round(self.window / INQUIRY_UNIT)
+        self.scanned = duration * INQUIRY_UNIT
+        if not duration:
+            return []
+        # PyBluez blocks for the whole inquiry, so keep it off the event loop.
+        return await asyncio.get_running_loop().run_in_executor(
+            None, scan_classic_bt, self._resolver, duration)
+
+
+def make_sources(kind):
+    if kind == "sim":
+        population = SimulatedPopulation(arrival_rate=SIM_ARRIVAL_RATE,
+                                         dwell_median=SIM_DWELL_MEDIAN, seed=SIM_SEED)
+        print(f"[sim] Starting with {len(population)} simulated devices")
+        window = SightingWindow(observation_clock.now)
+
+        def ble(seconds):
+            population.advertise(window, seconds, end=observation_clock.now())
+            return summarise_ble_window(window)
+
+        def classic(seconds):
+            return classic_results(population.inquiry(classic_source.window), observation_clock.now())
+
+        classic_source = SimulatedSource(population, "classic", classic,
+                                         CLASSIC_INQUIRY_DURATION * INQUIRY_UNIT, CYCLE_PERIOD, SIM_SPEED)
+        return [SimulatedSource(population, "ble", ble, SCAN_INTERVAL, CYCLE_PERIOD, SIM_SPEED,
+                                continuous=True),
+                classic_source]
+    if kind != "radio":
+        raise ValueError(f"Unknown scan source: {kind}")
+    if bluetooth is None or BleakScanner is None:
+        raise SystemExit("[!] bleak and PyBluez are required for the radio source (try --source sim)")
+    return [BleSource(), ClassicSource()]
+
+
+async def scan_cycle(sources, scheduler=None):
+    """Run every source's scan side by side.
+
+    Returns the merged device list and the wall time of each phase.
+    A device seen by more than one source (dual-mode BLE + Classic) is
+    reported once. Each source's own results go to ``scheduler``.
+    """
+    timings = {}
+
+    async def timed(phase, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            timings[phase] = time.perf_counter() - start
+
+    results = await asyncio.gather(*(timed(s.name, s.scan()) for s in sources))
+    for s, devices in zip(sources, results):
+        SIGHTINGS.labels(s.name).inc(len(devices))
+    if scheduler is not None:
+        for s, devices in zip(sources, results):
+            scheduler.observe(s.name, devices, s.scanned)
+    return merge_sightings(device for devices in results for device in devices), timings
 
-async def main_loop():
 
-    
+def build_payloads(all_devices):
+    pseudonymizer.rotate()
+    pseudonyms = pseudonymizer.pseudonymize_many([(d[0], d[4]) for d in all_devices])
+    payloads = []
+    for pseudonym, (mac, rssi, label, major, seen_at) in zip(pseudonyms, all_devices):
+        payloads.append({
+            "pseudonym": pseudonym,
+            "name": label,
+            "rssi": rssi,
+            "location": SCANNER_LOCATION,
+            "major_class": major,
+            "seen_at": round(seen_at, 3)  # wall-clock observation time, epoch seconds
+        })
+    return payloads
+
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+async def queue_devices(uploader, all_devices, presence=None, timings=None):
+    scanned_at = observation_clock.now()
+    started = time.perf_counter()
+    payloads = build_payloads(all_devices)
+    if timings is not None:
+        timings["hash"] = time.perf_counter() - started  # pseudonyms + payload dicts
+    if presence is not None:
+        payloads = presence.filter(payloads)
+    for batch in chunked(payloads, UPLOAD_BATCH_SIZE):
+        await uploader.submit(batch, scanned_at)
+
+
+async def replay_spool(backlog, uploader):
+    async def send(batch):
+        try:
+            return await uploader.send(batch) != FAILED
+        except Exception as e:
+            # Stop this round and retry later rather than end the replay task.
+            uploader.stats["errors"] += 1
+            print(f"[!] Spool replay failed: {e!r}")
+            return False
+
     while True:
-        ble_devices = await scan_ble()
-        bt_devices = scan_classic_bt()
-        all_devices = ble_devices + bt_devices
-
-        for mac, rssi, label, major in all_devices:
-            pseudonym = hash_mac(mac, SESSION_KEY)
-            payload = {
-                "mac": pseudonym,
-                "name": label,
-                "rssi": rssi,
-                "location": SCANNER_LOCATION,
-                "major_class": major  # <-- Add this
-            }
-            print("Sending:", payload)
-            try:
-                response = requests.post(SERVER_URL, json=payload)
-                if response.status_code != 200:
-                    print(f"[!] Server error: {response.status_code} - {response.text}")
-            except Exception as e:
-                print(f"[!] Request failed: {e}")
-
-        time.sleep(SCAN_INTERVAL)
+        await asyncio.sleep(SPOOL_REPLAY_INTERVAL)
+        if not backlog:
+            continue
+        started = time.perf_counter()
+        try:
+            replayed = await spool.replay(backlog, send, SPOOL_REPLAY_BATCH_SIZE, SPOOL_REPLAY_RATE)
+        except Exception as e:
+            # A spool file error (disk full, a segment removed under us):
+            # log it and try again next interval rather than end the task.
+            print(f"[!] Spool replay stopped: {e!r}")
+            continue
+        if replayed:
+            print(f"[spool] Replayed {replayed} sightings in {time.perf_counter() - started:.2f}s, "
+                  f"{backlog.size_bytes()} bytes left")
+
+
+def format_timings(timings):
+    return " ".join(f"{phase}={secs:.2f}s" for phase, secs in timings.items())
+
+
+async def main_loop(source=SCAN_SOURCE, capture_path=CAPTURE_PATH, trace_path=TRACE_LOG):
+    loop = asyncio.get_running_loop()
+    sources = make_sources(source)
+    capture = CaptureWriter(capture_path) if capture_path else None
+    trace = TraceLog(trace_path, observation_clock.now) if trace_path else None
+    backlog = spool.Spool(SPOOL_DIR, max_bytes=SPOOL_MAX_BYTES)
+    uploader = Uploader(
+        BATCH_URL,
+        queue_size=UPLOAD_QUEUE_SIZE,
+        concurrency=UPLOAD_CONCURRENCY,
+        max_retries=UPLOAD_MAX_RETRIES,
+        drop_policy=UPLOAD_DROP_POLICY,
+        on_failure=backlog.put,
+        wire_format=UPLOAD_WIRE_FORMAT,
+        compression=UPLOAD_COMPRESSION,
+        trace=trace,
+    )
+    await uploader.start()
+    metrics.stats("scanner_upload", uploader.stats, "Uploads")
+    metrics.stats("scanner_spool", backlog.stats, "Failed-upload spool")
+    metrics.gauge("scanner_upload_queue_depth", "Batches waiting for an upload worker", uploader.depth)
+    metrics.gauge("scanner_spool_bytes", "Bytes of sightings waiting in the spool", backlog.size_bytes)
+    metrics.Profiler(PROFILE_DIR).install(loop)
+    replayer = asyncio.create_task(replay_spool(backlog, uploader))
+    for s in sources:
+        await s.start()
+    presence = None
+    if DELTA_UPLOADS:
+        presence = PresenceTracker(DELTA_TIMEOUT, DELTA_RSSI_THRESHOLD, DELTA_HEARTBEAT)
+        metrics.stats("scanner_delta", presence.stats, "Delta uploads")
+    scheduler = None
+    if ADAPTIVE_DUTY_CYCLE:
+        scheduler = DutyCycleScheduler(CYCLE_PERIOD, CYCLE_PERIOD_MIN, CYCLE_PERIOD_MAX,
+                                       ble_fraction=SCAN_INTERVAL / CYCLE_PERIOD,
+                                       classic_max=CLASSIC_INQUIRY_DURATION)
+    # Cycles start on a grid (t0, t0 + period, ...) so slow cycles don't
+    # push every later cycle back.
+    next_start = loop.time()
+    period = CYCLE_PERIOD
+
+    try:
+        while True:
+            if scheduler is not None:
+                plan = scheduler.plan()
+                period = plan["period"]
+                for s in sources:
+                    s.window = plan[s.name]
+                    s.period = period
+            cycle_start = time.perf_counter()
+            all_devices, timings = await scan_cycle(sources, scheduler)
+            if capture:
+                capture.write_cycle(observation_clock.now(), all_devices)
+
+            enqueue_start = time.perf_counter()
+            await queue_devices(uploader, all_devices, presence, timings)
+            timings["enqueue"] = time.perf_counter() - enqueue_start
+            timings["cycle"] = time.perf_counter() - cycle_start
+            for phase, secs in timings.items():
+                PHASE_SECONDS.labels(phase).observe(secs)
+            CYCLE_DEVICES.observe(len(all_devices))
+            print(f"[cycle] {len(all_devices)} devices {format_timings(timings)} "
+                  f"queue={uploader.depth()} stats={uploader.stats}")
+            if presence is not None:
+                print(f"[delta] tracking {len(presence)} devices, "
+                      f"sent {presence.stats['sent']} of {presence.stats['seen']} sightings")
+
+            next_start += period
+            delay = next_start - loop.time()
+            if delay < 0:
+                print(f"[!] Cycle overran its slot by {-delay:.2f}s")
+                next_start = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+    finally:
+        for s in sources:
+            await s.stop()
+        replayer.cancel()
+        await uploader.stop(drain=False)
+        backlog.close()
+        if capture:
+            capture.close()
+        if trace:
+            trace.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan for Bluetooth devices and post them to the dashboard.")
+    parser.add_argument("--source", choices=["radio", "sim"], default=SCAN_SOURCE)
+    parser.add_argument("--sim-rate", type=float, default=SIM_ARRIVAL_RATE,
+                        help="simulated arrivals per second (population ~ rate x mean dwell)")
+    parser.add_argument("--sim-speed", type=float, default=SIM_SPEED)
+    parser.add_argument("--capture", default=CAPTURE_PATH, metavar="PATH",
+                        help="record raw scan cycles for replay.py")
+    parser.add_argument("--trace", default=TRACE_LOG, metavar="PATH",
+                        help="log per-batch freshness stages for freshness_report.py")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="serve Prometheus metrics on this local port")
+    args = parser.parse_args()
+    if args.metrics_port:
+        metrics.serve(args.metrics_port, METRICS_HOST)
+    SIM_ARRIVAL_RATE = args.sim_rate
+    SIM_SPEED = args.sim_speed
     try:
-        asyncio.run(main_loop())
+        asyncio.run(main_loop(args.source, args.capture, args.trace))
     except KeyboardInterrupt:
         print("\n[!] Exiting...")
@@ -0,0 +1,226 @@
+import time
+from array import array
+
+RSSI_RING = 8  # recent per-window mean RSSIs kept per device
+
+
+def _grow(arrays, n):
+    for a in arrays:
+        a.frombytes(bytes(n * a.itemsize))
+
+
+class Interner:
+    """Small integer ids for repeated strings (device names, classes); 0 = none."""
+
+    def __init__(self):
+        self.values = [None]
+        self._ids = {}
+
+    def __len__(self):
+        return len(self.values) - 1
+
+    def intern(self, value):
+        i = self._ids.get(value)
+        if i is None:
+            i = self._ids[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+    def rebuild(self, live_ids):
+        """Keep only ``live_ids``; returns the old id -> new id mapping."""
+        old = self.values
+        self.values = [None]
+        self._ids = {}
+        return {i: self.intern(old[i]) for i in sorted(set(live_ids)) if i}
+
+
+class _Generation:
+    """One window's statistics, struct-of-arrays, indexed by device slot."""
+
+    __slots__ = ("slots", "count", "rssi_sum", "first_seen", "last_seen", "major")
+
+    def __init__(self):
+        self.slots = []  # slots touched in this window, in first-seen order
+        self.count = array("I")
+        self.rssi_sum = array("i")
+        self.first_seen = array("d")
+        self.last_seen = array("d")
+        self.major = array("I")
+
+    def grow(self, n):
+        _grow((self.count, self.rssi_sum, self.first_seen, self.last_seen, self.major), n)
+
+    def reset(self):
+        count, major = self.count, self.major
+        for slot in self.slots:
+            count[slot] = 0
+            major[slot] = 0
+        self.slots.clear()
+
+
+class WindowSnapshot:
+    """Read-only view of one flushed window.
+
+    Per-device values are read by slot (``for slot in snapshot.slots``).
+    The view is backed by the window's arrays and stays valid until the
+    window is flushed again.
+    """
+
+    def __init__(self, window, generation, advertisements):
+        self._window = window
+        self._g = generation
+        self.slots = generation.slots
+        self.advertisements = advertisements
+
+    def __len__(self):
+        return len(self.slots)
+
+    def mac(self, slot):
+        return self._window._macs[slot]
+
+    def name(self, slot):
+        return self._window.names.values[self._window._name[slot]]
+
+    def major(self, slot):
+        return self._window.classes.values[self._g.major[slot]]
+
+    def fingerprint(self, slot):
+        return self._window._fingerprint[slot] or None
+
+    def count(self, slot):
+        return self._g.count[slot]
+
+    def rssi_mean(self, slot):
+        return round(self._g.rssi_sum[slot] / self._g.count[slot])
+
+    def first_seen(self, slot):
+        return self._g.first_seen[slot]
+
+    def last_seen(self, slot):
+        return self._g.last_seen[slot]
+
+    def rssi_recent(self, slot):
+        """Median of the device's mean RSSI over its last RSSI_RING windows."""
+        return self._window.rssi_recent(slot)
+
+
+class SightingWindow:
+    """Accumulates every advertisement per device until flushed.
+
+    Fed from the BleakScanner detection callback, so it sees each
+    advertisement instead of only the last one per discover() call.
+
+    Storage is struct-of-arrays: each device address keeps a slot for as
+    long as it is around (until ``idle_ttl`` seconds after it was last
+    heard), and per-window statistics live in two generations of flat
+    arrays that are swapped and cleared in place at every flush. Names and
+    classes are interned, and each slot keeps a ring of its mean RSSI in
+    its last RSSI_RING windows. Once a device has a slot its
+    advertisements allocate nothing, and memory is bounded by the number
+    of devices around.
+    """
+
+    def __init__(self, clock=time.time, idle_ttl=3600.0, max_names=65536, grow_by=256):
+        self._clock = clock
+        self.idle_ttl = idle_ttl
+        self.max_names = max_names
+        self.grow_by = grow_by
+        self.names = Interner()
+        self.classes = Interner()
+        self._slots = {}  # mac -> slot
+        self._macs = []   # slot -> mac, None when free
+        self._free = []
+        # Per-slot state that outlives a window.
+        self._name = array("I")
+        self._fingerprint = array("q")
+        self._heard = array("d")
+        self._ring = array("h")
+        self._ring_written = array("I")
+        self._current = _Generation()
+        self._previous = _Generation()
+        self.advertisements = 0
+
+    def _allocate(self, mac):
+        if self._free:
+            slot = self._free.pop()
+            self._macs[slot] = mac
+        else:
+            slot = len(self._macs)
+            self._macs.append(mac)
+            if slot >= len(self._name):
+                _grow((self._name, self._fingerprint, self._heard, self._ring_written), self.grow_by)
+                _grow((self._ring,), self.grow_by * RSSI_RING)
+                self._current.grow(self.grow_by)
+                self._previous.grow(self.grow_by)
+        self._name[slot] = 0
+        self._fingerprint[slot] = 0
+        self._ring_written[slot] = 0
+        self._slots[mac] = slot
+        return slot
+
+    def add(self, mac, rssi, name=None, now=None, fingerprint=None, major=None):
+        now = self._clock() if now is None else now
+        self.advertisements += 1
+        slot = self._slots.get(mac)
+        if slot is None:
+            slot = self._allocate(mac)
+        g = self._current
+        count = g.count
+        n = count[slot]
+        if n == 0:
+            g.slots.append(slot)
+            count[slot] = 1
+            g.rssi_sum[slot] = rssi
+            g.first_seen[slot] = g.last_seen[slot] = now
+        else:
+            count[slot] = n + 1
+            g.rssi_sum[slot] += rssi
+            g.last_seen[slot] = now
+        if name:
+            names = self.names
+            name_id = names._ids.get(name)
+            self._name[slot] = name_id if name_id is not None else names.intern(name)
+        if fingerprint is not None:
+            self._fingerprint[slot] = fingerprint
+        if major:
+            g.major[slot] = self.classes.intern(major)
+
+    def __len__(self):
+        return len(self._current.slots)
+
+    def rssi_recent(self, slot):
+        n = min(self._ring_written[slot], RSSI_RING)
+        start = slot * RSSI_RING
+        return sorted(self._ring[start:start + n])[n // 2] if n else None
+
+    def flush(self):
+        """Return the window's snapshot and start a new window."""
+        g = self._current
+        ring, written, heard = self._ring, self._ring_written, self._heard
+        for slot in g.slots:
+            n = written[slot]
+            ring[slot * RSSI_RING + n % RSSI_RING] = round(g.rssi_sum[slot] / g.count[slot])
+            written[slot] = n + 1
+            heard[slot] = g.last_seen[slot]
+        snapshot = WindowSnapshot(self, g, self.advertisements)
+        self._previous.reset()
+        self._current, self._previous = self._previous, self._current
+        self.advertisements = 0
+        self._expire(self._clock())
+        if len(self.names) > self.max_names:
+            self._compact_names()
+        return snapshot
+
+    def _expire(self, now):
+        cutoff = now - self.idle_ttl
+        heard = self._heard
+        for slot, mac in enumerate(self._macs):
+            if mac is not None and heard[slot] < cutoff:
+                del self._slots[mac]
+                self._macs[slot] = None
+                self._free.append(slot)
+
+    def _compact_names(self):
+        remap = self.names.rebuild(self._name[slot] for slot in self._slots.values())
+        for slot in self._slots.values():
+            self._name[slot] = remap.get(self._name[slot], 0)
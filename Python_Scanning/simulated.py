@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import heapq
+import math
+import random
+import time
+
+from sources import ScanSource
+
+# ---- Population mix: (major class, weight, example names) ----
+DEVICE_MIX = [
+    ("Phone", 0.45, ["iPhone", "Galaxy S23", "Pixel 8", "Redmi Note 12", "OnePlus 11", "moto g84"]),
+    ("Computer", 0.15, ["MacBook Pro", "ThinkPad X1", "Dell XPS", "ASUS ZenBook", "DESKTOP-4F2K"]),
+    ("Audio/Video", 0.15, ["AirPods Pro", "JBL Flip 6", "WH-1000XM5", "Galaxy Buds2", "Bose QC45"]),
+    ("Wearable", 0.10, ["Apple Watch", "Mi Band 7", "Galaxy Watch6", "Fitbit Charge 6"]),
+    ("Peripheral", 0.08, ["MX Master 3", "Magic Keyboard", "Xbox Controller"]),
+    ("Health", 0.03, ["Polar H10", "Omron BP"]),
+    ("Misc", 0.04, ["Tile", "SmartTag", "ESP32"]),
+]
+# Bluetooth Class of Device major class numbers (see scan_bt.MAJOR_CLASSES)
+MAJOR_CODES = {"Misc": 0x00, "Computer": 0x01, "Phone": 0x02, "Audio/Video": 0x04,
+               "Peripheral": 0x05, "Wearable": 0x07, "Health": 0x09}
+_CLASSES = [c for c, _, _ in DEVICE_MIX]
+_WEIGHTS = [w for _, w, _ in DEVICE_MIX]
+_NAMES = {c: names for c, _, names in DEVICE_MIX}
+
+RSSI_FLOOR = -100
+RSSI_CEILING = -30
+FINGERPRINT_MODELS = 16  # distinct advertisement layouts per (class, name)
+INQUIRY_TAU = 2.5  # seconds; a Classic inquiry of t seconds finds a device with p = 1 - exp(-t / tau)
+
+
+class SimDevice:
+    __slots__ = ("ble_mac", "classic_mac", "name", "major", "fingerprint", "rssi",
+                 "leaves_at", "rotates_at", "classic")
+
+    def __init__(self, rng, now, dwell, name_ratio, classic_ratio, rotation):
+        self.major = rng.choices(_CLASSES, _WEIGHTS)[0]
+        self.name = rng.choice(_NAMES[self.major]) if rng.random() < name_ratio else None
+        # Advertisement contents shared by every device of the same model.
+        self.fingerprint = _fingerprint(self.major, self.name, rng.randrange(FINGERPRINT_MODELS))
+        self.rssi = min(RSSI_CEILING, max(RSSI_FLOOR, rng.gauss(-72, 10)))
+        self.leaves_at = now + dwell
+        self.classic = rng.random() < classic_ratio
+        self.classic_mac = _random_mac(rng, public=True)
+        self.ble_mac = _random_mac(rng, public=False)
+        self.rotates_at = now + rng.uniform(0, rotation) if rotation else math.inf
+
+
+def _fingerprint(major, name, model):
+    # A digest rather than hash(), which is salted per process, so a seeded
+    # run produces the same fingerprints every time.
+    digest = hashlib.blake2b(f"{major}|{name}|{model}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _random_mac(rng, public):
+    octets = [rng.randrange(256) for _ in range(6)]
+    if public:
+        octets[0] &= 0xFC  # unicast, globally administered
+    else:
+        octets[0] = octets[0] & 0x3F | 0x40  # BLE resolvable private address
+    return "".join(f"{o:02x}" for o in octets)
+
+
+class SimulatedPopulation:
+    """Synthetic crowd of Bluetooth devices for load testing without a radio.
+
+    Arrivals are a Poisson process (``arrival_rate`` per second), dwell
+    times are log-normal with median ``dwell_median`` seconds, BLE
+    addresses rotate every ``rotation`` seconds (with jitter) like
+    resolvable private addresses, and RSSI follows a bounded random walk.
+    The population starts near its steady state size so measurements
+    don't include a ramp-up.
+    """
+
+    def __init__(self, arrival_rate=0.5, dwell_median=1200.0, dwell_sigma=1.0,
+                 rotation=900.0, rssi_step=2.0, name_ratio=0.6, classic_ratio=0.1,
+                 adv_interval=1.0, seed=None, now=None):
+        self.rng = random.Random(seed)
+        self.arrival_rate = arrival_rate
+        self.dwell_mu = math.log(dwell_median)
+        self.dwell_sigma = dwell_sigma
+        self.rotation = rotation
+        self.rssi_step = rssi_step
+        self.name_ratio = name_ratio
+        self.classic_ratio = classic_ratio
+        self.adv_interval = adv_interval
+        self.now = time.time() if now is None else now
+        self.devices = []
+        self._departures = []  # heap of (leaves_at, id(device), device)
+        self.stats = {"arrived": 0, "departed": 0, "rotated": 0}
+        # Little's law: mean population = arrival rate x mean dwell time.
+        mean_dwell = math.exp(self.dwell_mu + self.dwell_sigma ** 2 / 2)
+        for _ in range(int(arrival_rate * mean_dwell)):
+            self._arrive(self.now, remaining=True)
+        self._next_arrival = self.now + self.rng.expovariate(arrival_rate)
+
+    def __len__(self):
+        return len(self.devices)
+
+    def _arrive(self, now, remaining=False):
+        dwell = self.rng.lognormvariate(self.dwell_mu, self.dwell_sigma)
+        if remaining:
+            dwell *= self.rng.random()
+        device = SimDevice(self.rng, now, dwell, self.name_ratio,
+                           self.classic_ratio, self.rotation)
+        self.devices.append(device)
+        heapq.heappush(self._departures, (device.leaves_at, id(device), device))
+        self.stats["arrived"] += 1
+
+    def advance_to(self, t):
+        """Move the simulation clock forward to ``t`` (no-op if already there)."""
+        if t <= self.now:
+            return
+        dt = t - self.now
+        while self._next_arrival <= t:
+            self._arrive(self._next_arrival)
+            self._next_arrival += self.rng.expovariate(self.arrival_rate)
+        if self._departures and self._departures[0][0] <= t:
+            while self._departures and self._departures[0][0] <= t:
+                heapq.heappop(self._departures)
+                self.stats["departed"] += 1
+            self.devices = [d for d in self.devices if d.leaves_at > t]
+        step = self.rssi_step * math.sqrt(dt)
+        gauss = self.rng.gauss
+        for d in self.devices:
+            d.rssi = min(RSSI_CEILING, max(RSSI_FLOOR, d.rssi + gauss(0, step)))
+            if d.rotates_at <= t:
+                d.ble_mac = _random_mac(self.rng, public=False)
+                d.rotates_at = t + self.rotation * self.rng.uniform(0.8, 1.2)
+                self.stats["rotated"] += 1
+        self.now = t
+
+    def advertise(self, window, seconds, callback=None, end=None):
+        """Emit ~``seconds / adv_interval`` advertisements per BLE device.
+
+        The advertisements cover the ``seconds`` before ``end`` (default:
+        the simulation clock), each device at its own phase, and go out in
+        time order, interleaved across devices, the way a scanner hears a
+        crowd. Each goes to ``window.add`` (or ``callback``) with its own
+        timestamp and a little RSSI noise, like the BleakScanner callback.
+        """
+        add = callback or window.add
+        count = max(1, round(seconds / self.adv_interval))
+        spacing = seconds / count
+        start = (self.now if end is None else end) - seconds
+        rng = self.rng
+        gauss = rng.gauss
+        phased = sorted(((rng.random() * spacing, d) for d in self.devices), key=lambda p: p[0])
+        for i in range(count):
+            at = start + i * spacing
+            for phase, d in phased:
+                add(d.ble_mac, round(d.rssi + gauss(0, 3)), d.name, at + phase, d.fingerprint)
+
+    def inquiry(self, seconds=None):
+        """What a Classic inquiry would return: (address, name, device class).
+
+        A short inquiry (``seconds``) misses some devices, as on a real radio.
+        """
+        found = 1.0 if seconds is None else 1 - math.exp(-seconds / INQUIRY_TAU)
+        results = []
+        for d in self.devices:
+            if d.classic and (found == 1.0 or self.rng.random() < found):
+                results.append((d.classic_mac.upper(), d.name, MAJOR_CODES[d.major] << 8))
+        return results
+
+
+class SimulatedSource(ScanSource):
+    """Stand-in for a radio: waits out the scan window, then reports.
+
+    Every scan moves the simulation ``period`` seconds forward (one scan
+    cycle) and calls ``scan(period)`` for the results. Sources sharing a
+    population advance in lockstep. ``speed`` divides the real wait;
+    0 skips it, for benchmarks. A ``continuous`` source (BLE) listens for
+    the whole period, others for their window.
+    """
+
+    def __init__(self, population, name, scan, window, period, speed=1.0, continuous=False):
+        self.population = population
+        self.name = name
+        self._scan = scan
+        self.window = window
+        self.period = period
+        self.speed = speed
+        self.continuous = continuous
+        self._clock = population.now
+
+    async def scan(self):
+        if self.speed:
+            await asyncio.sleep(self.window / self.speed)
+        self._clock += self.period
+        self.population.advance_to(self._clock)
+        if not self.window:
+            self.scanned = 0.0
+            return []
+        self.scanned = self.period if self.continuous else self.window
+        return self._scan(self.period)
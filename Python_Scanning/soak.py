@@ -0,0 +1,60 @@
+import argparse
+import contextlib
+import os
+import sys
+import time
+import tracemalloc
+
+import scan_bt
+from simulated import SimulatedPopulation
+from sightings import SightingWindow
+
+
+def soak(hours, rate, period, report_every):
+    """Run the scanner's per-cycle path over simulated hours with tracemalloc.
+
+    Reports, every ``report_every`` simulated hours: the population, the
+    memory still held after the cycle (should stay flat), and the peak
+    transient allocation while ingesting advertisements and while
+    summarising/building payloads (allocation per cycle).
+    """
+    now = [time.time()]
+    population = SimulatedPopulation(arrival_rate=rate, seed=1, now=now[0])
+    window = SightingWindow(lambda: now[0])
+    cycles = int(hours * 3600 / period)
+    per_report = max(1, int(report_every * 3600 / period))
+    out = sys.__stdout__
+    print(f"{'hour':>6} {'devices':>8} {'retained KiB':>13} {'ingest KiB':>11} {'cycle KiB':>10}", file=out)
+    tracemalloc.start()
+    ingest_peak = cycle_peak = 0
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(1, cycles + 1):
+            now[0] += period
+            population.advance_to(now[0])
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            population.advertise(window, scan_bt.SCAN_INTERVAL)
+            ingest_peak = max(ingest_peak, tracemalloc.get_traced_memory()[1] - before)
+
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            payloads = scan_bt.build_payloads(scan_bt.summarise_ble_window(window))
+            cycle_peak = max(cycle_peak, tracemalloc.get_traced_memory()[1] - before)
+            del payloads
+
+            if i % per_report == 0:
+                retained = tracemalloc.get_traced_memory()[0]
+                print(f"{i * period / 3600:6.1f} {len(population):8d} {retained / 1024:13.0f} "
+                      f"{ingest_peak / 1024:11.0f} {cycle_peak / 1024:10.0f}", file=out, flush=True)
+                ingest_peak = cycle_peak = 0
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure scanner memory over simulated days (no radio, no uploads).")
+    parser.add_argument("--hours", type=float, default=48)
+    parser.add_argument("--sim-rate", type=float, default=scan_bt.SIM_ARRIVAL_RATE)
+    parser.add_argument("--period", type=float, default=scan_bt.CYCLE_PERIOD)
+    parser.add_argument("--report-every", type=float, default=4, metavar="HOURS")
+    args = parser.parse_args()
+    soak(args.hours, args.sim_rate, args.period, args.report_every)
@@ -0,0 +1,28 @@
+import abc
+
+
+class ScanSource(abc.ABC):
+    """One radio (or a stand-in for one) that the scan loop polls each cycle.
+
+    ``scan()`` waits out one window and returns its sightings as
+    (mac, rssi, label, major, seen_at) tuples. The loop sets ``window``
+    (seconds to scan, 0 = skip this cycle) and ``period`` (seconds
+    between cycle starts) before each scan. After it, ``scanned`` is how
+    long the radio actually listened for those results; a continuous
+    scanner listens for the whole period, not just the window.
+    """
+
+    name = "source"
+    window = 0.0
+    period = 0.0
+    scanned = 0.0
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @abc.abstractmethod
+    async def scan(self):
+        """One window's (mac, rssi, label, major, seen_at) tuples."""
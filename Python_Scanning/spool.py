@@ -0,0 +1,225 @@
+import asyncio
+import json
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Record framing: payload length + CRC32 of the payload, then the payload
+# (one JSON-encoded batch). A torn write at the end of a segment fails the
+# length or CRC check and is ignored on replay.
+RECORD_HEADER = struct.Struct("<II")
+SEGMENT_PREFIX = "seg-"
+SEGMENT_SUFFIX = ".log"
+PROGRESS_SUFFIX = ".done"  # next to a segment: how many of its sightings replay already sent
+
+
+class Spool:
+    """Append-only on-disk queue of sighting batches for offline operation.
+
+    Batches are appended to the active segment file; once it grows past
+    ``segment_bytes`` it is sealed and a new one is started. fsync is
+    batched: it runs every ``fsync_every`` records or ``fsync_interval``
+    seconds, whichever comes first. When the spool exceeds ``max_bytes``
+    the oldest segments are deleted.
+
+    On the event loop use ``put()`` and ``replay()``: every file operation
+    then runs on the spool's own thread, one at a time, so an fsync or a
+    4 MB segment read never stalls the scan loop.
+    """
+
+    def __init__(self, directory, segment_bytes=4 * 1024 * 1024,
+                 max_bytes=256 * 1024 * 1024, fsync_every=32, fsync_interval=1.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.stats = {"spooled": 0, "replayed": 0, "evicted_segments": 0}
+        os.makedirs(directory, exist_ok=True)
+        segments = self._segments()
+        self._next_seq = self._seq(segments[-1]) + 1 if segments else 0
+        self._bytes = sum(os.path.getsize(p) for p in segments)
+        self._active = None
+        self._active_path = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spool")
+
+    def _run(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # ---- Writing ----
+    async def put(self, batch):
+        """append() off the event loop; usable as an Uploader on_failure."""
+        await self._run(self.append, batch)
+
+    def append(self, batch):
+        body = json.dumps(batch, separators=(",", ":")).encode()
+        if self._active is None:
+            self._open_segment()
+        self._active.write(RECORD_HEADER.pack(len(body), zlib.crc32(body)))
+        self._active.write(body)
+        self._bytes += RECORD_HEADER.size + len(body)
+        self.stats["spooled"] += len(batch)
+        self._unsynced += 1
+        if (self._unsynced >= self.fsync_every
+                or time.monotonic() - self._last_sync >= self.fsync_interval):
+            self.sync()
+        if self._active.tell() >= self.segment_bytes:
+            self.seal()
+        if self._bytes > self.max_bytes:
+            self._enforce_cap()
+
+    def sync(self):
+        if self._active is None or not self._unsynced:
+            return
+        self._active.flush()
+        os.fsync(self._active.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def seal(self):
+        """Close the active segment so it becomes eligible for replay."""
+        if self._active is None:
+            return
+        self.sync()
+        self._active.close()
+        self._active = None
+        self._active_path = None
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.seal()
+
+    def _open_segment(self):
+        name = f"{SEGMENT_PREFIX}{self._next_seq:08d}{SEGMENT_SUFFIX}"
+        self._next_seq += 1
+        self._active_path = os.path.join(self.directory, name)
+        self._active = open(self._active_path, "ab")
+
+    def _enforce_cap(self):
+        sealed = self.sealed_segments()
+        while self._bytes > self.max_bytes and sealed:
+            oldest = sealed.pop(0)
+            self.discard(oldest)
+            self.stats["evicted_segments"] += 1
+            print(f"[!] Spool over {self.max_bytes} bytes, evicted {oldest}")
+
+    # ---- Reading ----
+    def _segments(self):
+        names = sorted(n for n in os.listdir(self.directory)
+                       if n.startswith(SEGMENT_PREFIX) and n.endswith(SEGMENT_SUFFIX))
+        return [os.path.join(self.directory, n) for n in names]
+
+    @staticmethod
+    def _seq(path):
+        return int(os.path.basename(path)[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+    def sealed_segments(self):
+        return [p for p in self._segments() if p != self._active_path]
+
+    def size_bytes(self):
+        return self._bytes
+
+    def __bool__(self):
+        return self._bytes > 0
+
+    @staticmethod
+    def read_segment(path):
+        """Return every intact batch stored in a segment file."""
+        with open(path, "rb") as f:
+            data = f.read()
+        batches = []
+        offset = 0
+        view = memoryview(data)
+        while offset + RECORD_HEADER.size <= len(data):
+            length, crc = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            body = view[start:start + length]
+            if len(body) < length or zlib.crc32(body) != crc:
+                print(f"[!] Spool segment {path} truncated at byte {offset}")
+                break
+            batches.append(json.loads(bytes(body)))
+            offset = start + length
+        return batches
+
+    @classmethod
+    def read_sightings(cls, path):
+        return [s for batch in cls.read_segment(path) for s in batch]
+
+    @staticmethod
+    def load_progress(path):
+        """Sightings of segment ``path`` that replay already sent (0 if none)."""
+        try:
+            with open(path + PROGRESS_SUFFIX) as f:
+                return int(f.read() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    @staticmethod
+    def save_progress(path, done):
+        """Record that ``done`` sightings of ``path`` went out; False if the segment is gone."""
+        # The cap may have evicted the segment while replay was sending it;
+        # a progress file for it would only be left behind.
+        if not os.path.exists(path):
+            return False
+        # Write-then-rename, so a crash leaves the old count or the new one.
+        tmp = path + PROGRESS_SUFFIX + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(done))
+        os.replace(tmp, path + PROGRESS_SUFFIX)
+        return True
+
+    def discard(self, path):
+        """Delete a segment and its progress file; either may already be gone."""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        else:
+            self._bytes -= size
+        try:
+            os.remove(path + PROGRESS_SUFFIX)
+        except FileNotFoundError:
+            pass
+
+
+async def replay(spool, send, batch_size=1000, max_batches_per_sec=5.0):
+    """Drain sealed segments oldest-first through ``send``.
+
+    Records are merged and re-split into batches of ``batch_size``, posted
+    at most ``max_batches_per_sec`` times a second. ``send`` is a coroutine
+    taking one batch and returning False when the server is unreachable.
+    A segment is deleted once all of its sightings went through. How far
+    replay got in a segment is saved next to it after every batch, so
+    neither a failure nor a restart resends accepted sightings. If the
+    cap evicts a segment while it is being sent, replay moves on to the
+    next one. Returns the number of sightings replayed.
+    """
+    if not await spool._run(spool.sealed_segments):
+        await spool._run(spool.seal)
+    replayed = 0
+    min_gap = 1.0 / max_batches_per_sec if max_batches_per_sec else 0.0
+    for path in await spool._run(spool.sealed_segments):
+        try:
+            sightings = await spool._run(spool.read_sightings, path)
+        except FileNotFoundError:
+            continue  # evicted since the listing
+        done = await spool._run(spool.load_progress, path)
+        while done < len(sightings):
+            started = time.monotonic()
+            batch = sightings[done:done + batch_size]
+            if not await send(batch):
+                return replayed
+            done += len(batch)
+            replayed += len(batch)
+            spool.stats["replayed"] += len(batch)
+            if not await spool._run(spool.save_progress, path, done):
+                print(f"[!] Spool segment {path} evicted during replay")
+                break
+            await asyncio.sleep(max(0.0, min_gap - (time.monotonic() - started)))
+        await spool._run(spool.discard, path)
+    return replayed
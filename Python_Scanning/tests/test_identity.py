@@ -0,0 +1,39 @@
+from identity import RotationLinker
+from sightings import SightingWindow
+
+FINGERPRINT = 0x5EED  # two phones of one model advertise the same fields
+A, B = "4a0000000001", "4b0000000002"  # resolvable private addresses
+
+
+def window(*adverts):
+    """Flushed snapshot of (mac, rssi, time) advertisements."""
+    w = SightingWindow(clock=lambda: max(t for _, _, t in adverts))
+    for mac, rssi, t in adverts:
+        w.add(mac, rssi, now=t, fingerprint=FINGERPRINT)
+    return w.flush()
+
+
+def test_rotation_links_to_the_quiet_address():
+    linker = RotationLinker()
+    assert linker.canonical(window((A, -60, 100.0), (A, -60, 105.0))) == {}
+    # A went quiet at 105; B shows up 3 s later at the same RSSI.
+    assert linker.canonical(window((B, -61, 108.0), (B, -61, 112.0))) == {B: A}
+    assert linker.stats["linked"] == 1
+
+
+def test_devices_present_together_stay_separate():
+    # A is heard once, then B: the timing fits a rotation, but A is in the
+    # same window, so these are two phones of one model side by side.
+    linker = RotationLinker()
+    assert linker.canonical(window((A, -60, 100.0), (B, -60, 103.0))) == {}
+    assert linker.canonical(window((A, -60, 115.0), (B, -60, 115.0))) == {}
+    assert linker.stats["linked"] == 0
+    assert len(linker) == 2
+
+
+def test_no_link_without_a_quiet_gap():
+    linker = RotationLinker()
+    linker.canonical(window((A, -60, 100.0)))
+    # Same timestamp as A's last packet: too soon to be A's next address.
+    assert linker.canonical(window((B, -60, 100.0))) == {}
+    assert linker.stats["linked"] == 0
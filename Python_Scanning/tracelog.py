@@ -0,0 +1,47 @@
+import json
+import os
+import time
+
+# ---- Freshness trace ----
+# Every upload batch gets a trace ID, sent to the server as X-Trace-Id.
+# Each stage the batch passes through appends one JSON line:
+#   scanner (this file):  enqueued (with the window's end and every
+#                         sighting's seen_at), sent, acked
+#   server (lib/trace.js): received, committed, and a served line per
+#                         live-count / visible-devices response
+#   sessionizer.py --trace: a sessionized line per fold, with the last
+#                         device_sessions id it reached
+# freshness_report.py joins the logs by trace ID and reports the lag from
+# observation to each stage.
+TRACE_HEADER = "X-Trace-Id"
+
+
+def new_trace_id():
+    return os.urandom(8).hex()
+
+
+class TraceLog:
+    """Append-only JSONL log of batch stages, stamped with ``clock``.
+
+    ``clock`` should be the clock that stamps ``seen_at`` (the scanner's
+    ObservationClock), so lags are not skewed by clock corrections.
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self._clock = clock
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def enqueued(self, trace_id, batch, scanned_at=None):
+        self._write({"trace": trace_id, "stage": "enqueued", "t": round(self._clock(), 3),
+                     "scanned": scanned_at and round(scanned_at, 3), "sightings": len(batch),
+                     "observed": [p.get("seen_at") for p in batch]})
+
+    def stage(self, trace_id, stage, **fields):
+        self._write({"trace": trace_id, "stage": stage, "t": round(self._clock(), 3), **fields})
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def close(self):
+        self._file.close()
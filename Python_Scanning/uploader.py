@@ -0,0 +1,226 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+import wire
+from tracelog import TRACE_HEADER, new_trace_id
+
+# ---- Backpressure policies (what submit() does when the queue is full) ----
+DROP_OLDEST = "drop_oldest"  # evict the oldest queued batch, keep the fresh one
+DROP_NEWEST = "drop_newest"  # refuse the new batch
+BLOCK = "block"              # wait for room (stalls the caller)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# ---- Outcomes of send() ----
+SENT = "sent"
+REJECTED = "rejected"  # server refused the batch; retrying won't help
+FAILED = "failed"      # retries exhausted on transient errors
+
+# ---- Metrics ----
+REQUEST_SECONDS = metrics.histogram("scanner_upload_request_seconds",
+                                    "Time per upload request, including encoding")
+BATCH_SIGHTINGS = metrics.histogram("scanner_upload_batch_sightings",
+                                    "Sightings per uploaded batch", metrics.SIZE_BUCKETS)
+
+
+class Uploader:
+    """Ships sighting batches to the batch API off the scan loop.
+
+    Batches go into a bounded asyncio queue and are drained by
+    ``concurrency`` workers, each posting through a shared keep-alive
+    ``requests.Session`` on a thread pool. Transient failures are retried
+    with exponential backoff and full jitter; batches that still fail are
+    handed to ``on_failure`` (if set, a coroutine function such as
+    spool.Spool.put) instead of being lost silently.
+    Batches the server rejects outright (other 4xx) are only logged and
+    counted as ``rejected``, apart from ``failed``. An unexpected error
+    while handling a batch is logged and counted as ``errors``, and the
+    batch goes to ``on_failure``; the worker carries on with the next one.
+
+    ``wire_format="binary"`` sends batches in the compact wire format
+    (wire.py), optionally compressed. A server that answers 415 (too old
+    for the format or the compression) gets JSON from then on.
+
+    With a ``trace`` (tracelog.TraceLog), every queued batch gets a trace
+    ID, sent as X-Trace-Id, and its enqueued/sent/acked times are logged.
+    """
+
+    def __init__(self, url, queue_size=64, concurrency=4, max_retries=5,
+                 backoff_base=0.5, backoff_max=30.0, timeout=10,
+                 drop_policy=DROP_OLDEST, on_failure=None,
+                 wire_format="json", compression=None, trace=None):
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        if wire_format not in ("json", "binary"):
+            raise ValueError(f"Unknown wire format: {wire_format}")
+        if compression not in (None,) + wire.COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == "zstd" and wire.zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        self.url = url
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.drop_policy = drop_policy
+        self.on_failure = on_failure
+        self.wire_format = wire_format
+        self.compression = compression
+        self.trace = trace
+        self.stats = {"batches": 0, "sightings": 0, "retries": 0,
+                      "failed": 0, "dropped": 0, "rejected": 0, "errors": 0, "bytes": 0}
+        self._queue = None
+        self._workers = []
+        self._executor = None
+        self._session = None
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                            thread_name_prefix="uploader")
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._workers = [asyncio.create_task(self._worker())
+                         for _ in range(self.concurrency)]
+
+    async def drain(self):
+        """Wait until every queued batch has been sent (or given up on)."""
+        await self._queue.join()
+
+    async def stop(self, drain=True):
+        if drain:
+            await self.drain()
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+        self._session.close()
+
+    def depth(self):
+        return self._queue.qsize() if self._queue else 0
+
+    async def submit(self, batch, scanned_at=None):
+        """Queue a batch for upload. Returns False if it was dropped.
+
+        ``scanned_at`` (when the batch's scan window ended) only goes to the
+        trace log.
+        """
+        trace_id = None
+        if self.trace is not None:
+            trace_id = new_trace_id()
+            self.trace.enqueued(trace_id, batch, scanned_at)
+        if self.drop_policy == BLOCK:
+            await self._queue.put((batch, trace_id))
+            return True
+        if self._queue.full():
+            if self.drop_policy == DROP_NEWEST:
+                self._drop(batch)
+                return False
+            self._drop(self._queue.get_nowait()[0])
+            self._queue.task_done()
+        self._queue.put_nowait((batch, trace_id))
+        return True
+
+    def _drop(self, batch):
+        self.stats["dropped"] += len(batch)
+        print(f"[!] Upload queue full, dropped {len(batch)} sightings")
+
+    async def _worker(self):
+        while True:
+            batch, trace_id = await self._queue.get()
+            try:
+                if await self.send(batch, trace_id) == FAILED and self.on_failure:
+                    await self.on_failure(batch)
+            except Exception as e:
+                # Costs this batch, not the worker: an escaped exception
+                # would end the task, and with it all uploads, silently.
+                self.stats["errors"] += 1
+                print(f"[!] Upload of {len(batch)} sightings failed: {e!r}")
+                if self.on_failure:
+                    try:
+                        await self.on_failure(batch)
+                    except Exception as e:
+                        print(f"[!] Could not hand the batch to on_failure: {e!r}")
+            finally:
+                self._queue.task_done()
+
+    async def send(self, batch, trace_id=None):
+        """Post one batch with retries, bypassing the queue."""
+        if trace_id is not None:
+            self.trace.stage(trace_id, "sent")
+        outcome = await self._send_with_retry(batch, trace_id)
+        if trace_id is not None:
+            self.trace.stage(trace_id, "acked", outcome=outcome)
+        BATCH_SIGHTINGS.observe(len(batch))
+        if outcome == SENT:
+            self.stats["batches"] += 1
+            self.stats["sightings"] += len(batch)
+        elif outcome == REJECTED:
+            self.stats["rejected"] += len(batch)
+        else:
+            self.stats["failed"] += len(batch)
+        return outcome
+
+    async def _send_with_retry(self, batch, trace_id=None):
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+                cap = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+                await asyncio.sleep(random.uniform(0, cap))
+            started = time.perf_counter()
+            try:
+                size, response = await loop.run_in_executor(self._executor, self._post, batch, trace_id)
+            except requests.RequestException as e:
+                print(f"[!] Request failed (attempt {attempt + 1}): {e}")
+                continue
+            finally:
+                REQUEST_SECONDS.observe(time.perf_counter() - started)
+            self.stats["bytes"] += size
+            if response.status_code == 200:
+                try:
+                    results = response.json()["results"]
+                except (ValueError, KeyError, TypeError) as e:
+                    # The server stored the batch; only the per-sighting report is unreadable.
+                    print(f"[!] Unexpected reply to an accepted batch ({e!r}): {response.text[:200]}")
+                else:
+                    self._report_rejects(batch, results)
+                return SENT
+            if response.status_code == 415 and self.wire_format != "json":
+                print(f"[!] Server refused the {self.wire_format} wire format "
+                      f"({response.text}); falling back to JSON")
+                self.wire_format = "json"
+                return await self._send_with_retry(batch, trace_id)
+            print(f"[!] Server error: {response.status_code} - {response.text}")
+            if response.status_code not in RETRY_STATUSES:
+                return REJECTED
+        return FAILED
+
+    def _post(self, batch, trace_id=None):
+        # Runs on the executor thread, so encoding stays off the event loop.
+        # Returns (body size, response); stats are only updated on the loop.
+        body, headers = wire.encode_request(batch, self.wire_format, self.compression)
+        if trace_id is not None:
+            headers[TRACE_HEADER] = trace_id
+        return len(body), self._session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+
+    def _report_rejects(self, batch, results):
+        # One line per batch, not per sighting: a bad scanner config can
+        # get every sighting rejected.
+        rejected = [(payload, result["error"]) for payload, result in zip(batch, results)
+                    if not result["ok"]]
+        if rejected:
+            self.stats["rejected"] += len(rejected)
+            payload, error = rejected[0]
+            print(f"[!] Server rejected {len(rejected)} of {len(batch)} sightings, "
+                  f"e.g. {payload['pseudonym']}: {error}")
@@ -0,0 +1,87 @@
+import gzip
+import json
+import struct
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# ---- Batch wire format (Content-Type: application/x-ubicomp-batch) ----
+# A batch of sightings, column by column so like values sit together:
+#   header   <4sBBHd  magic "UBWB", version, flags (0), count N,
+#                     base seen_at (epoch seconds)
+#   strings  <H count, then <H length + UTF-8 bytes each; every name,
+#            location and class in the batch appears once
+#   pseudonyms  N x 6 bytes (the 12 hex characters, packed)
+#   names       N x <H string index
+#   locations   N x <H string index
+#   classes     N x <H string index
+#   rssi        N x <b
+#   events      N x <B (index into EVENTS, 0 = no event)
+#   seen_at     N x <I milliseconds after the base (NO_SEEN_AT = not sent)
+# The body may additionally be compressed (Content-Encoding: gzip or zstd).
+# ubicomp-dashboard/lib/wire.js is the decoder.
+CONTENT_TYPE = "application/x-ubicomp-batch"
+MAGIC = b"UBWB"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHd")
+EVENTS = (None, "appear", "update", "heartbeat", "depart")
+EVENT_CODES = {event: code for code, event in enumerate(EVENTS)}
+NO_SEEN_AT = 0xFFFFFFFF
+
+COMPRESSIONS = ("gzip", "zstd")
+
+
+def encode_batch(batch):
+    """Pack a list of payload dicts (see scan_bt.build_payloads)."""
+    count = len(batch)
+    strings = {}
+
+    def ref(value):
+        i = strings.get(value)
+        if i is None:
+            i = strings[value] = len(strings)
+        return i
+
+    names = [ref(p["name"]) for p in batch]
+    locations = [ref(p["location"]) for p in batch]
+    classes = [ref(p["major_class"]) for p in batch]
+    stamps = [p.get("seen_at") for p in batch]
+    known = [t for t in stamps if t is not None]
+    base = min(known) if known else 0.0
+    parts = [HEADER.pack(MAGIC, VERSION, 0, count, base), struct.pack("<H", len(strings))]
+    for value in strings:
+        encoded = value.encode("utf-8")
+        parts.append(struct.pack("<H", len(encoded)))
+        parts.append(encoded)
+    parts.append(bytes.fromhex("".join(p["pseudonym"] for p in batch)))
+    parts.append(struct.pack(f"<{count}H{count}H{count}H", *names, *locations, *classes))
+    parts.append(struct.pack(f"<{count}b", *(max(-128, min(127, p["rssi"])) for p in batch)))
+    parts.append(bytes(EVENT_CODES[p.get("event")] for p in batch))
+    parts.append(struct.pack(f"<{count}I", *(NO_SEEN_AT if t is None else round((t - base) * 1000)
+                                             for t in stamps)))
+    return b"".join(parts)
+
+
+def compress(body, method):
+    if method == "gzip":
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    if method == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd compression needs the zstandard package")
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    raise ValueError(f"Unknown compression: {method}")
+
+
+def encode_request(batch, wire_format="json", compression=None):
+    """Body and headers for one upload request."""
+    if wire_format == "json":
+        # JSON stays uncompressed, for servers that predate this module.
+        return json.dumps(batch).encode(), {"Content-Type": "application/json"}
+    headers = {"Content-Type": CONTENT_TYPE}
+    body = encode_batch(batch)
+    if compression:
+        body = compress(body, compression)
+        headers["Content-Encoding"] = compression
+    return body, headers
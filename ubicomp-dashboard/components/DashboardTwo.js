@@ -43,7 +43,8 @@ export default function DashboardTwo() {
       try {
         const [visRes, evRes] = await Promise.all([
           fetch('/api/visible-devices').then(r => r.ok ? r.json() : Promise.reject(r.status)),
-          fetch('/api/device-events').then(r => r.ok ? r.json() : Promise.reject(r.status))
+          // Sightings per 2.5 min over the last 15 min, from the rollups.
+          fetch('/api/aggregate?metric=sightings&window=900&step=150').then(r => r.ok ? r.json() : Promise.reject(r.status))
         ]);
         const visDevices = Array.isArray(visRes.devices) ? visRes.devices : [];
         setDevices(visDevices);
@@ -59,23 +60,9 @@ export default function DashboardTwo() {
         const longestPresentMin = Math.floor(longestPresentSec / 60);
         setSessionOverviewData({ totalUnique, longestPresent: longestPresentMin });
 
-        const now = Date.now();
-        const BIN_COUNT = 6;
-        const BIN_SIZE_MIN = 15 / BIN_COUNT; 
         const labels = ['-15′','-12′','-10′','-7′','-5′','-2′'];
-        const bins = labels.map(t => ({ time: t, count: 0 }));
-        if (evRes.events && Array.isArray(evRes.events)) {
-          evRes.events.forEach(e => {
-            const diffMin = (now - new Date(e.timestamp)) / 60000;
-            if (diffMin < 15) {
-              const idx = Math.min(
-                BIN_COUNT - 1,
-                Math.floor(diffMin / BIN_SIZE_MIN)
-              );
-              bins[BIN_COUNT - 1 - idx].count++;
-            }
-          });
-        }
+        const points = Array.isArray(evRes.points) ? evRes.points : [];
+        const bins = labels.map((t, i) => ({ time: t, count: points[i]?.value ?? 0 }));
         setHist(bins);
       } catch (err) {
         console.error('DashboardTwo fetch error:', err);
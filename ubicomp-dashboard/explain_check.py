@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import mysql.connector
+
+import rollup_worker
+import seed_patterns
+from sessionizer import DB_CONF
+
+# --- Config ---
+DATABASE = "dashboard_explain"  # scratch database, dropped and rebuilt by --seed
+SCHEMA_DOC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "InstallationGuide.md")
+BASE_URL = "http://localhost:3000"
+DEVICES = 2000
+DAYS = 2
+SIGHTING_EVERY = 60  # seconds between sightings of a device that is present
+STAY_SECONDS = (120, 1800)  # a visit lasts between these
+AWAY_MEAN = 8 * 3600  # mean seconds between visits
+LOCATIONS = ("Lab D1", "Library", "Cafeteria")
+CLASSES = ("Phone", "Computer", "Audio/Video", "Wearable", "Unknown")
+INSERT_BATCH = 5000
+
+# Every GET route, and the aggregate API at each rollup resolution and
+# with a location filter.
+ENDPOINTS = (
+    "/api/live-count",
+    "/api/daily-unique",
+    "/api/name-analysis",
+    "/api/class-distribution",
+    "/api/rssi-histogram",
+    "/api/rssi-current-groups",
+    "/api/visible-devices",
+    "/api/current-devices",
+    "/api/device-events",
+    "/api/pattern-last-seen",
+    "/api/pattern-cooccur",
+    "/api/pattern-routine",
+    "/api/aggregate?metric=sightings&window=900&step=150",
+    "/api/aggregate?metric=devices&window=86400&step=3600",
+    "/api/aggregate?metric=rssi&window=3600&location=Library",
+    "/api/aggregate?metric=classes&window=172800",
+)
+FULL_SCANS = ("ALL", "index")  # EXPLAIN access types that read a whole table or index
+# Tables small by design: seed_patterns.py rebuilds synthetic_patterns
+# (~200 pseudonyms x ~10 patterns) and each pattern route reads a whole
+# pattern_type of it.
+SMALL_TABLES = {"synthetic_patterns"}
+
+
+# --- Scratch database ---
+def schema_statements(path=SCHEMA_DOC):
+    """The table setup statements from the InstallationGuide, so the check runs on the documented schema."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    for block in re.findall(r"```sql\n(.*?)```", text, re.S):
+        if "CREATE TABLE device_sessions" in block:
+            sql = "\n".join(re.sub(r"--.*", "", line) for line in block.splitlines())
+            return [s.strip() for s in sql.split(";") if s.strip()]
+    raise SystemExit(f"[!] No CREATE TABLE block found in {path}")
+
+
+def generate(devices=DEVICES, days=DAYS, now=None, seed=1):
+    """Synthetic visits as device_sessions, presence_intervals and device_current rows."""
+    rng = random.Random(seed)
+    now = now or time.time()
+    sessions, intervals, current = [], [], []
+    for i in range(devices):
+        pseudonym = f"{rng.getrandbits(48):012x}"
+        major = rng.choice(CLASSES)
+        name = f"Device_{i} ({major})"
+        t = now - days * 86400 + rng.expovariate(1 / AWAY_MEAN)
+        first_ever = None
+        while t < now:
+            location = rng.choice(LOCATIONS)
+            end = min(t + rng.uniform(*STAY_SECONDS), now)
+            rssis = []
+            first = t
+            while t <= end:
+                rssis.append(rng.randint(-95, -35))
+                sessions.append((pseudonym, name, rssis[-1], location, major, t))
+                t += SIGHTING_EVERY
+            last = t - SIGHTING_EVERY
+            intervals.append((pseudonym, location, name, major, first, last, len(rssis),
+                              rssis[-1], min(rssis), max(rssis), sum(rssis), False))
+            first_ever = first_ever or first
+            current_row = (pseudonym, name, rssis[-1], location, major, first_ever, last)
+            t = last + rng.expovariate(1 / AWAY_MEAN)
+        if first_ever is not None:
+            current.append(current_row)
+    sessions.sort(key=lambda row: row[-1])
+    return sessions, intervals, current
+
+
+def insert(cur, sql, rows):
+    for i in range(0, len(rows), INSERT_BATCH):
+        cur.executemany(sql, rows[i:i + INSERT_BATCH])
+
+
+def seed(database=DATABASE, devices=DEVICES, days=DAYS):
+    conn = mysql.connector.connect(**{k: v for k, v in DB_CONF.items() if k != "database"})
+    cur = conn.cursor()
+    cur.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    cur.execute(f"CREATE DATABASE `{database}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+    cur.execute(f"USE `{database}`")
+    for statement in schema_statements():
+        cur.execute(statement)
+
+    now = time.time()
+    sessions, intervals, current = generate(devices, days, now)
+    insert(cur, """INSERT INTO device_sessions
+                     (pseudonym, device_name, signal_strength, scanner_location, major_class, last_seen)
+                   VALUES (%s, %s, %s, %s, %s, FROM_UNIXTIME(%s))""", sessions)
+    insert(cur, """INSERT INTO presence_intervals
+                     (pseudonym, scanner_location, device_name, major_class, first_seen, last_seen,
+                      samples, rssi_last, rssi_min, rssi_max, rssi_sum, is_new)
+                   VALUES (%s, %s, %s, %s, FROM_UNIXTIME(%s), FROM_UNIXTIME(%s), %s, %s, %s, %s, %s, %s)""",
+           intervals)
+    insert(cur, """INSERT INTO device_current
+                     (pseudonym, device_name, signal_strength, scanner_location, major_class, first_seen, last_seen)
+                   VALUES (%s, %s, %s, %s, %s, FROM_UNIXTIME(%s), FROM_UNIXTIME(%s))""", current)
+    conn.commit()
+    print(f"[explain] Seeded {len(sessions)} sightings, {len(intervals)} intervals, {len(current)} devices")
+
+    seed_patterns.DB_CONF = dict(DB_CONF, database=database)
+    seed_patterns.seed_synthetic()
+    rollup_worker.load_cursor(conn)
+    conn.commit()
+    rollup_worker.recompute(conn, now - days * 86400, now, now)
+    # Fresh statistics, or the optimizer plans for empty tables.
+    cur.execute("SHOW TABLES")
+    for (table,) in cur.fetchall():
+        cur.execute(f"ANALYZE TABLE `{table}`")
+        cur.fetchall()
+    cur.close()
+    conn.close()
+
+
+# --- EXPLAIN every endpoint query ---
+def collect(base_url, query_log):
+    """Calls each endpoint; returns [(endpoint, sql, params)] from the dashboard's QUERY_LOG."""
+    open(query_log, "w").close()
+    queries = []
+    offset = 0
+    for endpoint in ENDPOINTS:
+        try:
+            with urllib.request.urlopen(base_url + endpoint, timeout=60) as response:
+                response.read()
+        except urllib.error.URLError as e:
+            raise SystemExit(f"[!] {endpoint}: {e}")
+        with open(query_log, encoding="utf-8") as f:
+            f.seek(offset)
+            logged = f.read()
+            offset = f.tell()
+        lines = [json.loads(line) for line in logged.splitlines() if line]
+        if not lines:
+            raise SystemExit(f"[!] {endpoint} logged no queries: start the dashboard with "
+                             f"QUERY_LOG={query_log} DB_NAME=<scratch database>")
+        # Transaction control (START TRANSACTION, COMMIT) has no plan.
+        queries += [(endpoint, q["sql"], q["params"]) for q in lines
+                    if q["sql"].lstrip().upper().startswith("SELECT")]
+    return queries
+
+
+def full_scans(cur, sql, params):
+    """EXPLAIN rows that read a whole table or index."""
+    cur.execute("EXPLAIN " + sql.replace("?", "%s"), params)
+    plan = cur.fetchall()
+    bad = [row for row in plan
+           if row["type"] in FULL_SCANS and row["table"]
+           and not row["table"].startswith("<") and row["table"] not in SMALL_TABLES]
+    return plan, bad
+
+
+def check(database, base_url, query_log, verbose=False):
+    queries = collect(base_url, query_log)
+    conn = mysql.connector.connect(**dict(DB_CONF, database=database))
+    cur = conn.cursor(dictionary=True)
+    failures = 0
+    for endpoint, sql, params in queries:
+        plan, bad = full_scans(cur, sql, params)
+        for row in plan if verbose else bad:
+            line = (f"{endpoint:<58} {row['table'] or '-':<20} {row['type'] or '-':<6} "
+                    f"{row['key'] or '-':<18} {row['rows'] or 0:>7}  {row['Extra'] or ''}")
+            print(("[!] Full scan: " if row in bad else "[explain] ") + line)
+        if bad:
+            print(f"    {' '.join(sql.split())}")
+        failures += len(bad)
+    cur.close()
+    conn.close()
+    print(f"[explain] {len(queries)} queries from {len(ENDPOINTS)} endpoints, {failures} full scans")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="EXPLAIN every dashboard query against a seeded database; exits 1 on a full scan.")
+    parser.add_argument("--database", default=DATABASE, help="scratch database (dropped by --seed)")
+    parser.add_argument("--seed", action="store_true",
+                        help="rebuild the scratch database from InstallationGuide.md and seed it, then exit")
+    parser.add_argument("--devices", type=int, default=DEVICES)
+    parser.add_argument("--days", type=float, default=DAYS)
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--query-log", default="queries.jsonl",
+                        help="the dashboard's QUERY_LOG file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan row")
+    args = parser.parse_args()
+    if args.seed:
+        seed(args.database, args.devices, args.days)
+    else:
+        sys.exit(1 if check(args.database, args.base_url, args.query_log, args.verbose) else 0)
@@ -1,4 +1,5 @@
 // lib/db.js
+import fs from 'fs';
 import mysql from 'mysql2/promise';
 
 
@@ -6,8 +7,35 @@ export const pool = mysql.createPool({
   host: '127.0.0.1',  // ? use IPv4 address
   user: 'root',
   password: 'tsitsitsitsi',
-  database: 'dashboard',
+  database: process.env.DB_NAME || 'dashboard',  // explain_check.py points it at a scratch database
   waitForConnections: true,
   connectionLimit: 10,
   queueLimit: 0,
 });
+
+// With QUERY_LOG set to a file path, every query (pool.query(), and
+// query() on connections from pool.getConnection()) is appended to it as
+// a JSON line ({ sql, params }) for explain_check.py to EXPLAIN. Unset,
+// the pool is left alone.
+const QUERY_LOG = process.env.QUERY_LOG;
+
+function logged(query) {
+  return (sql, params) => {
+    fs.appendFileSync(QUERY_LOG, JSON.stringify({ sql, params: params ?? [] }) + '\n');
+    return query(sql, params);
+  };
+}
+
+if (QUERY_LOG) {
+  pool.query = logged(pool.query.bind(pool));
+  const getConnection = pool.getConnection.bind(pool);
+  pool.getConnection = async () => {
+    const conn = await getConnection();
+    // Pooled connections come back; wrap each one once.
+    if (!conn.queryLogged) {
+      conn.query = logged(conn.query.bind(conn));
+      conn.queryLogged = true;
+    }
+    return conn;
+  };
+}
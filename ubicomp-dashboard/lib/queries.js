@@ -0,0 +1,40 @@
+// lib/queries.js
+
+// Time filters shared by the dashboard queries. They always compare the
+// bare column with constants (`last_seen >= FROM_UNIXTIME(?)`), never a
+// function of the column (`UNIX_TIMESTAMP(last_seen) > ?`), which hides it
+// from its index and scans the whole table. explain_check.py EXPLAINs
+// every endpoint query against a seeded database to keep it that way.
+// Each returns { sql, params } for pool.query().
+
+export function nowSec() {
+  return Date.now() / 1000;
+}
+
+export function since(column, sinceSec) {
+  return { sql: `${column} >= FROM_UNIXTIME(?)`, params: [sinceSec] };
+}
+
+// Rows from the last `seconds`.
+export function within(column, seconds, now = nowSec()) {
+  return since(column, now - seconds);
+}
+
+// [start, end)
+export function between(column, start, end) {
+  return { sql: `${column} >= FROM_UNIXTIME(?) AND ${column} < FROM_UNIXTIME(?)`, params: [start, end] };
+}
+
+// Any of several [start, end) ranges; MySQL reads each as its own index range.
+export function anyBetween(column, ranges) {
+  const parts = ranges.map(([start, end]) => between(column, start, end));
+  return {
+    sql: parts.map(p => `(${p.sql})`).join(' OR '),
+    params: parts.flatMap(p => p.params),
+  };
+}
+
+// Scanners label devices "<name> (<major class>)"; the pattern views skip
+// unclassified ones. A leading wildcard can't use an index, so this is
+// only ever a residual filter next to an indexed predicate.
+export const KNOWN_NAME = "device_name NOT LIKE '%(Unknown)%'";
@@ -0,0 +1,172 @@
+// lib/rollups.js
+import { pool } from '@/lib/db';
+import { anyBetween, between } from '@/lib/queries';
+import { DistinctSketch, hashPseudonym } from '@/lib/sketch';
+import { cover, slots } from '@/lib/tiles';
+
+// rollup_worker.py's cursor (its STATE_KEY): the buckets hold exactly the
+// device_sessions rows with ids up to it, whatever their timestamps.
+const ROLLUP_CURSOR = 'rollups.last_id';
+
+export const METRICS = ['sightings', 'devices', 'rssi', 'classes'];
+
+// Per metric: the rollup table and columns, and how bucket rows and raw
+// sightings fold into one point's value.
+const FOLDS = {
+  sightings: {
+    table: 'rollups',
+    columns: 'sightings',
+    init: () => ({ sightings: 0 }),
+    bucket: (acc, row) => { acc.sightings += row.sightings; },
+    sighting: (acc) => { acc.sightings++; },
+    value: (acc) => acc.sightings,
+  },
+  devices: {
+    table: 'rollups',
+    columns: 'device_sketch',
+    init: () => new DistinctSketch(),
+    bucket: (acc, row) => { acc.merge(row.device_sketch); },
+    sighting: (acc, row) => { acc.add(hashPseudonym(row.pseudonym)); },
+    value: (acc) => acc.count(),
+  },
+  rssi: {
+    table: 'rollups',
+    columns: 'rssi_near, rssi_mid, rssi_far',
+    init: () => ({ near: 0, mid: 0, far: 0 }),
+    bucket: (acc, row) => {
+      acc.near += row.rssi_near;
+      acc.mid += row.rssi_mid;
+      acc.far += row.rssi_far;
+    },
+    // Same bands as rollup_worker.py: near > -50 >= mid >= -70 > far.
+    sighting: (acc, { signal_strength: rssi }) => {
+      if (rssi === null) return;
+      if (rssi > -50) acc.near++;
+      else if (rssi >= -70) acc.mid++;
+      else acc.far++;
+    },
+    value: (acc) => acc,
+  },
+  classes: {
+    table: 'rollup_classes',
+    columns: 'major_class, sightings, device_sketch',
+    init: () => new Map(),
+    bucket: (acc, row) => {
+      const entry = classEntry(acc, row.major_class);
+      entry.sightings += row.sightings;
+      entry.sketch.merge(row.device_sketch);
+    },
+    // Raw rows without a class count as 'Unknown', as rollup_worker.py folds them.
+    sighting: (acc, row) => {
+      const entry = classEntry(acc, row.major_class ?? 'Unknown');
+      entry.sightings++;
+      entry.sketch.add(hashPseudonym(row.pseudonym));
+    },
+    // Most devices first.
+    value: (acc) => [...acc]
+      .map(([name, { sightings, sketch }]) => ({ name, devices: sketch.count(), sightings }))
+      .sort((a, b) => b.devices - a.devices),
+  },
+};
+
+function classEntry(acc, name) {
+  let entry = acc.get(name);
+  if (!entry) {
+    entry = { sightings: 0, sketch: new DistinctSketch() };
+    acc.set(name, entry);
+  }
+  return entry;
+}
+
+// `metric` over [since, until) (epoch seconds), as one point per `step`
+// seconds (default: the whole window), optionally for one location.
+// Returns [{ start, end, value }]; `devices` and `classes` count distinct
+// devices, exactly up to 512 per bucket and by HyperLogLog (~1.6 %) above.
+//
+// Buckets answer for the rows the worker has folded (ids up to its
+// cursor); rows past the cursor, however late their timestamps, are read
+// raw. Cursor, buckets and raw rows come from one consistent snapshot, as
+// the worker moves its cursor in the same transaction as the buckets.
+export async function aggregate({ metric, since, until, step, location, now = Date.now() / 1000 }) {
+  const fold = FOLDS[metric];
+  const points = slots(since, until, step || until - since, now);
+  const spans = [];
+  const raw = [];
+  for (const point of points) {
+    const tiles = cover(point.start, point.end, now);
+    for (const span of tiles.spans) {
+      const last = spans[spans.length - 1];
+      if (last && last.resolution === span.resolution && last.end === span.start) last.end = span.end;
+      else spans.push({ ...span });
+    }
+    for (const range of tiles.raw) {
+      const last = raw[raw.length - 1];
+      if (last && last[1] === range[0]) last[1] = range[1];
+      else raw.push([...range]);
+    }
+    point.acc = fold.init();
+  }
+  const where = location === undefined ? '' : ' AND scanner_location = ?';
+  const extra = location === undefined ? [] : [location];
+  const pointAt = t => {
+    let lo = 0;
+    let hi = points.length - 1;
+    while (lo < hi) {
+      const mid = (lo + hi) >> 1;
+      if (t < points[mid].end) hi = mid;
+      else lo = mid + 1;
+    }
+    return points[lo];
+  };
+
+  const sightings = `SELECT UNIX_TIMESTAMP(last_seen) AS ts, pseudonym, major_class, signal_strength
+                     FROM device_sessions`;
+
+  const conn = await pool.getConnection();
+  try {
+    await conn.query('START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY');
+    const [[state]] = await conn.query('SELECT value FROM worker_state WHERE name = ?', [ROLLUP_CURSOR]);
+    const rolled = state ? Number(state.value) : 0;
+
+    if (spans.length) {
+      const ranges = spans.map(({ resolution, start, end }) => {
+        const range = between('bucket_start', start, end);
+        return { sql: `(resolution = ? AND ${range.sql})`, params: [resolution, ...range.params] };
+      });
+      const [rows] = await conn.query(
+        `SELECT UNIX_TIMESTAMP(bucket_start) AS start, ${fold.columns}
+         FROM ${fold.table}
+         WHERE (${ranges.map(r => r.sql).join(' OR ')})${where}`,
+        [...ranges.flatMap(r => r.params), ...extra]
+      );
+      for (const row of rows) fold.bucket(pointAt(Number(row.start)).acc, row);
+    }
+    if (raw.length) {
+      // The partial edge buckets: range reads of a few seconds each,
+      // covered by idx_ds_recent. Rows past the cursor come next.
+      const edges = anyBetween('last_seen', raw);
+      const [rows] = await conn.query(
+        `${sightings} WHERE (${edges.sql}) AND id <= ?${where}`,
+        [...edges.params, rolled, ...extra]
+      );
+      for (const row of rows) fold.sighting(pointAt(Number(row.ts)).acc, row);
+    }
+    // Not yet rolled up: normally the last poll or two, read by primary key.
+    const window = between('last_seen', since, until);
+    const [rows] = await conn.query(
+      `${sightings} WHERE id > ? AND ${window.sql}${where}`,
+      [rolled, ...window.params, ...extra]
+    );
+    for (const row of rows) fold.sighting(pointAt(Number(row.ts)).acc, row);
+    await conn.query('COMMIT');
+  } finally {
+    conn.release();
+  }
+  return points.map(({ start, end, acc }) => ({ start, end, value: fold.value(acc) }));
+}
+
+// The metric's value over one window, e.g. windowValue('devices', since).
+export async function windowValue(metric, since, until = Date.now() / 1000, location) {
+  const [point] = await aggregate({ metric, since, until, location });
+  return point.value;
+}
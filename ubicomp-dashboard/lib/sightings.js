@@ -0,0 +1,103 @@
+// lib/sightings.js
+import crypto from 'crypto';
+
+// Columns written for every sighting, in insert order.
+export const SIGHTING_COLUMNS =
+  '(pseudonym, device_name, signal_strength, scanner_location, major_class, last_seen)';
+
+// Optional presence events sent by scanners running delta uploads.
+export const EVENTS = ['appear', 'update', 'heartbeat', 'depart'];
+
+// Sanity window for scanner-stamped observation times (seen_at, epoch
+// seconds). Spooled sightings can arrive hours late; anything from the
+// future beyond clock skew, or older than the spool could hold, is refused.
+const MAX_FUTURE_SKEW_SEC = 30;
+const MAX_AGE_SEC = Number(process.env.INGEST_MAX_AGE_SEC) || 24 * 60 * 60;
+
+// Scanners send a ready-made keyed pseudonym; the legacy `mac` field
+// (a scanner-side hash) is still hashed again here.
+const PSEUDONYM_RE = /^[0-9a-f]{12}$/;
+
+export function validateSighting(item, nowSec = Date.now() / 1000) {
+  if (!item || typeof item !== 'object') return 'Invalid sighting';
+  const { mac, pseudonym, name, rssi, location, major_class, event, seen_at } = item;
+  if ((!mac && !pseudonym) || !name || typeof rssi !== 'number' || !location || !major_class) {
+    return 'Missing fields';
+  }
+  if (pseudonym !== undefined && !PSEUDONYM_RE.test(pseudonym)) return 'Invalid pseudonym';
+  if (event !== undefined && !EVENTS.includes(event)) return 'Unknown event';
+  if (seen_at !== undefined) {
+    if (typeof seen_at !== 'number' || !Number.isFinite(seen_at)) return 'Invalid seen_at';
+    if (seen_at > nowSec + MAX_FUTURE_SKEW_SEC || seen_at < nowSec - MAX_AGE_SEC) {
+      return 'seen_at out of range';
+    }
+  }
+  return null;
+}
+
+// A departure says the device is gone; it is not a sighting to record.
+export function isSighting(item) {
+  return item.event !== 'depart';
+}
+
+export function pseudonymize(mac) {
+  return crypto
+    .createHash('sha256')
+    .update(mac + process.env.SESSION_KEY)
+    .digest('hex')
+    .slice(0, 12);
+}
+
+// Placeholders for one row; last_seen falls back to NOW() for scanners
+// that don't send seen_at.
+export const SIGHTING_PLACEHOLDERS = '(?, ?, ?, ?, ?, COALESCE(FROM_UNIXTIME(?), NOW()))';
+
+export function sightingRow({ mac, pseudonym, name, rssi, location, major_class, seen_at }) {
+  return [pseudonym ?? pseudonymize(mac), name, rssi, location, major_class, seen_at ?? null];
+}
+
+// device_current holds one row per device: its latest name, class, RSSI
+// and location. It is upserted with every insert into device_sessions, so
+// "who is here now" queries scan only recent devices, not history. Older
+// sightings (spool replays) can move first_seen back but never overwrite
+// newer state. MySQL applies the assignments left to right, so last_seen
+// is updated last and the IFs compare against the old value.
+const CURRENT_PLACEHOLDERS =
+  '(?, ?, ?, ?, ?, COALESCE(FROM_UNIXTIME(?), NOW()), COALESCE(FROM_UNIXTIME(?), NOW()))';
+const CURRENT_UPSERT = `
+  INSERT INTO device_current
+    (pseudonym, device_name, signal_strength, scanner_location, major_class, first_seen, last_seen)
+  VALUES %s
+  ON DUPLICATE KEY UPDATE
+    device_name = IF(VALUES(last_seen) >= last_seen, VALUES(device_name), device_name),
+    signal_strength = IF(VALUES(last_seen) >= last_seen, VALUES(signal_strength), signal_strength),
+    scanner_location = IF(VALUES(last_seen) >= last_seen, VALUES(scanner_location), scanner_location),
+    major_class = IF(VALUES(last_seen) >= last_seen, VALUES(major_class), major_class),
+    first_seen = LEAST(first_seen, VALUES(first_seen)),
+    last_seen = GREATEST(last_seen, VALUES(last_seen))`;
+
+// Upserts device_current from sightingRow() rows, on `conn` (the caller's
+// transaction). Only each device's newest row in the batch is written, in
+// pseudonym order so concurrent batches lock rows in the same order.
+export async function upsertCurrent(conn, rows) {
+  const latest = new Map();
+  const earliest = new Map();
+  for (const row of rows) {
+    // seen_at (row[5]) is null when the scanner didn't send one: "now".
+    const seen = row[5] ?? Infinity;
+    const prev = latest.get(row[0]);
+    if (!prev || seen >= (prev[5] ?? Infinity)) latest.set(row[0], row);
+    if (!earliest.has(row[0]) || seen < earliest.get(row[0])) earliest.set(row[0], seen);
+  }
+  if (latest.size === 0) return;
+  const keys = [...latest.keys()].sort();
+  const params = keys.flatMap(key => {
+    const [pseudonym, name, rssi, location, major, seenAt] = latest.get(key);
+    const first = earliest.get(key);
+    return [pseudonym, name, rssi, location, major, first === Infinity ? null : first, seenAt];
+  });
+  await conn.query(
+    CURRENT_UPSERT.replace('%s', keys.map(() => CURRENT_PLACEHOLDERS).join(', ')),
+    params
+  );
+}
@@ -0,0 +1,83 @@
+// lib/sketch.js
+import crypto from 'crypto';
+
+// Distinct-device sketches stored in the rollup tables (sketch.py's
+// DistinctSketch writes them; tests/test_sketch.py checks the two agree). Encoding:
+//   exact: 0x01, then sorted 64-bit pseudonym hashes, big-endian
+//   hll:   0x02, the precision, then 2**precision one-byte registers
+// Merging the sketches of several buckets counts each device once, where
+// summing their `devices` columns would count it once per bucket.
+const EXACT = 1;
+const HLL = 2;
+const PRECISION = 12;
+const EXACT_LIMIT = (1 << PRECISION) / 8;
+const SHIFT = BigInt(64 - PRECISION);
+const REST_MASK = (1n << SHIFT) - 1n;
+
+// Same hash as sketch.pseudonym_hash(): the first 8 bytes of SHA-256.
+export function hashPseudonym(pseudonym) {
+  return crypto.createHash('sha256').update(pseudonym).digest().readBigUInt64BE(0);
+}
+
+function bitLength(n) {
+  return n === 0n ? 0 : n.toString(2).length;
+}
+
+export class DistinctSketch {
+  constructor() {
+    this.hashes = new Set();
+    this.registers = null;
+  }
+
+  add(hash) {
+    if (this.registers) {
+      this.addRegister(hash);
+      return;
+    }
+    this.hashes.add(hash);
+    if (this.hashes.size > EXACT_LIMIT) this.toHll();
+  }
+
+  addRegister(hash) {
+    const index = Number(hash >> SHIFT);
+    const rank = 64 - PRECISION - bitLength(hash & REST_MASK) + 1;
+    if (rank > this.registers[index]) this.registers[index] = rank;
+  }
+
+  toHll() {
+    this.registers = new Uint8Array(1 << PRECISION);
+    for (const hash of this.hashes) this.addRegister(hash);
+    this.hashes = new Set();
+  }
+
+  // Merges an encoded sketch (a Buffer read from device_sketch).
+  merge(buf) {
+    if (buf[0] === HLL) {
+      if (buf[1] !== PRECISION) throw new Error(`Sketch precision ${buf[1]}, expected ${PRECISION}`);
+      if (!this.registers) this.toHll();
+      for (let i = 0; i < this.registers.length; i++) {
+        if (buf[i + 2] > this.registers[i]) this.registers[i] = buf[i + 2];
+      }
+    } else if (buf[0] === EXACT) {
+      for (let off = 1; off + 8 <= buf.length; off += 8) this.add(buf.readBigUInt64BE(off));
+    } else {
+      throw new Error(`Unknown sketch type ${buf[0]}`);
+    }
+    return this;
+  }
+
+  count() {
+    if (!this.registers) return this.hashes.size;
+    const m = this.registers.length;
+    let sum = 0;
+    let zeros = 0;
+    for (const r of this.registers) {
+      sum += 2 ** -r;
+      if (r === 0) zeros++;
+    }
+    const estimate = (0.7213 / (1 + 1.079 / m)) * m * m / sum;
+    // Linear counting while most registers are empty.
+    if (estimate <= 2.5 * m && zeros) return Math.round(m * Math.log(m / zeros));
+    return Math.round(estimate);
+  }
+}
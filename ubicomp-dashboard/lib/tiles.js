@@ -0,0 +1,54 @@
+// lib/tiles.js
+
+// How lib/rollups.js tiles a window with rollup buckets. Pure arithmetic,
+// no database, so tests/test_tiles.py can run it under plain node.
+
+// Bucket widths (seconds) kept by rollup_worker.py, coarsest first. A
+// window is answered from the few buckets that tile it, so the rows read
+// depend on the window's length and the number of locations, not on traffic.
+export const RESOLUTIONS = [3600, 60, 10];
+
+// Seconds each resolution is kept (rollup_worker.py RETENTION).
+export const RETENTION = { 10: 2 * 86400, 60: 14 * 86400, 3600: Infinity };
+
+// The finest resolution still kept for buckets starting at `t`.
+export function finestAt(t, now) {
+  return RESOLUTIONS.filter(r => t >= now - RETENTION[r]).pop();
+}
+
+// Splits [since, until) into aligned buckets, the coarsest that fit first
+// (`spans`: runs of { resolution, start, end }), and the partial edge
+// buckets, read raw (`raw`: [start, end]).
+export function cover(since, until, now = Date.now() / 1000) {
+  const finest = finestAt(since, now);
+  let start = Math.ceil(since / finest) * finest;
+  const end = Math.floor(until / finest) * finest;
+  if (start >= end) return { spans: [], raw: [[since, until]] };
+  const spans = [];
+  const raw = [];
+  if (since < start) raw.push([since, start]);
+  while (start < end) {
+    const resolution = RESOLUTIONS.find(r => r >= finest && start % r === 0 && start + r <= end);
+    const last = spans[spans.length - 1];
+    if (last && last.resolution === resolution) last.end += resolution;
+    else spans.push({ resolution, start, end: start + resolution });
+    start += resolution;
+  }
+  if (end < until) raw.push([end, until]);
+  return { spans, raw };
+}
+
+// Slot boundaries for a series: since, since + step, ... until. Interior
+// boundaries are snapped to the finest bucket kept, so only the series'
+// own ends need raw rows; slots may differ in
+// length by up to that bucket, and each point reports its exact start and end.
+export function slots(since, until, step, now) {
+  const finest = finestAt(since, now);
+  const bounds = [since];
+  for (let t = since + step; t < until; t += step) {
+    const snapped = Math.round(t / finest) * finest;
+    if (snapped > bounds[bounds.length - 1] && snapped < until) bounds.push(snapped);
+  }
+  bounds.push(until);
+  return bounds.slice(1).map((end, i) => ({ start: bounds[i], end }));
+}
@@ -0,0 +1,30 @@
+// lib/trace.js
+import fs from 'fs';
+
+// Freshness trace (Python_Scanning/freshness_report.py reads it). Scanners
+// tag each batch with X-Trace-Id; with TRACE_LOG set to a file path, the
+// batch route logs when each traced batch was received and committed, and
+// the polled routes log when they served data. Unset, nothing is written.
+const TRACE_LOG = process.env.TRACE_LOG;
+const TRACE_ID_RE = /^[0-9a-f]{16}$/;
+
+function write(record) {
+  fs.appendFile(TRACE_LOG, JSON.stringify(record) + '\n', err => {
+    if (err) console.error('[trace]', err.message);
+  });
+}
+
+export function traceId(req) {
+  const id = req.headers['x-trace-id'];
+  return TRACE_LOG && TRACE_ID_RE.test(id || '') ? id : null;
+}
+
+export function traceStage(id, stage, fields = {}) {
+  if (id) write({ trace: id, stage, t: Date.now() / 1000, ...fields });
+}
+
+// `queriedAt` is when the route's query started: every batch committed
+// before then is visible in the response.
+export function traceServed(endpoint, queriedAt, fields = {}) {
+  if (TRACE_LOG) write({ stage: 'served', endpoint, t: queriedAt, ...fields });
+}
@@ -0,0 +1,110 @@
+// lib/wire.js
+import zlib from 'zlib';
+
+// Binary sighting batches (Python_Scanning/wire.py is the encoder).
+// Layout, little-endian: header (magic "UBWB", version, flags, count,
+// base seen_at as float64), string table, then one column per field.
+export const WIRE_CONTENT_TYPE = 'application/x-ubicomp-batch';
+
+const MAGIC = 'UBWB';
+const VERSION = 1;
+const HEADER_BYTES = 16;
+const EVENTS = [undefined, 'appear', 'update', 'heartbeat', 'depart'];
+const NO_SEEN_AT = 0xffffffff;
+
+// Request bodies are read by hand (bodyParser is off for the batch route).
+const MAX_BODY_BYTES = 2 * 1024 * 1024;
+const MAX_DECODED_BYTES = 16 * 1024 * 1024;
+
+export class WireError extends Error {
+  constructor(status, message) {
+    super(message);
+    this.status = status;
+  }
+}
+
+export async function readBody(req, limit = MAX_BODY_BYTES) {
+  const chunks = [];
+  let size = 0;
+  for await (const chunk of req) {
+    size += chunk.length;
+    if (size > limit) throw new WireError(413, 'Body too large');
+    chunks.push(chunk);
+  }
+  return Buffer.concat(chunks);
+}
+
+export function decompress(body, encoding) {
+  if (!encoding || encoding === 'identity') return body;
+  const options = { maxOutputLength: MAX_DECODED_BYTES };
+  try {
+    if (encoding === 'gzip') return zlib.gunzipSync(body, options);
+    // zstd is only built into newer Node releases.
+    if (encoding === 'zstd' && typeof zlib.zstdDecompressSync === 'function') {
+      return zlib.zstdDecompressSync(body, options);
+    }
+  } catch (err) {
+    throw new WireError(400, `Could not decompress body: ${err.message}`);
+  }
+  throw new WireError(415, `Unsupported Content-Encoding: ${encoding}`);
+}
+
+// Returns the batch as the same objects a JSON body would parse into.
+export function decodeBatch(buf) {
+  if (buf.length < HEADER_BYTES || buf.toString('latin1', 0, 4) !== MAGIC) {
+    throw new WireError(400, 'Not a sighting batch');
+  }
+  if (buf[4] !== VERSION) throw new WireError(415, `Unsupported batch version ${buf[4]}`);
+  const count = buf.readUInt16LE(6);
+  const base = buf.readDoubleLE(8);
+  let off = HEADER_BYTES;
+  try {
+    const strings = new Array(buf.readUInt16LE(off));
+    off += 2;
+    for (let i = 0; i < strings.length; i++) {
+      const len = buf.readUInt16LE(off);
+      strings[i] = buf.toString('utf8', off + 2, off + 2 + len);
+      off += 2 + len;
+    }
+    const pseudonyms = off;
+    const names = pseudonyms + count * 6;
+    const locations = names + count * 2;
+    const classes = locations + count * 2;
+    const rssi = classes + count * 2;
+    const events = rssi + count;
+    const stamps = events + count;
+    if (stamps + count * 4 !== buf.length) throw new WireError(400, 'Truncated batch');
+
+    const items = new Array(count);
+    for (let i = 0; i < count; i++) {
+      const delta = buf.readUInt32LE(stamps + i * 4);
+      const item = {
+        pseudonym: buf.toString('hex', pseudonyms + i * 6, pseudonyms + i * 6 + 6),
+        name: strings[buf.readUInt16LE(names + i * 2)],
+        rssi: buf.readInt8(rssi + i),
+        location: strings[buf.readUInt16LE(locations + i * 2)],
+        major_class: strings[buf.readUInt16LE(classes + i * 2)],
+      };
+      if (delta !== NO_SEEN_AT) item.seen_at = base + delta / 1000;
+      const event = EVENTS[buf[events + i]];
+      if (event) item.event = event;
+      items[i] = item;
+    }
+    return items;
+  } catch (err) {
+    if (err instanceof WireError) throw err;
+    throw new WireError(400, 'Truncated batch');
+  }
+}
+
+// Parses a batch body in either format, by Content-Type.
+export async function readBatch(req) {
+  const body = decompress(await readBody(req), req.headers['content-encoding']);
+  const type = (req.headers['content-type'] || '').split(';')[0].trim();
+  if (type === WIRE_CONTENT_TYPE) return decodeBatch(body);
+  try {
+    return JSON.parse(body.toString('utf8'));
+  } catch {
+    throw new WireError(400, 'Invalid JSON');
+  }
+}
@@ -0,0 +1,41 @@
+// pages/api/aggregate.js
+import { aggregate, METRICS } from '@/lib/rollups';
+
+// GET /api/aggregate?metric=devices&window=900&step=60&location=lab
+//   metric    sightings | devices | rssi | classes
+//   window    seconds back from `until` (default 600), or since=<epoch s>
+//   until     epoch seconds (default now)
+//   step      seconds per point (default: one point for the whole window)
+//   location  one scanner_location (default: all)
+// Answered from the rollup buckets (lib/rollups.js), with raw sightings
+// only for partial edge buckets and the last few seconds.
+const DEFAULT_WINDOW_SEC = 600;
+const MAX_WINDOW_SEC = 366 * 24 * 60 * 60;
+const MIN_STEP_SEC = 10;
+const MAX_POINTS = 1000;
+
+export default async function handler(req, res) {
+  if (req.method !== 'GET') return res.status(405).end();
+  const { metric, location } = req.query;
+  if (!METRICS.includes(metric)) {
+    return res.status(400).json({ error: `metric must be one of ${METRICS.join(', ')}` });
+  }
+  if (location !== undefined && typeof location !== 'string') {
+    return res.status(400).json({ error: 'At most one location' });
+  }
+  const now = Date.now() / 1000;
+  const until = req.query.until !== undefined ? Number(req.query.until) : now;
+  const since = req.query.since !== undefined
+    ? Number(req.query.since)
+    : until - Number(req.query.window ?? DEFAULT_WINDOW_SEC);
+  if (!Number.isFinite(since) || !Number.isFinite(until) || since >= until || until - since > MAX_WINDOW_SEC) {
+    return res.status(400).json({ error: 'Invalid window' });
+  }
+  const step = req.query.step !== undefined ? Number(req.query.step) : undefined;
+  if (step !== undefined && !(step >= MIN_STEP_SEC && (until - since) / step <= MAX_POINTS)) {
+    return res.status(400).json({ error: `step must be at least ${MIN_STEP_SEC} s and give at most ${MAX_POINTS} points` });
+  }
+
+  const points = await aggregate({ metric, since, until, step, location, now });
+  res.status(200).json({ metric, since, until, location: location ?? null, points });
+}
@@ -1,18 +1,14 @@
 
-import { pool } from '@/lib/db';
+import { windowValue } from '@/lib/rollups';
 
 export default async function handler(req, res) {
-  const [rows] = await pool.query(
-    `SELECT major_class, COUNT(*) AS cnt
-     FROM device_sessions
-     WHERE UNIX_TIMESTAMP(last_seen) > UNIX_TIMESTAMP(NOW()) - 600
-     GROUP BY major_class`
-  );
+  const since = Math.floor(Date.now() / 1000) - 600;
+  const classes = await windowValue('classes', since);
 
   
-  const data = rows.map(({ major_class, cnt }) => ({
-    name: major_class,
-    value: cnt
+  const data = classes.map(({ name, devices }) => ({
+    name,
+    value: devices
   }));
 
   res.status(200).json(data);
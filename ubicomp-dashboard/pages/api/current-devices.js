@@ -1,23 +1,28 @@
 import { pool } from '@/lib/db';
+import { within } from '@/lib/queries';
 
+// Devices seen in the last windowSec, with how long their current stay
+// (presence_intervals, see sessionizer.py) has lasted.
 export default async function handler(req, res) {
   const windowSec = 20;
+  const recent = within('last_seen', windowSec);
   const [rows] = await pool.query(
-    `SELECT pseudonym, device_name AS name, MIN(last_seen) AS first_ts, MAX(last_seen) AS last_ts
-     FROM device_sessions
-     WHERE last_seen >= DATE_SUB(NOW(), INTERVAL ? SECOND)
-     GROUP BY pseudonym, device_name`,
-    [windowSec]
+    `SELECT pseudonym, MAX(device_name) AS name,
+            MAX(UNIX_TIMESTAMP(last_seen) - UNIX_TIMESTAMP(first_seen)) AS duration
+     FROM presence_intervals
+     WHERE ${recent.sql}
+     GROUP BY pseudonym`,
+    recent.params
   );
 
   const devices = rows.map(r => ({
     pseudonym: r.pseudonym,
     name: r.name,
-    duration: Math.floor((r.last_ts - r.first_ts) / 1000)
+    duration: Math.floor(Number(r.duration))
   }));
 
   const totalUnique = devices.length;
   const maxDuration = devices.reduce((max, d) => Math.max(max, d.duration), 0);
 
   res.status(200).json({ devices, totalUnique, maxDuration });
-}
\ No newline at end of file
+}
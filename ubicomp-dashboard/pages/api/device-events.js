@@ -1,16 +1,18 @@
 // pages/api/device-events.js
 import { pool } from '@/lib/db';
+import { within } from '@/lib/queries';
 
 export default async function handler(req, res) {
   const windowMin = 15;
+  const recent = within('last_seen', windowMin * 60);
 
   const [rows] = await pool.query(
     
     `SELECT UNIX_TIMESTAMP(last_seen)*1000 AS timestamp
      FROM device_sessions
-     WHERE last_seen >= DATE_SUB(NOW(), INTERVAL ? MINUTE)
+     WHERE ${recent.sql}
      ORDER BY last_seen ASC`,
-    [windowMin]
+    recent.params
   );
   res.status(200).json({ events: rows });
 }
\ No newline at end of file
@@ -0,0 +1,70 @@
+// pages/api/device-log-batch.js
+import { pool } from '@/lib/db';
+import {
+  SIGHTING_COLUMNS, SIGHTING_PLACEHOLDERS, isSighting, sightingRow, upsertCurrent, validateSighting,
+} from '@/lib/sightings';
+import { traceId, traceStage } from '@/lib/trace';
+import { WireError, readBatch } from '@/lib/wire';
+
+const MAX_BATCH = 1000;
+
+// Bodies are JSON or the binary wire format (lib/wire.js), possibly
+// compressed, so they are read and decoded here rather than by Next.
+export const config = {
+  api: { bodyParser: false },
+};
+
+export default async function handler(req, res) {
+  if (req.method !== 'POST') return res.status(405).end();
+  const trace = traceId(req);
+  traceStage(trace, 'received');
+
+  let items;
+  try {
+    items = await readBatch(req);
+  } catch (err) {
+    if (err instanceof WireError) return res.status(err.status).json({ error: err.message });
+    throw err;
+  }
+  if (!Array.isArray(items)) {
+    return res.status(400).json({ error: 'Expected an array of sightings' });
+  }
+  if (items.length > MAX_BATCH) {
+    return res.status(413).json({ error: `At most ${MAX_BATCH} sightings per batch` });
+  }
+
+  // Validate every item up front; only valid sightings go into the insert.
+  const results = items.map(item => {
+    const error = validateSighting(item);
+    return error ? { ok: false, error } : { ok: true };
+  });
+  const rows = items
+    .filter((item, i) => results[i].ok && isSighting(item))
+    .map(sightingRow);
+
+  let firstId = null;
+  if (rows.length > 0) {
+    const placeholders = rows.map(() => SIGHTING_PLACEHOLDERS).join(', ');
+    const conn = await pool.getConnection();
+    try {
+      await conn.beginTransaction();
+      const [result] = await conn.query(
+        `INSERT INTO device_sessions ${SIGHTING_COLUMNS} VALUES ${placeholders}`,
+        rows.flat()
+      );
+      firstId = result.insertId;
+      await upsertCurrent(conn, rows);
+      await conn.commit();
+    } catch (err) {
+      await conn.rollback();
+      throw err;
+    } finally {
+      conn.release();
+    }
+  }
+
+  // The batch's rows take consecutive ids from firstId; freshness_report.py
+  // matches them against the sessionizer's fold log.
+  traceStage(trace, 'committed', { inserted: rows.length, first_id: firstId });
+  res.status(200).json({ inserted: rows.length, results });
+}
@@ -1,33 +1,30 @@
 
 import { pool } from '@/lib/db';
-import crypto from 'crypto';
+import {
+  SIGHTING_COLUMNS, SIGHTING_PLACEHOLDERS, isSighting, sightingRow, upsertCurrent, validateSighting,
+} from '@/lib/sightings';
 
 export default async function handler(req, res) {
 
   if (req.method !== 'POST') return res.status(405).end();
-  
-  const { mac, name, rssi, location, major_class } = req.body;
 
-  if (!mac || !name || typeof rssi !== 'number' || !location || !major_class) {
-    return res.status(400).json({ error: 'Missing fields' });
+  const error = validateSighting(req.body);
+  if (error) {
+    return res.status(400).json({ error });
 
   }
+  if (!isSighting(req.body)) return res.status(200).json({ ok: true });
 
-  const pseudonym = crypto
-
-    .createHash('sha256')
-    .update(mac + process.env.SESSION_KEY)
-    .digest('hex')
-    .slice(0, 12);
-
+  const row = sightingRow(req.body);
   await pool.query(
 
     `REPLACE INTO device_sessions
-      (pseudonym, device_name, signal_strength, scanner_location, major_class, last_seen)
-     VALUES (?, ?, ?, ?, ?, NOW())`,
-    [pseudonym, name, rssi, location, major_class]
+      ${SIGHTING_COLUMNS}
+     VALUES ${SIGHTING_PLACEHOLDERS}`,
+    row
 
   );
+  await upsertCurrent(pool, [row]);
 
   res.status(200).json({ ok: true });
 }
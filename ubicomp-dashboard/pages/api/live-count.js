@@ -1,13 +1,19 @@
 // pages/api/live-count.js
 import { pool } from '@/lib/db';
+import { within } from '@/lib/queries';
+import { traceServed } from '@/lib/trace';
 
 export default async function handler(req, res) {
-    const since = Math.floor(Date.now() / 1000) - 20; // 10 seconds
+    const queriedAt = Date.now() / 1000;
+    const recent = within('last_seen', 20, queriedAt);
+    // device_current has one row per device, so this reads only the
+    // devices seen in the window (idx_dc_recent).
     const [rows] = await pool.query(
-      `SELECT COUNT(DISTINCT pseudonym) AS count
-       FROM device_sessions
-       WHERE UNIX_TIMESTAMP(last_seen) > ?`,
-      [since]
+      `SELECT COUNT(*) AS count
+       FROM device_current
+       WHERE ${recent.sql}`,
+      recent.params
     );
+    traceServed('live-count', queriedAt);
     res.status(200).json({ liveCount: rows[0].count });
 }
@@ -1,23 +1,13 @@
 
-import { pool } from '@/lib/db';
+import { windowValue } from '@/lib/rollups';
 
 export default async function handler(req, res) {
   
-  const [rows] = await pool.query(
-    `SELECT major_class FROM device_sessions
-     WHERE UNIX_TIMESTAMP(last_seen) > UNIX_TIMESTAMP(NOW()) - 600`
-  );
+  const since = Math.floor(Date.now() / 1000) - 600;
+  const classes = await windowValue('classes', since);
 
-  
-  const counts = rows.reduce((acc, { major_class }) => {
-    acc[major_class] = (acc[major_class] || 0) + 1;
-    return acc;
-  }, {});
-
-
-  
-  const commonClass = Object.entries(counts)
-    .sort((a, b) => b[1] - a[1])[0]?.[0] || '';
+  // Classes come sorted by distinct devices, most first.
+  const commonClass = classes[0]?.name || '';
 
   res.status(200).json({ commonClass });
 }
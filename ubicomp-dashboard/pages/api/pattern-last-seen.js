@@ -1,15 +1,17 @@
 import { pool } from '@/lib/db';
+import { KNOWN_NAME, within } from '@/lib/queries';
 
 export default async function handler(req, res) {
 
+  // device_current: one row per device, so only recent devices are read.
+  const recent = within('last_seen', 2 * 60);
   const [realDeviceActivityRows] = await pool.query(`
-    SELECT pseudonym, device_name, MAX(last_seen) AS last_seen
-      FROM device_sessions
-     WHERE device_name NOT LIKE '%(Unknown)%'
-     GROUP BY pseudonym, device_name
-    HAVING MAX(last_seen) >= NOW() - INTERVAL 2 MINUTE
+    SELECT pseudonym, device_name, last_seen
+      FROM device_current
+     WHERE ${recent.sql}
+       AND ${KNOWN_NAME}
     ORDER BY last_seen DESC
-  `);
+  `, recent.params);
   const realDeviceActivities = realDeviceActivityRows.map(r => ({
     pseudonym:   r.pseudonym,
     device_name: r.device_name, // This is the real name
@@ -22,7 +24,7 @@ export default async function handler(req, res) {
     SELECT pseudonym, device_name AS synthetic_name, message
       FROM synthetic_patterns
      WHERE pattern_type = 'last_seen'
-       AND device_name NOT LIKE '%(Unknown)%'
+       AND ${KNOWN_NAME}
   `);
   const syntheticMovements = syntheticMovementRows.map(s => ({
     pseudonym: s.pseudonym,
@@ -1,14 +1,17 @@
 import { pool } from '@/lib/db';
+import { KNOWN_NAME, within } from '@/lib/queries';
 
 export default async function handler(req, res) {
 
 
 
+  const recent = within('last_seen', 2 * 60);
   const [realDeviceNameRows] = await pool.query(
 
-    `SELECT DISTINCT pseudonym, device_name
-     FROM device_sessions
-     WHERE last_seen >= NOW() - INTERVAL 2 MINUTE AND device_name NOT LIKE '%(Unknown)%'`
+    `SELECT pseudonym, device_name
+     FROM device_current
+     WHERE ${recent.sql} AND ${KNOWN_NAME}`,
+    recent.params
 
   );
   const realNameMap = new Map(realDeviceNameRows.map(r => [r.pseudonym, r.device_name]));
@@ -18,7 +21,7 @@ export default async function handler(req, res) {
     `SELECT pseudonym, device_name AS synthetic_name, message
      FROM synthetic_patterns
      WHERE pattern_type='routine'
-       AND device_name NOT LIKE '%(Unknown)%'`
+       AND ${KNOWN_NAME}`
   );
 
   const routinePatterns = synthRows.map(s => ({
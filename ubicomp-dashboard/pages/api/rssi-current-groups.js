@@ -1,11 +1,14 @@
 
 import { pool } from '@/lib/db';
+import { within } from '@/lib/queries';
 
 export default async function handler(req, res) {
+  const recent = within('last_seen', 20);
   const [rows] = await pool.query(
     `SELECT device_name AS name, signal_strength AS rssi
-     FROM device_sessions
-     WHERE last_seen >= DATE_SUB(NOW(), INTERVAL 20 SECOND)`
+     FROM device_current
+     WHERE ${recent.sql}`,
+    recent.params
   );
   const groups = { near: [], mid: [], far: [] };
 
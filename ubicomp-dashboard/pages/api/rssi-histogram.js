@@ -1,21 +1,11 @@
 // pages/api/rssi-histogram.js
-import { pool } from '@/lib/db';
+import { windowValue } from '@/lib/rollups';
 
 export default async function handler(req, res) {
   
   const twentyMinutesAgo = Math.floor(Date.now() / 1000) - (15* 60); 
 
-  const [rows] = await pool.query(
-    `SELECT
-      SUM(signal_strength > -50) AS near,
-      SUM(signal_strength BETWEEN -70 AND -50) AS mid,
-      SUM(signal_strength < -70) AS far
-     FROM device_sessions
-     WHERE UNIX_TIMESTAMP(last_seen) >= ?`,
-    [twentyMinutesAgo]
-  );
-
-  const { near, mid, far } = rows[0];
+  const { near, mid, far } = await windowValue('rssi', twentyMinutesAgo);
 
   res.status(200).json([
     { range: 'near (> -50 dB)', count: near },
@@ -0,0 +1,302 @@
+import argparse
+import time
+from datetime import datetime
+
+import mysql.connector
+
+from sessionizer import DB_CONF, FETCH_LIMIT, ID_HOLE_TIMEOUT, POLL_INTERVAL, IdTail, fetch, reconnect
+from sketch import DistinctSketch, pseudonym_hash
+
+# --- Config ---
+RESOLUTIONS = (10, 60, 3600)  # bucket widths in seconds; each divides the next
+RETENTION = {10: 2 * 86400, 60: 14 * 86400, 3600: None}  # seconds kept per resolution (None = forever)
+PRUNE_INTERVAL = 600  # seconds between retention sweeps
+RSSI_NEAR = -50  # bands of /api/rssi-histogram: near > -50 >= mid >= -70 > far
+RSSI_FAR = -70
+RECOMPUTE_CHUNK = 3600  # seconds of raw rows rebuilt per transaction (a multiple of the coarsest bucket)
+KEYS_PER_QUERY = 500  # bucket keys per SELECT ... FOR UPDATE
+STATE_KEY = "rollups.last_id"
+UNKNOWN_CLASS = "Unknown"  # rollup_classes.major_class is NOT NULL; older and some BLE rows have none
+
+# --- Buckets ---
+class Bucket:
+    """Aggregates of one (resolution, bucket_start, location[, class]) key."""
+
+    __slots__ = ("sightings", "sketch", "near", "mid", "far")
+
+    def __init__(self, sightings=0, sketch=None, near=0, mid=0, far=0):
+        self.sightings = sightings
+        self.sketch = sketch or DistinctSketch()
+        self.near, self.mid, self.far = near, mid, far
+
+    def add(self, h, rssi):
+        self.sightings += 1
+        self.sketch.add(h)
+        if rssi is None:
+            return
+        if rssi > RSSI_NEAR:
+            self.near += 1
+        elif rssi >= RSSI_FAR:
+            self.mid += 1
+        else:
+            self.far += 1
+
+    def merge(self, other):
+        self.sightings += other.sightings
+        self.sketch.merge(other.sketch)
+        self.near += other.near
+        self.mid += other.mid
+        self.far += other.far
+
+
+class Rollup:
+    """Raw sightings folded into buckets of every resolution.
+
+    ``buckets`` feeds the rollups table (per location), ``classes`` the
+    rollup_classes table (per location and major class).
+    """
+
+    def __init__(self, resolutions=RESOLUTIONS):
+        self.resolutions = resolutions
+        self.buckets = {}  # (resolution, bucket_start, location) -> Bucket
+        self.classes = {}  # (resolution, bucket_start, location, major_class) -> Bucket
+
+    def add(self, pseudonym, location, major, ts, rssi):
+        h = pseudonym_hash(pseudonym)
+        major = major or UNKNOWN_CLASS
+        for resolution in self.resolutions:
+            start = int(ts // resolution) * resolution
+            for table, key in ((self.buckets, (resolution, start, location)),
+                               (self.classes, (resolution, start, location, major))):
+                bucket = table.get(key)
+                if bucket is None:
+                    bucket = table[key] = Bucket()
+                bucket.add(h, rssi)
+
+    def __len__(self):
+        return len(self.buckets) + len(self.classes)
+
+
+# --- Database ---
+TABLES = {
+    # table: (key columns after resolution and bucket_start, aggregate columns after sightings)
+    "rollups": (("scanner_location",), ("rssi_near", "rssi_mid", "rssi_far")),
+    "rollup_classes": (("scanner_location", "major_class"), ()),
+}
+
+
+def _load(cur, table, keys):
+    """Stored buckets among ``keys``, locked until the transaction ends."""
+    key_columns, extra = TABLES[table]
+    row_key = f"(%s, FROM_UNIXTIME(%s), {', '.join(['%s'] * len(key_columns))})"
+    stored = {}
+    for i in range(0, len(keys), KEYS_PER_QUERY):
+        chunk = keys[i:i + KEYS_PER_QUERY]
+        cur.execute(
+            f"""SELECT resolution, UNIX_TIMESTAMP(bucket_start), {', '.join(key_columns)},
+                       sightings, device_sketch{''.join(', ' + c for c in extra)}
+                FROM {table}
+                WHERE (resolution, bucket_start, {', '.join(key_columns)}) IN
+                      ({', '.join([row_key] * len(chunk))})
+                FOR UPDATE""",
+            [v for key in chunk for v in key]
+        )
+        for row in cur.fetchall():
+            n = 2 + len(key_columns)
+            key = (row[0], int(row[1])) + tuple(row[2:n])
+            stored[key] = Bucket(row[n], DistinctSketch.decode(row[n + 1]), *row[n + 2:])
+    return stored
+
+
+def save(cur, rollup):
+    """Merge a Rollup into the stored buckets; returns the number of rows written."""
+    written = 0
+    for table, buckets in (("rollups", rollup.buckets), ("rollup_classes", rollup.classes)):
+        if not buckets:
+            continue
+        key_columns, extra = TABLES[table]
+        stored = _load(cur, table, list(buckets))
+        rows = []
+        for key, bucket in buckets.items():
+            if key in stored:
+                bucket = stored[key]
+                bucket.merge(buckets[key])
+            rows.append(key + (bucket.sightings, bucket.sketch.count(), bucket.sketch.encode())
+                        + (bucket.near, bucket.mid, bucket.far)[:len(extra)])
+        columns = ("resolution", "bucket_start") + key_columns + ("sightings", "devices", "device_sketch") + extra
+        values = ", ".join(["%s", "FROM_UNIXTIME(%s)"] + ["%s"] * (len(columns) - 2))
+        updates = ", ".join(f"{c} = VALUES({c})" for c in ("sightings", "devices", "device_sketch") + extra)
+        cur.executemany(
+            f"""INSERT INTO {table} ({', '.join(columns)}) VALUES ({values})
+                ON DUPLICATE KEY UPDATE {updates}""",
+            rows
+        )
+        written += len(rows)
+    return written
+
+
+def lock_cursor(cur):
+    """Lock the worker's cursor row; serialises the worker and --recompute."""
+    cur.execute("SELECT value FROM worker_state WHERE name = %s FOR UPDATE", (STATE_KEY,))
+    return int(cur.fetchone()[0])
+
+
+def load_cursor(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT value FROM worker_state WHERE name = %s", (STATE_KEY,))
+    row = cur.fetchone()
+    if row is None:
+        # First run: start from the newest raw row; --recompute fills in history.
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM device_sessions")
+        row = cur.fetchone()
+        cur.execute(
+            "INSERT INTO worker_state (name, value) VALUES (%s, %s) ON DUPLICATE KEY UPDATE value = value",
+            (STATE_KEY, row[0])
+        )
+        print(f"[rollups] Starting after id {row[0]}; use --recompute to roll up older rows")
+    cur.close()
+    return int(row[0])
+
+
+def prune(conn, now):
+    cur = conn.cursor()
+    deleted = 0
+    for resolution, keep in RETENTION.items():
+        if keep is None:
+            continue
+        for table in TABLES:
+            cur.execute(
+                f"DELETE FROM {table} WHERE resolution = %s AND bucket_start < FROM_UNIXTIME(%s)",
+                (resolution, now - keep)
+            )
+            deleted += cur.rowcount
+    cur.close()
+    conn.commit()
+    return deleted
+
+
+def recompute(conn, since, until, now=None):
+    """Rebuild every bucket in [since, until) from device_sessions.
+
+    The range is widened to whole coarsest buckets, one transaction per
+    RECOMPUTE_CHUNK. Safe while the worker runs: each chunk holds the
+    worker's cursor lock and counts only the rows the worker has already
+    folded (id <= cursor); the worker adds the newer ones as usual.
+    """
+    now = now or time.time()
+    coarsest = max(RESOLUTIONS)
+    since = int(since // coarsest) * coarsest
+    until = -int(-until // coarsest) * coarsest
+    for start in range(since, until, RECOMPUTE_CHUNK):
+        end = min(start + RECOMPUTE_CHUNK, until)
+        # Resolutions past their retention would only be pruned again.
+        resolutions = tuple(r for r in RESOLUTIONS if RETENTION[r] is None or end > now - RETENTION[r])
+        cur = conn.cursor()
+        last_id = lock_cursor(cur)
+        for table in TABLES:
+            cur.execute(
+                f"""DELETE FROM {table}
+                    WHERE bucket_start >= FROM_UNIXTIME(%s) AND bucket_start < FROM_UNIXTIME(%s)""",
+                (start, end)
+            )
+        cur.execute(
+            """SELECT pseudonym, scanner_location, major_class, UNIX_TIMESTAMP(last_seen), signal_strength
+               FROM device_sessions
+               WHERE last_seen >= FROM_UNIXTIME(%s) AND last_seen < FROM_UNIXTIME(%s) AND id <= %s""",
+            (start, end, last_id)
+        )
+        rollup = Rollup(resolutions)
+        sightings = 0
+        for pseudonym, location, major, ts, rssi in cur:
+            rollup.add(pseudonym, location, major, float(ts), rssi)
+            sightings += 1
+        written = save(cur, rollup)
+        cur.close()
+        conn.commit()
+        print(f"[rollups] {datetime.fromtimestamp(start):%Y-%m-%d %H:%M}: "
+              f"{sightings} sightings -> {written} buckets")
+
+
+# --- Worker ---
+class Worker:
+    """Polls device_sessions by id and merges each batch into the rollup buckets."""
+
+    def __init__(self, hole_timeout=ID_HOLE_TIMEOUT):
+        self.tail = IdTail(hole_timeout)
+        self.conn = None
+        self.last_id = 0
+        self._pruned = 0.0
+        self.stats = {"sightings": 0, "buckets": 0, "pruned": 0}
+
+    def connect(self):
+        self.conn = mysql.connector.connect(**DB_CONF)
+        self.tail.connect(self.conn)
+        self.last_id = load_cursor(self.conn)
+        self.conn.commit()
+        print(f"[rollups] Rolling up from id {self.last_id}")
+
+    def run_once(self):
+        """One batch; returns the number of raw rows consumed."""
+        now = time.time()
+        if now - self._pruned >= PRUNE_INTERVAL:
+            self.stats["pruned"] += prune(self.conn, now)
+            self._pruned = now
+        rows = self.tail.contiguous(fetch(self.conn, self.last_id), self.last_id)
+        if not rows:
+            return 0
+        rollup = Rollup()
+        for _, pseudonym, location, name, major, ts, rssi in rows:
+            rollup.add(pseudonym, location, major, float(ts), rssi)
+        cur = self.conn.cursor()
+        lock_cursor(cur)
+        self.stats["buckets"] += save(cur, rollup)
+        cur.execute("UPDATE worker_state SET value = %s WHERE name = %s", (rows[-1][0], STATE_KEY))
+        cur.close()
+        self.conn.commit()
+        self.last_id = rows[-1][0]
+        self.stats["sightings"] += len(rows)
+        return len(rows)
+
+    def run(self, poll_interval=POLL_INTERVAL):
+        self.connect()
+        while True:
+            try:
+                consumed = self.run_once()
+            except mysql.connector.Error as e:
+                # The cursor moves in the same transaction as the buckets: reconnect and retry.
+                print(f"[!] Database error: {e}")
+                try:
+                    self.conn.close()
+                except mysql.connector.Error:
+                    pass
+                reconnect(self.connect, poll_interval)
+                continue
+            if consumed < FETCH_LIMIT:
+                time.sleep(poll_interval)
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value).timestamp()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Keep the 10 s / 1 min / 1 h rollup buckets up to date from device_sessions.")
+    parser.add_argument("--poll", type=float, default=POLL_INTERVAL)
+    parser.add_argument("--recompute", metavar="SINCE", type=parse_time,
+                        help="rebuild the buckets from this local time (YYYY-MM-DD[ HH:MM]) and exit; "
+                             "also the way to backfill history")
+    parser.add_argument("--until", metavar="UNTIL", type=parse_time,
+                        help="end of the --recompute range (default: now)")
+    args = parser.parse_args()
+    try:
+        if args.recompute is not None:
+            conn = mysql.connector.connect(**DB_CONF)
+            load_cursor(conn)
+            conn.commit()
+            recompute(conn, args.recompute, args.until or time.time())
+            conn.close()
+        else:
+            Worker().run(args.poll)
+    except KeyboardInterrupt:
+        print("\n[!] Exiting...")
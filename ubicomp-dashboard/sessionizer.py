@@ -0,0 +1,375 @@
+import argparse
+import json
+import time
+
+import mysql.connector
+
+# --- Config ---
+DB_CONF = dict(
+    host="127.0.0.1", user="root", password="tsitsitsitsi", database="dashboard"
+)
+GAP_SECONDS = 60  # a device unseen this long closes its interval
+NEW_AFTER_SECONDS = 15 * 60  # an interval is "new" if the device was away at least this long
+POLL_INTERVAL = 2  # seconds between folds
+FETCH_LIMIT = 5000  # raw rows read per fold
+ID_HOLE_TIMEOUT = 10  # seconds to wait for a lower id still being committed
+RECONNECT_MAX = 60  # seconds between reconnect attempts, at most
+STATE_KEY = "sessionizer.last_id"
+TRACE_LOG = None  # e.g. "sessionizer-trace.jsonl": fold times for freshness_report.py
+
+
+# --- Presence intervals ---
+class Interval:
+    """One stay of a device at a scanner location."""
+
+    __slots__ = ("id", "pseudonym", "location", "name", "major", "first_seen", "last_seen",
+                 "samples", "rssi_last", "rssi_min", "rssi_max", "rssi_sum", "is_new", "dirty")
+
+    def __init__(self, pseudonym, location, name, major, ts, rssi, is_new):
+        self.id = None  # presence_intervals row, once inserted
+        self.pseudonym = pseudonym
+        self.location = location
+        self.name = name
+        self.major = major
+        self.first_seen = self.last_seen = ts
+        self.samples = 1
+        self.rssi_last = self.rssi_min = self.rssi_max = self.rssi_sum = rssi
+        self.is_new = is_new
+        self.dirty = True
+
+    def add(self, name, major, ts, rssi):
+        self.samples += 1
+        if rssi is not None:
+            if self.rssi_sum is None:
+                self.rssi_min = self.rssi_max = self.rssi_sum = rssi
+            else:
+                self.rssi_min = min(self.rssi_min, rssi)
+                self.rssi_max = max(self.rssi_max, rssi)
+                self.rssi_sum += rssi
+        if ts >= self.last_seen:
+            self.last_seen = ts
+            self.rssi_last = rssi
+            self.name = name or self.name
+            self.major = major or self.major
+        else:
+            self.first_seen = min(self.first_seen, ts)
+        self.dirty = True
+
+    def values(self):
+        return (self.name, self.major, self.first_seen, self.last_seen, self.samples,
+                self.rssi_last, self.rssi_min, self.rssi_max, self.rssi_sum, self.is_new)
+
+
+class Sessionizer:
+    """Folds raw sightings into presence intervals, open ones kept in memory.
+
+    A sighting joins the open interval of its (pseudonym, location) when it
+    is within ``gap`` seconds of it; otherwise that interval is closed and
+    a new one starts. An interval is flagged ``is_new`` when the device had
+    not been seen anywhere for ``new_after`` seconds before it started.
+    Sightings older than the open intervals (spooled uploads arriving
+    late) are handed back to be merged into closed intervals in the table.
+
+    "Older" is measured against ``newest``, the latest sighting folded so
+    far (never ahead of the wall clock), not against the wall clock: a
+    backlog folded after a restart or an outage still opens and extends
+    intervals in memory instead of being merged row by row.
+    """
+
+    def __init__(self, gap=GAP_SECONDS, new_after=NEW_AFTER_SECONDS):
+        self.gap = gap
+        self.new_after = new_after
+        self.open = {}  # (pseudonym, location) -> Interval
+        self._seen = {}  # pseudonym -> when it was last seen anywhere (last new_after seconds)
+        self.newest = 0.0  # latest sighting folded
+        self.stats = {"sightings": 0, "opened": 0, "closed": 0, "late": 0}
+
+    def fold(self, rows, now):
+        """Apply (pseudonym, location, name, major, ts, rssi) rows; returns the late ones."""
+        late = []
+        for row in rows:
+            pseudonym, location, name, major, ts, rssi = row
+            self.stats["sightings"] += 1
+            if ts > self.newest:
+                self.newest = min(ts, now)  # a scanner clock running ahead can't push it past now
+            horizon = self.newest - self.gap
+            interval = self.open.get((pseudonym, location))
+            if interval is not None:
+                if ts - interval.last_seen <= self.gap and interval.first_seen - ts <= self.gap:
+                    interval.add(name, major, ts, rssi)
+                elif ts < interval.first_seen:
+                    late.append(row)
+                    continue
+                else:
+                    self._close(interval)
+                    interval = None
+            elif ts < horizon:
+                late.append(row)
+                continue
+            seen = self._seen.get(pseudonym)
+            if interval is None:
+                is_new = seen is None or ts - seen >= self.new_after
+                self.open[(pseudonym, location)] = Interval(pseudonym, location, name, major, ts, rssi, is_new)
+                self.stats["opened"] += 1
+            if seen is None or ts > seen:
+                self._seen[pseudonym] = ts
+        self.stats["late"] += len(late)
+        return late
+
+    def expire(self):
+        """Close intervals quiet for longer than the gap before ``newest``; returns them."""
+        horizon = self.newest - self.gap
+        closed = [i for i in self.open.values() if i.last_seen < horizon]
+        for interval in closed:
+            self._close(interval)
+        forget = self.newest - self.new_after
+        self._seen = {p: t for p, t in self._seen.items() if t >= forget}
+        return closed
+
+    def _close(self, interval):
+        del self.open[(interval.pseudonym, interval.location)]
+        self.stats["closed"] += 1
+
+
+# --- Database ---
+INTERVAL_COLUMNS = ("device_name, major_class, first_seen, last_seen, samples, "
+                    "rssi_last, rssi_min, rssi_max, rssi_sum, is_new")
+INTERVAL_VALUES = "%s, %s, FROM_UNIXTIME(%s), FROM_UNIXTIME(%s), %s, %s, %s, %s, %s, %s"
+
+
+def load(conn, sessionizer, now):
+    """Restore open intervals, when devices were last seen, and the raw-row cursor."""
+    cur = conn.cursor()
+    # Resume the sessionizer's clock where the folded data left off.
+    cur.execute("SELECT UNIX_TIMESTAMP(MAX(last_seen)) FROM presence_intervals")
+    newest = cur.fetchone()[0]
+    sessionizer.newest = min(float(newest), now) if newest is not None else 0.0
+    cur.execute(
+        """SELECT id, pseudonym, scanner_location, device_name, major_class,
+                   UNIX_TIMESTAMP(first_seen), UNIX_TIMESTAMP(last_seen), samples,
+                   rssi_last, rssi_min, rssi_max, rssi_sum, is_new
+            FROM presence_intervals
+            WHERE last_seen >= FROM_UNIXTIME(%s)""",
+        (sessionizer.newest - sessionizer.new_after,)
+    )
+    for (id_, pseudonym, location, name, major, first_seen, last_seen, samples,
+         rssi_last, rssi_min, rssi_max, rssi_sum, is_new) in cur.fetchall():
+        first_seen, last_seen = float(first_seen), float(last_seen)
+        sessionizer._seen[pseudonym] = max(last_seen, sessionizer._seen.get(pseudonym, 0))
+        if last_seen < sessionizer.newest - sessionizer.gap:
+            continue
+        key = (pseudonym, location)
+        if key in sessionizer.open and sessionizer.open[key].last_seen >= last_seen:
+            continue
+        interval = Interval(pseudonym, location, name, major, first_seen, rssi_last, bool(is_new))
+        interval.id = id_
+        interval.last_seen = last_seen
+        interval.samples = samples
+        interval.rssi_min, interval.rssi_max = rssi_min, rssi_max
+        interval.rssi_sum = int(rssi_sum) if rssi_sum is not None else None
+        interval.dirty = False
+        sessionizer.open[key] = interval
+    cur.execute("SELECT value FROM worker_state WHERE name = %s", (STATE_KEY,))
+    row = cur.fetchone()
+    if row is None:
+        # First run: start from the newest raw row rather than replaying history.
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM device_sessions")
+        row = cur.fetchone()
+    cur.close()
+    return int(row[0])
+
+
+def fetch(conn, after_id, limit=FETCH_LIMIT):
+    cur = conn.cursor()
+    cur.execute(
+        """SELECT id, pseudonym, scanner_location, device_name, major_class,
+                  UNIX_TIMESTAMP(last_seen), signal_strength
+           FROM device_sessions
+           WHERE id > %s
+           ORDER BY id
+           LIMIT %s""",
+        (after_id, limit)
+    )
+    rows = cur.fetchall()
+    cur.close()
+    return rows
+
+
+def save(conn, intervals, late, last_id, gap=GAP_SECONDS):
+    """Write changed intervals, merge late sightings and move the cursor, in one transaction."""
+    cur = conn.cursor()
+    updates = []
+    for interval in intervals:
+        if interval.id is None:
+            cur.execute(
+                f"""INSERT INTO presence_intervals (pseudonym, scanner_location, {INTERVAL_COLUMNS})
+                    VALUES (%s, %s, {INTERVAL_VALUES})""",
+                (interval.pseudonym, interval.location) + interval.values()
+            )
+            interval.id = cur.lastrowid
+        else:
+            updates.append(interval.values() + (interval.id,))
+    if updates:
+        cur.executemany(
+            """UPDATE presence_intervals
+               SET device_name = %s, major_class = %s, first_seen = FROM_UNIXTIME(%s),
+                   last_seen = FROM_UNIXTIME(%s), samples = %s, rssi_last = %s,
+                   rssi_min = %s, rssi_max = %s, rssi_sum = %s, is_new = %s
+               WHERE id = %s""",
+            updates
+        )
+    for pseudonym, location, name, major, ts, rssi in late:
+        merge_late(cur, pseudonym, location, name, major, ts, rssi, gap)
+    cur.execute(
+        """INSERT INTO worker_state (name, value) VALUES (%s, %s)
+           ON DUPLICATE KEY UPDATE value = VALUES(value)""",
+        (STATE_KEY, last_id)
+    )
+    cur.close()
+
+
+def merge_late(cur, pseudonym, location, name, major, ts, rssi, gap=GAP_SECONDS):
+    cur.execute(
+        """UPDATE presence_intervals
+           SET first_seen = LEAST(first_seen, FROM_UNIXTIME(%s)),
+               last_seen = GREATEST(last_seen, FROM_UNIXTIME(%s)),
+               samples = samples + 1,
+               rssi_min = LEAST(COALESCE(rssi_min, %s), %s),
+               rssi_max = GREATEST(COALESCE(rssi_max, %s), %s),
+               rssi_sum = COALESCE(rssi_sum, 0) + COALESCE(%s, 0)
+           WHERE pseudonym = %s AND scanner_location = %s
+             AND first_seen <= FROM_UNIXTIME(%s) AND last_seen >= FROM_UNIXTIME(%s)
+           ORDER BY last_seen DESC
+           LIMIT 1""",
+        (ts, ts, rssi, rssi, rssi, rssi, rssi, pseudonym, location, ts + gap, ts - gap)
+    )
+    if cur.rowcount == 0:
+        cur.execute(
+            f"""INSERT INTO presence_intervals (pseudonym, scanner_location, {INTERVAL_COLUMNS})
+                VALUES (%s, %s, {INTERVAL_VALUES})""",
+            (pseudonym, location, name, major, ts, ts, 1, rssi, rssi, rssi, rssi, False)
+        )
+
+
+# --- Worker ---
+class IdTail:
+    """Hands out device_sessions rows in id order, without skipping any.
+
+    A missing id may belong to a batch insert that has not committed yet,
+    so the tail waits at it for up to ``hole_timeout`` seconds (a
+    rolled-back insert never fills it).
+    """
+
+    def __init__(self, hole_timeout=ID_HOLE_TIMEOUT):
+        self.hole_timeout = hole_timeout
+        self._step = 1
+        self._hole = None
+        self._hole_since = 0.0
+
+    def connect(self, conn):
+        cur = conn.cursor()
+        cur.execute("SELECT @@auto_increment_increment")
+        self._step = int(cur.fetchone()[0])
+        cur.close()
+
+    def contiguous(self, rows, last_id):
+        """The prefix of ``rows`` (fetched after ``last_id``) that is safe to consume."""
+        expected = last_id + self._step
+        for i, row in enumerate(rows):
+            if row[0] != expected:
+                if self._hole != expected:
+                    self._hole, self._hole_since = expected, time.monotonic()
+                if time.monotonic() - self._hole_since < self.hole_timeout:
+                    return rows[:i]
+            expected = row[0] + self._step
+        return rows
+
+
+def reconnect(connect, delay):
+    """Call ``connect`` until the database answers, backing off from ``delay`` up to RECONNECT_MAX."""
+    while True:
+        time.sleep(delay)
+        try:
+            return connect()
+        except mysql.connector.Error as e:
+            print(f"[!] Reconnect failed: {e}")
+            delay = min(RECONNECT_MAX, max(1.0, delay * 2))
+
+
+class Worker:
+    """Polls device_sessions by id and keeps presence_intervals up to date.
+
+    With ``trace_path`` it appends a line per fold ({"stage": "sessionized",
+    "t", "through_id"}), so freshness_report.py can tell when a batch's
+    rows reached presence_intervals.
+    """
+
+    def __init__(self, gap=GAP_SECONDS, new_after=NEW_AFTER_SECONDS, hole_timeout=ID_HOLE_TIMEOUT,
+                 trace_path=TRACE_LOG):
+        self.gap = gap
+        self.new_after = new_after
+        self.tail = IdTail(hole_timeout)
+        self.conn = None
+        self.sessionizer = None
+        self.last_id = 0
+        self.trace = open(trace_path, "a", encoding="utf-8", buffering=1) if trace_path else None
+
+    def connect(self):
+        self.conn = mysql.connector.connect(**DB_CONF)
+        self.sessionizer = Sessionizer(self.gap, self.new_after)
+        self.tail.connect(self.conn)
+        self.last_id = load(self.conn, self.sessionizer, time.time())
+        self.conn.commit()
+        print(f"[sessionizer] {len(self.sessionizer.open)} open intervals, from id {self.last_id}")
+
+    def run_once(self):
+        """One fold; returns the number of raw rows consumed."""
+        now = time.time()
+        rows = self.tail.contiguous(fetch(self.conn, self.last_id), self.last_id)
+        late = self.sessionizer.fold(
+            [(p, loc, name, major, float(ts), rssi) for _, p, loc, name, major, ts, rssi in rows], now)
+        closed = self.sessionizer.expire()
+        changed = [i for i in self.sessionizer.open.values() if i.dirty] + [i for i in closed if i.dirty]
+        last_id = rows[-1][0] if rows else self.last_id
+        save(self.conn, changed, late, last_id, self.gap)
+        self.conn.commit()
+        for interval in changed:
+            interval.dirty = False
+        self.last_id = last_id
+        if rows and self.trace is not None:
+            self.trace.write(json.dumps({"stage": "sessionized", "t": round(time.time(), 3),
+                                         "through_id": last_id}) + "\n")
+        return len(rows)
+
+    def run(self, poll_interval=POLL_INTERVAL):
+        self.connect()
+        while True:
+            try:
+                consumed = self.run_once()
+            except mysql.connector.Error as e:
+                # Memory may be ahead of the rolled-back transaction: reload.
+                print(f"[!] Database error: {e}")
+                try:
+                    self.conn.close()
+                except mysql.connector.Error:
+                    pass
+                reconnect(self.connect, poll_interval)
+                continue
+            if consumed < FETCH_LIMIT:
+                time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold raw device_sessions rows into presence_intervals.")
+    parser.add_argument("--gap", type=float, default=GAP_SECONDS,
+                        help="seconds unseen before a device's interval closes")
+    parser.add_argument("--new-after", type=float, default=NEW_AFTER_SECONDS,
+                        help="seconds away before a returning device counts as new")
+    parser.add_argument("--poll", type=float, default=POLL_INTERVAL)
+    parser.add_argument("--trace", default=TRACE_LOG, metavar="PATH",
+                        help="log fold times for freshness_report.py")
+    args = parser.parse_args()
+    try:
+        Worker(args.gap, args.new_after, trace_path=args.trace).run(args.poll)
+    except KeyboardInterrupt:
+        print("\n[!] Exiting...")
@@ -0,0 +1,91 @@
+import hashlib
+import math
+
+# --- Distinct sketch ---
+# Stored in the rollup tables' device_sketch column by rollup_worker.py;
+# lib/sketch.js reads them, and must hash and encode exactly the same way.
+SKETCH_EXACT = 1
+SKETCH_HLL = 2
+HLL_PRECISION = 12  # 4096 registers, ~1.6 % standard error
+EXACT_LIMIT = (1 << HLL_PRECISION) // 8  # hashes kept exactly: the same 4 KiB as the registers
+
+
+def pseudonym_hash(pseudonym):
+    # First 8 bytes of SHA-256; lib/sketch.js hashes raw rows the same way.
+    return int.from_bytes(hashlib.sha256(pseudonym.encode()).digest()[:8], "big")
+
+
+class DistinctSketch:
+    """Mergeable count of distinct pseudonyms.
+
+    Exact (a set of 64-bit hashes) up to EXACT_LIMIT devices, a
+    HyperLogLog beyond. Sketches of any buckets merge, so a window's
+    distinct count is the merge of the buckets covering it rather than a
+    sum that counts a device once per bucket. Encoding (read by
+    lib/sketch.js):
+      exact: 0x01, then the sorted hashes, 8 bytes big-endian each
+      hll:   0x02, the precision, then 2**precision one-byte registers
+    """
+
+    __slots__ = ("hashes", "registers")
+
+    def __init__(self):
+        self.hashes = set()
+        self.registers = None
+
+    def add(self, h):
+        if self.registers is not None:
+            self._add_register(h)
+            return
+        self.hashes.add(h)
+        if len(self.hashes) > EXACT_LIMIT:
+            self._to_hll()
+
+    def _add_register(self, h):
+        shift = 64 - HLL_PRECISION
+        rank = shift - (h & ((1 << shift) - 1)).bit_length() + 1
+        index = h >> shift
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def _to_hll(self):
+        self.registers = bytearray(1 << HLL_PRECISION)
+        for h in self.hashes:
+            self._add_register(h)
+        self.hashes = set()
+
+    def merge(self, other):
+        if other.registers is None:
+            for h in other.hashes:
+                self.add(h)
+            return self
+        if self.registers is None:
+            self._to_hll()
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        if self.registers is None:
+            return len(self.hashes)
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting while most registers are empty
+        return round(estimate)
+
+    def encode(self):
+        if self.registers is None:
+            return bytes([SKETCH_EXACT]) + b"".join(h.to_bytes(8, "big") for h in sorted(self.hashes))
+        return bytes([SKETCH_HLL, HLL_PRECISION]) + bytes(self.registers)
+
+    @classmethod
+    def decode(cls, data):
+        sketch = cls()
+        if data[0] == SKETCH_HLL:
+            if data[1] != HLL_PRECISION:
+                raise ValueError(f"Sketch precision {data[1]}, expected {HLL_PRECISION}")
+            sketch.registers = bytearray(data[2:])
+        else:
+            sketch.hashes = {int.from_bytes(data[i:i + 8], "big") for i in range(1, len(data), 8)}
+        return sketch
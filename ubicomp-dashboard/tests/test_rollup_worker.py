@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+import rollup_worker  # noqa: E402
+from rollup_worker import UNKNOWN_CLASS, Rollup  # noqa: E402
+
+
+class RecordingCursor:
+    """Just enough of a DB-API cursor for save(): no stored buckets, inserts recorded."""
+
+    def __init__(self):
+        self.inserted = {}
+
+    def execute(self, sql, params=()):
+        pass
+
+    def fetchall(self):
+        return []
+
+    def executemany(self, sql, rows):
+        table = sql.split()[2]
+        self.inserted[table] = list(rows)
+
+
+def test_null_class_folds_as_unknown():
+    rollup = Rollup()
+    rollup.add("a1b2c3d4e5f6", "Library", None, 1000.0, -60)
+    rollup.add("0a1b2c3d4e5f", "Library", UNKNOWN_CLASS, 1001.0, -80)
+    rollup.add("000000000000", "Library", "Phone", 1002.0, -40)
+    classes = {key[3]: bucket for key, bucket in rollup.classes.items() if key[0] == 10}
+    assert set(classes) == {UNKNOWN_CLASS, "Phone"}
+    assert classes[UNKNOWN_CLASS].sightings == 2
+    assert classes[UNKNOWN_CLASS].sketch.count() == 2
+
+
+def test_save_writes_no_null_class():
+    rollup = Rollup()
+    rollup.add("a1b2c3d4e5f6", "Library", None, 1000.0, None)
+    cur = RecordingCursor()
+    assert rollup_worker.save(cur, rollup) == len(rollup)
+    # resolution, bucket_start, scanner_location, major_class, ...
+    assert {row[3] for row in cur.inserted["rollup_classes"]} == {UNKNOWN_CLASS}
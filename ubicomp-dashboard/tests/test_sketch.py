@@ -0,0 +1,138 @@
+import json
+import os
+import random
+import shutil
+import subprocess
+
+import pytest
+
+from sketch import EXACT_LIMIT, HLL_PRECISION, DistinctSketch, pseudonym_hash
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib")
+
+
+def sketch_of(hashes):
+    sketch = DistinctSketch()
+    for h in hashes:
+        sketch.add(h)
+    return sketch
+
+
+def random_hashes(n, seed):
+    rng = random.Random(seed)
+    return [rng.getrandbits(64) for _ in range(n)]
+
+
+def test_hash_is_pinned():
+    # Stored sketches depend on it; changing it needs a --recompute.
+    assert pseudonym_hash("a1b2c3d4e5f6") == 13684221086700897422
+    assert pseudonym_hash("000000000000") == 17848069930752570819
+
+
+def test_register_rank():
+    shift = 64 - HLL_PRECISION
+    sketch = DistinctSketch()
+    sketch._to_hll()
+    sketch.add((5 << shift) | (1 << (shift - 1)))  # first bit after the index set: rank 1
+    sketch.add((6 << shift) | 1)  # only the last bit set
+    sketch.add(7 << shift)  # nothing set after the index
+    assert sketch.registers[5] == 1
+    assert sketch.registers[6] == shift
+    assert sketch.registers[7] == shift + 1
+
+
+def test_exact_round_trip():
+    sketch = sketch_of(random_hashes(100, 1))
+    data = sketch.encode()
+    assert len(data) == 1 + 8 * 100
+    decoded = DistinctSketch.decode(data)
+    assert decoded.registers is None
+    assert decoded.hashes == sketch.hashes
+    assert decoded.count() == 100
+
+
+def test_switches_to_hll_past_the_exact_limit():
+    exact = sketch_of(random_hashes(EXACT_LIMIT, 2))
+    assert exact.registers is None and exact.count() == EXACT_LIMIT
+    hll = sketch_of(random_hashes(EXACT_LIMIT + 1, 2))
+    assert hll.registers is not None and not hll.hashes
+    data = hll.encode()
+    assert len(data) == 2 + (1 << HLL_PRECISION)
+    assert DistinctSketch.decode(data).registers == hll.registers
+    assert abs(hll.count() - (EXACT_LIMIT + 1)) <= 0.05 * EXACT_LIMIT
+
+
+def test_decode_rejects_other_precision():
+    with pytest.raises(ValueError):
+        DistinctSketch.decode(bytes([2, HLL_PRECISION + 1]) + bytes(1 << (HLL_PRECISION + 1)))
+
+
+@pytest.mark.parametrize("sizes", [(100, 200), (100, 2000), (3000, 5000)])
+def test_merge_counts_shared_devices_once(sizes):
+    hashes = random_hashes(max(sizes) * 2, 3)
+    a, b = hashes[:sizes[0]], hashes[sizes[0] // 2:sizes[0] // 2 + sizes[1]]
+    union = len(set(a) | set(b))
+    merged = sketch_of(a).merge(DistinctSketch.decode(sketch_of(b).encode()))
+    if union <= EXACT_LIMIT:
+        assert merged.count() == union
+    else:
+        assert abs(merged.count() - union) <= 0.05 * union
+    # Merging is symmetric.
+    assert sketch_of(b).merge(sketch_of(a)).count() == merged.count()
+
+
+def test_accuracy_at_10k():
+    errors = []
+    for seed in range(5):
+        count = sketch_of(random_hashes(10000, seed)).count()
+        errors.append(abs(count - 10000) / 10000)
+        assert errors[-1] < 0.05  # ~3 standard errors
+    assert sum(errors) / len(errors) < 0.025
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+def test_node_reads_python_sketches(tmp_path):
+    # lib/sketch.js hashes raw rows and merges stored sketches; it has to
+    # agree with sketch.py on both.
+    shutil.copy(os.path.join(LIB, "sketch.js"), tmp_path / "sketch.mjs")
+    script = """
+import fs from 'fs';
+import { DistinctSketch, hashPseudonym } from './sketch.mjs';
+const input = JSON.parse(fs.readFileSync(0, 'utf8'));
+const counts = input.sketches.map(group => {
+  const sketch = new DistinctSketch();
+  for (const hex of group) sketch.merge(Buffer.from(hex, 'hex'));
+  return sketch.count();
+});
+const raw = new DistinctSketch();
+for (const p of input.pseudonyms) raw.add(hashPseudonym(p));
+console.log(JSON.stringify({
+  hashes: input.pseudonyms.slice(0, 10).map(p => hashPseudonym(p).toString()),
+  counts,
+  raw: raw.count(),
+}));
+"""
+    (tmp_path / "check.mjs").write_text(script)
+    rng = random.Random(4)
+    pseudonyms = [f"{rng.getrandbits(48):012x}" for _ in range(3000)]
+    hashes = [pseudonym_hash(p) for p in pseudonyms]
+    groups = [
+        [sketch_of(hashes[:100])],  # exact
+        [sketch_of(hashes[:100]), sketch_of(hashes[50:300])],  # exact + exact
+        [sketch_of(hashes[:300]), sketch_of(hashes[:2000])],  # exact + hll
+        [sketch_of(hashes[:2000]), sketch_of(hashes[1000:])],  # hll + hll
+    ]
+    payload = {"pseudonyms": pseudonyms,
+               "sketches": [[s.encode().hex() for s in group] for group in groups]}
+    result = subprocess.run(["node", "check.mjs"], cwd=tmp_path, input=json.dumps(payload),
+                            capture_output=True, text=True, check=True)
+    out = json.loads(result.stdout)
+    assert out["hashes"] == [str(h) for h in hashes[:10]]
+    expected = []
+    for group in groups:
+        merged = DistinctSketch()
+        for s in group:
+            merged.merge(DistinctSketch.decode(s.encode()))
+        expected.append(merged.count())
+    assert out["counts"] == expected
+    assert out["raw"] == sketch_of(hashes).count()
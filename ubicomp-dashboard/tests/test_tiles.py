@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib")
+NOW = 1_700_000_000  # a multiple of 10 s, not of 60 s or an hour
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+
+SCRIPT = """
+import fs from 'fs';
+import { cover, finestAt, slots } from './tiles.mjs';
+const { now, covers, series } = JSON.parse(fs.readFileSync(0, 'utf8'));
+console.log(JSON.stringify({
+  covers: covers.map(([since, until]) => ({ finest: finestAt(since, now), ...cover(since, until, now) })),
+  series: series.map(([since, until, step]) => slots(since, until, step, now)),
+}));
+"""
+
+
+@pytest.fixture(scope="module")
+def tiles(tmp_path_factory):
+    """Runs lib/tiles.js under node: tiles(covers=[(since, until)], series=[(since, until, step)])."""
+    tmp = tmp_path_factory.mktemp("tiles")
+    shutil.copy(os.path.join(LIB, "tiles.js"), tmp / "tiles.mjs")
+    (tmp / "check.mjs").write_text(SCRIPT)
+
+    def run(covers=(), series=()):
+        payload = {"now": NOW, "covers": covers, "series": series}
+        result = subprocess.run(["node", "check.mjs"], cwd=tmp, input=json.dumps(payload),
+                                capture_output=True, text=True, check=True)
+        return json.loads(result.stdout)
+    return run
+
+
+def pieces(tiled):
+    """The cover's buckets and raw ranges as sorted (start, end) pairs."""
+    parts = [(s["start"], s["end"]) for s in tiled["spans"]] + [tuple(r) for r in tiled["raw"]]
+    return sorted(parts)
+
+
+def test_cover_tiles_the_window_with_aligned_buckets(tiles):
+    windows = [(NOW - 900, NOW), (NOW - 86400 - 7, NOW - 3), (NOW - 3600 * 5 + 1, NOW - 59),
+               (NOW - 20 * 86400 - 17, NOW - 13 * 86400)]
+    for (since, until), tiled in zip(windows, tiles(covers=windows)["covers"]):
+        parts = pieces(tiled)
+        assert parts[0][0] == since and parts[-1][1] == until
+        assert all(a[1] == b[0] for a, b in zip(parts, parts[1:]))  # no gaps, no overlaps
+        for span in tiled["spans"]:
+            r = span["resolution"]
+            assert r >= tiled["finest"]
+            assert span["start"] % r == 0 and (span["end"] - span["start"]) % r == 0
+        for start, end in tiled["raw"]:
+            assert end - start < tiled["finest"]  # only the partial edge buckets
+
+
+def test_cover_uses_the_coarsest_buckets_that_fit(tiles):
+    hour = (NOW // 3600) * 3600
+    [tiled] = tiles(covers=[(hour - 2 * 3600 - 10, hour)])["covers"]
+    assert tiled["raw"] == []
+    assert tiled["spans"] == [{"resolution": 10, "start": hour - 7210, "end": hour - 7200},
+                              {"resolution": 3600, "start": hour - 7200, "end": hour}]
+
+
+def test_cover_falls_back_to_coarser_buckets_past_retention(tiles):
+    # rollup_worker.py drops 10 s buckets after 2 days and 60 s after 14.
+    windows = [(NOW - 86400, NOW), (NOW - 3 * 86400, NOW), (NOW - 30 * 86400, NOW)]
+    finest = [t["finest"] for t in tiles(covers=windows)["covers"]]
+    assert finest == [10, 60, 3600]
+
+
+def test_cover_of_a_window_inside_one_bucket_is_all_raw(tiles):
+    [tiled] = tiles(covers=[(NOW + 1, NOW + 8)])["covers"]
+    assert tiled == {"finest": 10, "spans": [], "raw": [[NOW + 1, NOW + 8]]}
+
+
+def test_slots_snap_interior_boundaries(tiles):
+    series = [(NOW - 86400 + 7, NOW - 3, 3600), (NOW - 5 * 86400 + 13, NOW, 86400),
+              (NOW - 905, NOW, 150)]
+    for (since, until, step), points in zip(series, tiles(series=series)["series"]):
+        finest = 60 if until - since > 2 * 86400 else 10
+        assert points[0]["start"] == since and points[-1]["end"] == until
+        assert all(a["end"] == b["start"] for a, b in zip(points, points[1:]))
+        assert all(p["end"] % finest == 0 for p in points[:-1])
+        assert all(abs((p["end"] - p["start"]) - step) <= finest for p in points[1:-1])
+        # Interior boundaries fall on buckets, so only the two ends read raw rows.
+        raws = [r for p in tiles(covers=[(p["start"], p["end"]) for p in points])["covers"]
+                for r in p["raw"]]
+        assert all(r[0] == since or r[1] == until for r in raws)